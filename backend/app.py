@@ -1,17 +1,50 @@
-from flask import Flask, request, jsonify, current_app, Response
-import time
+from flask import Flask, request, jsonify, current_app, Response, send_from_directory
 import os
 import subprocess
 import uuid
 import json
 import signal
-import psutil
+import socket
+import sys
+import threading
+import time
+from functools import partial
 
 from flask_cors import CORS
 
+# Sibling helper modules are imported by name, also when app is loaded as backend.app
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from live_stream import LiveStreamRegistry, LiveStreamView, parse_last_event_id
+from results_store import ResultsStoreCache, build_results_store, RESULTS_STORE_FILENAME
+from locust_scripts.segmented_log import METRICS_LOG_FILENAME, SEGMENTS_DIRNAME
+from locust_scripts import run_config
+from worker_pool import WorkerPool, TOKEN_HEADER
+from run_scheduler import RunScheduler, ScheduledRun, QUEUED, STARTING
+from warm_pool import WarmLocustPool, DEFAULT_WARM_POOL_SIZE
+
 app = Flask(__name__)
 CORS(app)
 
+# One shared tailer per test_id, fanned out to every live results subscriber
+live_streams = LiveStreamRegistry()
+# Seconds without new metrics after which a live stream sends a keep-alive and re-checks the test process
+LIVE_STREAM_HEARTBEAT_INTERVAL = 15.0
+# In-memory index of this instance's test runs, admitted against a CPU and memory budget
+# (RUN_CPU_BUDGET cores, RUN_MEMORY_BUDGET_MB) so concurrent runs do not saturate the host
+run_scheduler = RunScheduler(cpu_budget=float(os.getenv("RUN_CPU_BUDGET", 0)) or None,
+                             memory_budget_mb=float(os.getenv("RUN_MEMORY_BUDGET_MB", 0)) or None)
+# Open columnar stores of finished runs, for the timeseries API
+results_stores = ResultsStoreCache()
+# Remote load-generator nodes (worker_agent.py) available for workerPlacement=pool. Agents and
+# the service authenticate each other with the shared WORKER_POOL_TOKEN; without it none is accepted.
+worker_pool = WorkerPool(token=os.getenv("WORKER_POOL_TOKEN"))
+# Idle pre-imported Locust processes that runs start in instead of cold-starting `locust`.
+# Filled once the first run launched (or at startup when run directly).
+warm_pool = WarmLocustPool(size=int(os.getenv("LOCUST_WARM_POOL_SIZE", DEFAULT_WARM_POOL_SIZE)))
+
 # origins = [
 #     "http://localhost:3001",
 #     "http://your-production-frontend-domain.com"
@@ -20,10 +53,23 @@ CORS(app)
 # CORS(app, origins=origins, supports_credentials=True)
 
 # Ensure the base directory for test results exists
-BASE_TEST_RESULTS_DIR = os.path.join(os.getcwd(), "test_results")
+BASE_TEST_RESULTS_DIR = run_config.test_results_dir()
 os.makedirs(BASE_TEST_RESULTS_DIR, exist_ok=True)
 
-LOCUST_SCRIPT_PATH = os.path.join(os.getcwd(), "locust_scripts", "locust_generic_test.py")
+LOCUST_SCRIPT_PATH = run_config.LOCUST_SCRIPT_PATH
+# Distributed runs: how long the master waits for its workers to connect, and how long
+# workers get to exit after the master finished before they are killed
+EXPECT_WORKERS_MAX_WAIT = 60
+WORKER_EXIT_TIMEOUT = 10
+# Seconds a stopped run gets to exit on SIGINT before its process group receives SIGTERM
+STOP_GRACE_PERIOD = 10
+# Pool runs: the master listens on all interfaces so remote workers can connect. Agents
+# connect to the service's host unless LOCUST_MASTER_ADVERTISE_HOST names another address.
+POOL_MASTER_BIND_HOST = os.getenv("LOCUST_MASTER_BIND_HOST", "0.0.0.0")
+POOL_MASTER_ADVERTISE_HOST = os.getenv("LOCUST_MASTER_ADVERTISE_HOST")
+WORKER_PLACEMENTS = ("local", "pool")
+# Memory reserved per local Locust process when admitting a run, unless the form sets memoryMb
+RUN_PROCESS_MEMORY_MB = float(os.getenv("RUN_PROCESS_MEMORY_MB", 256))
 
 # if __name__ == '__main__':
 #     app.run(port=5001)
@@ -33,6 +79,115 @@ LOCUST_SCRIPT_PATH = os.path.join(os.getcwd(), "locust_scripts", "locust_generic
 def home():
     return "Flask app is running!"
 
+def _parse_worker_count(value):
+    """Number of local Locust worker processes for a run: the ``workers`` form field, default one per CPU core."""
+    if value in (None, ""):
+        return os.cpu_count() or 1
+    try:
+        workers = int(value)
+    except ValueError:
+        raise ValueError(f"workers must be an integer, got '{value}'.")
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    return workers
+
+
+def _free_local_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_resources(form_data, workers, placement):
+    """
+    CPU cores and memory (MB) a run reserves from the scheduler's budget: a core per local
+    load-generating process (pool runs only keep their master here) and RUN_PROCESS_MEMORY_MB
+    per local process. The ``cpuCores`` and ``memoryMb`` form fields override the estimate.
+    """
+    if placement == "pool":
+        cpu_cores, processes = 1.0, 1  # Only the master runs here
+    else:
+        cpu_cores, processes = float(workers), workers + 1 if workers > 1 else 1  # Plus a master
+    resources = []
+    for field, default in (("cpuCores", cpu_cores), ("memoryMb", processes * RUN_PROCESS_MEMORY_MB)):
+        value = form_data.get(field)
+        if value in (None, ""):
+            resources.append(default)
+            continue
+        try:
+            resources.append(float(value))
+        except ValueError:
+            raise ValueError(f"{field} must be a number, got '{value}'.")
+        if resources[-1] <= 0:
+            raise ValueError(f"{field} must be positive.")
+    return tuple(resources)
+
+
+def _parse_saturation_options(form_data):
+    """
+    Environment for the generator saturation guard from the ``saturationAction``,
+    ``saturationSeconds`` and ``maxWorkers`` form fields.
+    """
+    env = {}
+    action = form_data.get("saturationAction")
+    if action:
+        if action.lower() not in run_config.SATURATION_ACTIONS:
+            raise ValueError(f"saturationAction must be one of: {', '.join(run_config.SATURATION_ACTIONS)}.")
+        env["GENERATOR_SATURATION_ACTION"] = action.lower()
+    for field, key, convert in (("saturationSeconds", "GENERATOR_SATURATION_SECONDS", float),
+                                ("maxWorkers", "GENERATOR_MAX_WORKERS", int)):
+        value = form_data.get(field)
+        if value in (None, ""):
+            continue
+        try:
+            number = convert(value)
+        except ValueError:
+            raise ValueError(f"{field} must be a number, got '{value}'.")
+        if number <= 0:
+            raise ValueError(f"{field} must be positive.")
+        env[key] = str(number)
+    return env
+
+
+def _parse_connection_options(form_data):
+    """
+    Environment for the load generators' HTTP connections from the ``connectionsPerUser``,
+    ``connectionPool``, ``keepAlive``, ``connectTimeout``, ``readTimeout`` and ``verifyTls``
+    form fields. Unset fields keep FastHttpUser's defaults.
+    """
+    env = {}
+    pool = form_data.get("connectionPool")
+    if pool:
+        if pool.lower() not in run_config.CONNECTION_POOL_MODES:
+            raise ValueError(f"connectionPool must be one of: {', '.join(run_config.CONNECTION_POOL_MODES)}.")
+        env["HTTP_CONNECTION_POOL"] = pool.lower()
+    for field, key in (("keepAlive", "HTTP_KEEP_ALIVE"), ("verifyTls", "HTTP_VERIFY_TLS")):
+        value = form_data.get(field)
+        if value in (None, ""):
+            continue
+        if value.lower() not in ("true", "false"):
+            raise ValueError(f"{field} must be 'true' or 'false', got '{value}'.")
+        env[key] = value.lower()
+    for field, key, convert in (("connectionsPerUser", "HTTP_CONNECTIONS_PER_USER", int),
+                                ("connectTimeout", "HTTP_CONNECT_TIMEOUT", float),
+                                ("readTimeout", "HTTP_READ_TIMEOUT", float)):
+        value = form_data.get(field)
+        if value in (None, ""):
+            continue
+        try:
+            number = convert(value)
+        except ValueError:
+            raise ValueError(f"{field} must be a number, got '{value}'.")
+        if number <= 0:
+            raise ValueError(f"{field} must be positive.")
+        env[key] = str(number)
+    return env
+
+
+class _PoolStartError(Exception):
+    """The agents of the worker pool could not start a run's workers."""
+
+
 def _start_test_run(test_type_from_url="generic"):
     test_id = "" # Initialize test_id to ensure it's available in the outermost catch block
     try:
@@ -48,6 +203,29 @@ def _start_test_run(test_type_from_url="generic"):
         locust_env = os.environ.copy()
         form_data = request.form
 
+        # More than one worker runs a Locust master plus that many local worker processes,
+        # since a single gevent process is limited to one CPU core
+        try:
+            workers = _parse_worker_count(form_data.get("workers"))
+        except ValueError as e:
+            return jsonify({"error": str(e), "test_id": test_id}), 400
+        # "pool" runs the workers on registered remote nodes instead of this host
+        placement = form_data.get("workerPlacement", "local").lower()
+        if placement not in WORKER_PLACEMENTS:
+            return jsonify({"error": f"workerPlacement must be one of: {', '.join(WORKER_PLACEMENTS)}.",
+                            "test_id": test_id}), 400
+        if placement == "pool":
+            try:
+                worker_pool.place(workers)  # Fail fast before anything is started
+            except ValueError as e:
+                return jsonify({"error": str(e), "test_id": test_id}), 503
+        try:
+            cpu_cores, memory_mb = _run_resources(form_data, workers, placement)
+            saturation_env = _parse_saturation_options(form_data)
+            connection_env = _parse_connection_options(form_data)
+        except ValueError as e:
+            return jsonify({"error": str(e), "test_id": test_id}), 400
+
         # Handle envVarsFile first to merge into locust_env
         if 'envVarsFile' in request.files:
             file = request.files['envVarsFile']
@@ -69,6 +247,7 @@ def _start_test_run(test_type_from_url="generic"):
 
         # Basic env vars from form
         locust_env["TEST_ID"] = test_id
+        locust_env["TEST_RESULTS_DIR"] = BASE_TEST_RESULTS_DIR  # Where the run writes its metrics log
         locust_env["TARGET_HOST"] = form_data.get("host", "http://localhost:8080") # Used for --host
         locust_env["ENDPOINT"] = form_data.get("url", "/") # Renamed from TARGET_PATH
         locust_env["METHOD"] = form_data.get("method", "GET").upper() # Renamed from REQUEST_METHOD
@@ -76,6 +255,11 @@ def _start_test_run(test_type_from_url="generic"):
         # QUERY_PARAMS is not standard in the new script, consider removing or adapting script
         # locust_env["QUERY_PARAMS"] = form_data.get("query_params", "{}")
 
+        # Generator self-saturation handling: mark only (default), abort, or add local workers
+        locust_env.update(saturation_env)
+        # Connections per user, shared or per-user pools, keep-alive and timeouts of the users' HTTP client
+        locust_env.update(connection_env)
+
         # Handle PayloadType and PAYLOAD_TEMPLATE
         payload_type_from_form = form_data.get("payloadType", "json").lower()
         locust_env["PAYLOAD_TYPE"] = payload_type_from_form
@@ -113,12 +297,19 @@ def _start_test_run(test_type_from_url="generic"):
         load_type_form = form_data.get("load_type", "RAMP_TEST").upper()
         app.logger.info(f"[{test_id}][{test_type_from_url}] load_type from form: {load_type_form}")
 
-        # TARGET_QPS is global in the new locust script, set via env var.
-        # LOCUST_MODE is not directly used by new script's GenericUser for QPS enabling,
-        # but QPS is enabled if TARGET_QPS > 0.
-        # We can still set TARGET_QPS env var based on form data.
-        if load_type_form == "QPS_TEST":
+        # TARGET_QPS is global in the new locust script, set via env var; QPS is enabled if TARGET_QPS > 0.
+        # LOCUST_MODE picks closed-loop "constant_qps" users or the "open" arrival-rate model.
+        # The /qps/start endpoint implies a QPS test whenever a target rate is given
+        if load_type_form == "QPS_TEST" or (test_type_from_url == "qps" and form_data.get("targetQps")):
             locust_env["TARGET_QPS"] = form_data.get("targetQps", os.getenv("TARGET_QPS", "0")) # Get from form, fallback to existing env, then "0"
+            # loadModel "open" launches requests on an arrival schedule instead of closed-loop users
+            if form_data.get("loadModel", "closed").lower() == "open":
+                locust_env["LOCUST_MODE"] = "open"
+                locust_env["ARRIVAL_DISTRIBUTION"] = form_data.get("arrivalDistribution", "constant").lower()
+                if form_data.get("maxConcurrency"):
+                    locust_env["OPEN_MAX_CONCURRENCY"] = form_data.get("maxConcurrency")
+            else:
+                locust_env["LOCUST_MODE"] = "constant_qps"
         else:
             # If not QPS_TEST, ensure TARGET_QPS is "0" or not set to disable QPS in script
             locust_env["TARGET_QPS"] = "0"
@@ -142,6 +333,13 @@ def _start_test_run(test_type_from_url="generic"):
 
         users = form_data.get("users", "1")
         spawn_rate = form_data.get("spawnRate", "1")
+        if locust_env.get("LOCUST_MODE") == "open":
+            # Load is driven by the arrival rate; a single user per process runs the arrival loop
+            users = str(workers)
+            spawn_rate = str(workers)
+        elif locust_env.get("LOCUST_MODE") == "constant_qps" and users.isdigit() and int(users) < workers:
+            # Each worker paces its share of TARGET_QPS and needs at least one user to send it
+            users = str(workers)
         run_time = form_data.get("duration")
 
         cmd.extend(["--users", users])
@@ -149,28 +347,33 @@ def _start_test_run(test_type_from_url="generic"):
         if run_time:
             cmd.extend(["--run-time", run_time])
 
-        app.logger.info(f"[{test_id}][{test_type_from_url}] Constructed Locust command: {' '.join(cmd)}")
-        # Avoid logging sensitive parts of locust_env if any in future. For now, it's mostly config.
-        # app.logger.debug(f"[{test_id}][{test_type_from_url}] With environment: {json.dumps(locust_env, indent=2)}")
-
-        log_file_path = os.path.join(test_run_dir, "flask_locust_runner.log")
-        with open(log_file_path, 'wb') as log_file:
-            process = subprocess.Popen(cmd, env=locust_env, stdout=log_file, stderr=subprocess.STDOUT)
-
-        pid_file = os.path.join(test_run_dir, "locust.pid")
-        with open(pid_file, "w") as f:
-            f.write(str(process.pid))
-
-        app.logger.info(f"[{test_id}][{test_type_from_url}] Locust process started with PID: {process.pid}. Output logged to {log_file_path}")
-
+        # The run is launched now if it fits in the CPU/memory budget, otherwise once it is admitted
+        run = ScheduledRun(test_id, test_type_from_url,
+                           partial(_launch_test_run, cmd=cmd, locust_env=locust_env, workers=workers,
+                                   placement=placement, test_run_dir=test_run_dir, service_url=request.host_url),
+                           cpu_cores=cpu_cores, memory_mb=memory_mb)
         response_data = {
             "message": f"Test ({test_type_from_url}) started successfully",
             "test_id": test_id,
+            "workers": workers,
+            "worker_placement": placement,
             "results_dir": test_run_dir,
             "locust_log_file": os.path.join(test_run_dir, "locust.log"),
             "html_report": os.path.join(test_run_dir, "report.html")
             # "metrics_file": locust_env["INFLUX_LINE_PROTOCOL_FILE_PATH"]
         }
+        if not run_scheduler.submit(run):
+            response_data.update(message=f"Test ({test_type_from_url}) queued until enough capacity is free",
+                                 state=QUEUED, queue_position=run_scheduler.queue_position(test_id))
+            return jsonify(response_data), 202
+
+        try:
+            run_scheduler.launch(run)
+        except _PoolStartError as e:
+            app.logger.error(f"[{test_id}][{test_type_from_url}] Failed to start pool workers: {e}")
+            return jsonify({"error": f"Failed to start workers on the pool: {e}", "test_id": test_id}), 502
+        response_data.update(state=run.state, queue_position=None,
+                             worker_placement=run.details.get("worker_placement", placement))
         return jsonify(response_data), 200
 
     except FileNotFoundError as fnfe:
@@ -228,6 +431,209 @@ def get_live_results2():
     app.logger.error(f"[] Error reading or parsing log file ")
     return jsonify("success"), 200
 
+# Run directory -> lock held while its results store is built, so a run's finalize thread and a
+# timeseries query that finds no store yet do not build it at the same time
+_finalize_locks = {}
+_finalize_locks_guard = threading.Lock()
+
+
+def _finalize_test_results(test_id, test_run_dir, reuse_existing=False):
+    """
+    Builds the columnar results store of a finished run. Returns the store path or None.
+
+    Args:
+        reuse_existing (bool): Keep a store built in the meantime, e.g. by the run's finalize
+            thread, which this waits for, instead of building it again.
+    """
+    with _finalize_locks_guard:
+        lock = _finalize_locks.setdefault(test_run_dir, threading.Lock())
+    with lock:
+        store_path = os.path.join(test_run_dir, RESULTS_STORE_FILENAME)
+        if reuse_existing and os.path.exists(store_path):
+            return store_path
+        try:
+            store_path = build_results_store(test_run_dir, test_id)
+        except Exception as e:
+            app.logger.error(f"[{test_id}] Failed to build results store: {e}", exc_info=True)
+            return None
+    if store_path:
+        app.logger.info(f"[{test_id}] Results store written to {store_path}")
+    return store_path
+
+
+def _launch_test_run(run, cmd, locust_env, workers, placement, test_run_dir, service_url):
+    """Starts an admitted run's Locust processes (and pool workers) and watches them until they exit."""
+    test_id = run.test_id
+    cmd = list(cmd)
+    locust_env = dict(locust_env)
+    worker_cmd = None
+    # Adding workers on saturation needs a master for them to join, even with a single worker
+    add_workers = locust_env.get("GENERATOR_SATURATION_ACTION") == run_config.ACTION_ADD_WORKERS
+    if workers > 1 or placement == "pool" or add_workers:
+        # The master port is picked at launch, a queued run may start much later
+        master_port = str(_free_local_port())
+        bind_host = POOL_MASTER_BIND_HOST if placement == "pool" else "127.0.0.1"
+        cmd.extend(["--master", "--master-bind-host", bind_host, "--master-bind-port", master_port,
+                    "--expect-workers", str(workers),
+                    "--expect-workers-max-wait", str(EXPECT_WORKERS_MAX_WAIT)])
+        if placement == "local":
+            worker_cmd = ["locust", "-f", LOCUST_SCRIPT_PATH, "--host", locust_env["TARGET_HOST"],
+                          "--worker", "--master-host", "127.0.0.1", "--master-port", master_port]
+        # Initial TARGET_QPS split; the master confirms the worker count at test start.
+        # Only the master writes the metrics log, workers forward their metrics to it.
+        locust_env["LOCUST_WORKER_COUNT"] = str(workers)
+        locust_env["LOCUST_ROLE"] = "master"
+    # Start of the run's start-to-first-request latency, reported by its first_request event
+    locust_env["RUN_LAUNCHED_AT"] = repr(time.time())
+
+    app.logger.info(f"[{test_id}][{run.test_type}] Constructed Locust command: {' '.join(cmd)}")
+
+    # The master leads a new process group that its workers join, so stopping the test
+    # can signal all of them at once. Set up with preexec_fn: Popen's process_group needs
+    # Python 3.11, and a new session (start_new_session) could not be joined by warm workers.
+    log_file_path = os.path.join(test_run_dir, "flask_locust_runner.log")
+    # Processes started in the warm pool rather than cold
+    warm_starts = 0
+    process = warm_pool.launch(cmd, locust_env, log_file_path)
+    if process is None:
+        with open(log_file_path, 'wb') as log_file:
+            process = subprocess.Popen(cmd, env=locust_env, stdout=log_file, stderr=subprocess.STDOUT,
+                                       preexec_fn=partial(os.setpgid, 0, 0))
+    else:
+        warm_starts += 1
+
+    worker_processes = []
+    if worker_cmd is not None:
+        worker_env = dict(locust_env, LOCUST_ROLE="worker")
+        for index in range(workers):
+            worker_env["LOCUST_WORKER_INDEX"] = str(index)
+            worker_log_path = os.path.join(test_run_dir, f"flask_locust_runner_worker_{index}.log")
+            worker_cmd_for_index = worker_cmd + ["--logfile", os.path.join(test_run_dir, f"locust_worker_{index}.log")]
+            worker = warm_pool.launch(worker_cmd_for_index, worker_env, worker_log_path, process_group=process.pid)
+            if worker is None:
+                with open(worker_log_path, 'wb') as log_file:
+                    worker = subprocess.Popen(worker_cmd_for_index, env=dict(worker_env), stdout=log_file,
+                                              stderr=subprocess.STDOUT,
+                                              preexec_fn=partial(os.setpgid, 0, process.pid))
+            else:
+                warm_starts += 1
+            worker_processes.append(worker)
+        app.logger.info(f"[{test_id}][{run.test_type}] Started {workers} Locust workers: "
+                        f"{[worker.pid for worker in worker_processes]}")
+    run.details["warm_processes"] = warm_starts
+
+    if placement == "pool":
+        try:
+            spec = _pool_worker_spec(locust_env, test_run_dir, master_port, service_url)
+            run.shared_files = frozenset(spec["files"].values())
+            run.details["worker_placement"] = worker_pool.start_workers(test_id, workers, spec)
+        except (ValueError, RuntimeError) as e:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+            raise _PoolStartError(str(e))
+
+    run.process = process
+    pid_file = os.path.join(test_run_dir, "locust.pid")
+    with open(pid_file, "w") as f:
+        f.write(str(process.pid))
+
+    app.logger.info(f"[{test_id}][{run.test_type}] Locust process started with PID: {process.pid}. Output logged to {log_file_path}")
+
+    threading.Thread(target=_finalize_when_done,
+                     args=(run_scheduler, test_id, process, test_run_dir, worker_processes, placement == "pool"),
+                     name=f"finalize:{test_id}", daemon=True).start()
+
+
+def _pool_worker_spec(locust_env, test_run_dir, master_port, service_url):
+    """
+    What an agent needs to start a run's workers: the run's own settings (those of
+    run_config.WORKER_ENV_KEYS that differ from this service's environment), plus input files
+    inside the run directory, which agents download.
+    """
+    env = {key: locust_env[key] for key in run_config.WORKER_ENV_KEYS
+           if key in locust_env and os.environ.get(key) != locust_env[key]}
+    files = {}
+    for key in run_config.WORKER_FILE_KEYS & env.keys():
+        value = env[key]
+        if os.path.isfile(value) and os.path.dirname(os.path.abspath(value)) == os.path.abspath(test_run_dir):
+            files[key] = os.path.basename(value)
+            del env[key]
+    return {
+        "master_host": POOL_MASTER_ADVERTISE_HOST,
+        "master_port": master_port,
+        "host": locust_env["TARGET_HOST"],
+        "service_url": service_url,
+        "env": env,
+        "files": files,
+    }
+
+
+def _finalize_when_done(scheduler, test_id, process, test_run_dir, worker_processes=(), pool_workers=False):
+    exit_code = process.wait()
+    scheduler.stopping(test_id)
+    if pool_workers:
+        # The master asks its workers to quit; this also stops any whose master connection was lost
+        worker_pool.stop_workers(test_id)
+    # The master tells its workers to quit when it ends; reap them, killing any that hang
+    for worker in worker_processes:
+        try:
+            worker.wait(timeout=WORKER_EXIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            app.logger.warning(f"[{test_id}] Locust worker {worker.pid} did not exit, killing it.")
+            worker.kill()
+            worker.wait()
+    try:
+        if _finalize_test_results(test_id, test_run_dir):
+            run = scheduler.get(test_id)
+            if run is not None:
+                store = results_stores.get(test_run_dir)
+                run.details["generator_bound"] = store.generator_bound is not None
+                if store.first_request is not None:
+                    run.details["start_latency_ms"] = store.first_request.get("start_latency_ms")
+                if store.phase_breakdown:
+                    run.details["phase_breakdown"] = store.phase_breakdown
+    finally:
+        # Frees the run's share of the budget for queued runs
+        scheduler.finish(test_id, exit_code)
+
+
+def _escalate_stop(test_id, pgid):
+    """SIGTERMs a run's process group if it is still alive after the grace period (e.g. SIGINT was ignored)."""
+    time.sleep(STOP_GRACE_PERIOD)
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return  # Already gone
+    app.logger.warning(f"[{test_id}] Locust did not stop on SIGINT, sent SIGTERM to process group {pgid}.")
+
+
+def _run_dir(test_id):
+    """
+    A run's results directory, or None if test_id is neither a run of this instance nor a run ID
+    (a UUID), so a crafted test_id such as '..' cannot point outside BASE_TEST_RESULTS_DIR.
+    """
+    if run_scheduler.get(test_id) is None:
+        try:
+            if str(uuid.UUID(test_id)) != test_id:
+                return None
+        except ValueError:
+            return None
+    return os.path.join(BASE_TEST_RESULTS_DIR, test_id)
+
+
+def _pool_token_error():
+    """A 401 response unless the request comes from an agent holding the worker pool's token, else None."""
+    if worker_pool.authorized(request.headers.get(TOKEN_HEADER)):
+        return None
+    return jsonify({"error": "Missing or invalid worker pool token (WORKER_POOL_TOKEN)."}), 401
+
+
+def _is_test_running(test_id):
+    """Whether a run is queued, running or still being wrapped up by this service instance."""
+    run = run_scheduler.get(test_id)
+    return run is not None and run.active
+
+
 @app.route('/perf-service/api/results/<string:test_id>/live', methods=['GET'])
 def get_live_results(test_id):
     try:
@@ -243,8 +649,10 @@ def get_live_results(test_id):
             return Response(config_error_stream(), mimetype='text/event-stream',
                             headers={'Cache-Control': 'no-cache', 'Connection': 'keep-alive'})
 
-        test_run_dir = os.path.join(BASE_TEST_RESULTS_DIR, test_id)
-        locust_runner_log_path = os.path.join(test_run_dir, "flask_locust_runner_metrics.log")
+        test_run_dir = _run_dir(test_id)
+        if test_run_dir is None:
+            return jsonify({"error": "Test ID not found or results directory does not exist.", "test_id": test_id}), 404
+        locust_runner_log_path = os.path.join(test_run_dir, METRICS_LOG_FILENAME)
 
         if not os.path.isdir(test_run_dir):
             current_app.logger.error(f"[{test_id}] SSE: Test ID directory not found: {test_run_dir}")
@@ -258,25 +666,37 @@ def get_live_results(test_id):
             return Response(error_stream_dir_not_found(), mimetype='text/event-stream',
                             headers={'Cache-Control': 'no-cache', 'Connection': 'keep-alive'})
 
-        initial_log_exists = os.path.exists(locust_runner_log_path)
+        # Finished segmented runs keep their log only as compressed segments
+        initial_log_exists = (os.path.exists(locust_runner_log_path)
+                              or os.path.isdir(os.path.join(test_run_dir, SEGMENTS_DIRNAME)))
         if not initial_log_exists:
             current_app.logger.warning(
                 f"[{test_id}] SSE: Log file not yet created: {locust_runner_log_path}. Test might be initializing.")
 
+        # Resume after the last event the client saw (EventSource sends it on reconnect)
+        last_event_id = parse_last_event_id(
+            request.headers.get("Last-Event-ID") or request.args.get("lastEventId"))
+
+        # Optional shaping: ?events=summary,request_stats&maxFps=2&fields=user_count,rps,p95
+        try:
+            view = LiveStreamView.from_args(request.args)
+        except ValueError as e:
+            def error_stream_invalid_query(message=str(e)):
+                error_json = json.dumps({"error": message, "test_id": test_id, "sse_status": "error_invalid_query"})
+                yield f"event: error\ndata: {error_json}\n\n"
+
+            return Response(error_stream_invalid_query(), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'Connection': 'keep-alive'})
+
         # Define the generator for the event stream
         def event_stream():
-            # test_id = os.environ.get('test_id')
-            # test_run_dir = os.path.join(BASE_TEST_RESULTS_DIR, test_id)
-            # locust_runner_log_path = os.path.join(test_run_dir, "flask_locust_runner_metrics.log")
-            last_file_size = 0
-            # initial_log_exists = os.path.exists(locust_runner_log_path)
-            print("******** event_stream **************")
-
             if not initial_log_exists:
                 init_msg = {"message": "Log file not yet created. Monitoring for test start.", "test_id": test_id,
                             "status": "initializing"}
                 yield f"event: status\ndata: {json.dumps(init_msg)}\n\n"
 
+            subscription = live_streams.subscribe(test_id, locust_runner_log_path, last_event_id,
+                                                  heartbeat_interval=LIVE_STREAM_HEARTBEAT_INTERVAL)
             try:
                 try:
                     curr_logger = current_app.logger
@@ -285,57 +705,19 @@ def get_live_results(test_id):
                 if curr_logger:
                     curr_logger.info(f"[{test_id}] SSE: Starting event stream for {locust_runner_log_path}")
 
-                file_missing_reported = not initial_log_exists
-
-                while True:
-                    if not os.path.exists(locust_runner_log_path):
-                        if not file_missing_reported:
-                            msg = {"message": "Log file not found. Continuing to monitor.", "test_id": test_id,
-                                   "status": "waiting_for_log"}
-                            yield f"event: status\ndata: {json.dumps(msg)}\n\n"
-                            file_missing_reported = True
-                        time.sleep(2)
-                        continue
-
-                    file_missing_reported = False
-                    current_file_size = os.path.getsize(locust_runner_log_path)
-
-                    if current_file_size == last_file_size:
-                        time.sleep(1)
+                for frames in view.iter_frames(subscription):
+                    if not frames:
+                        if not _is_test_running(test_id):
+                            # Nothing new and no Locust process that could still write (e.g. it was killed)
+                            ended_msg = {"message": "Test process is not running.", "test_id": test_id,
+                                         "status": "not_running"}
+                            yield f"event: status\ndata: {json.dumps(ended_msg)}\n\n"
+                            return
+                        yield ": keep-alive\n\n"
                         continue
 
-                    new_lines_buffer = []
-                    with open(locust_runner_log_path, 'r') as f:
-                        if current_file_size < last_file_size:
-                            f.seek(0)
-                        else:
-                            f.seek(last_file_size)
-                        for line in f:
-                            new_lines_buffer.append(line.strip())
-
-                    last_file_size = current_file_size
-
-                    for line_content in new_lines_buffer:
-                        if line_content.startswith('{') and line_content.endswith('}'):
-                            try:
-                                parsed_json = json.loads(line_content)
-                                if "event" in parsed_json:
-                                    event_type = parsed_json.get("event", "update")
-                                    yield f"event: {event_type}\ndata: {json.dumps(parsed_json)}\n\n"
-
-                                    current_state = parsed_json.get("state")
-                                    if current_state and current_state.lower() in ["stopped", "finished", "cleanup"]:
-                                        final_msg = json.dumps({
-                                            "message": f"Test {current_state}.",
-                                            "test_id": test_id,
-                                            "state": current_state
-                                        })
-                                        yield f"event: test_completed\ndata: {final_msg}\n\n"
-                                        return
-                            except json.JSONDecodeError:
-                                continue
-
-                    time.sleep(0.5)
+                    # Frames are serialized once by the shared hub (or once per projection)
+                    yield "".join(frames)
 
             except GeneratorExit:
                 try:
@@ -361,6 +743,7 @@ def get_live_results(test_id):
                     pass
 
             finally:
+                live_streams.unsubscribe(test_id, subscription)
                 try:
                     curr_logger = current_app.logger
                 except RuntimeError:
@@ -387,23 +770,137 @@ def get_live_results(test_id):
                         headers={'Cache-Control': 'no-cache', 'Connection': 'keep-alive'})
 
 
-@app.route('/perf-service/api/test/<string:test_id>/stop', methods=['POST'])
-def stop_test(test_id):
+@app.route('/perf-service/api/results/<string:test_id>/timeseries', methods=['GET'])
+def get_timeseries(test_id):
+    """
+    Answers time-series queries for a finished run from its columnar results store, e.g.
+    ?metric=p99&name=/api/items&from=1700000000&to=1700003600&step=60&agg=max
+    """
+    test_run_dir = _run_dir(test_id)
+    if test_run_dir is None or not os.path.isdir(test_run_dir):
+        return jsonify({"error": "Test ID not found or results directory does not exist.", "test_id": test_id}), 404
+
+    metric = request.args.get("metric")
+    if not metric:
+        return jsonify({"error": "Query parameter 'metric' is required.", "test_id": test_id}), 400
+    try:
+        start = float(request.args["from"]) if request.args.get("from") else None
+        end = float(request.args["to"]) if request.args.get("to") else None
+        step = float(request.args["step"]) if request.args.get("step") else None
+    except ValueError:
+        return jsonify({"error": "'from', 'to' and 'step' must be numbers (epoch seconds / seconds).",
+                        "test_id": test_id}), 400
+
     try:
-        test_dir = os.path.join(BASE_TEST_RESULTS_DIR, test_id)
-        pid_file = os.path.join(test_dir, "locust.pid")
+        store = results_stores.get(test_run_dir)
+        if store is None:
+            if _is_test_running(test_id):
+                return jsonify({"error": "Test is still running; results are available once it finishes.",
+                                "test_id": test_id}), 409
+            # Finished before this service instance could finalize it (e.g. after a restart), or
+            # is being finalized right now
+            if _finalize_test_results(test_id, test_run_dir, reuse_existing=True) is None:
+                return jsonify({"error": "No metrics recorded for this test.", "test_id": test_id}), 404
+            store = results_stores.get(test_run_dir)
+
+        result = store.query(metric, name=request.args.get("name"), event=request.args.get("event"),
+                             request_type=request.args.get("type"), start=start, end=end, step=step,
+                             agg=request.args.get("agg", "mean"))
+    except KeyError as e:
+        return jsonify({"error": e.args[0], "test_id": test_id}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e), "test_id": test_id}), 400
+    except Exception as e:
+        app.logger.error(f"[{test_id}] Timeseries query failed: {e}", exc_info=True)
+        return jsonify({"error": str(e), "test_id": test_id}), 500
+
+    result["test_id"] = test_id
+    # Latencies measured by a saturated load generator are inflated
+    result["generator_bound"] = store.generator_bound is not None
+    return jsonify(result), 200
+
+
+@app.route('/perf-service/api/test/<string:test_id>/files/<path:filename>', methods=['GET'])
+def get_test_file(test_id, filename):
+    """Serves a run's input files (payload template, data file) to pool agents, and nothing else."""
+    token_error = _pool_token_error()
+    if token_error:
+        return token_error
+    run = run_scheduler.get(test_id)
+    if run is None or filename not in run.shared_files:
+        return jsonify({"error": "File not found for this test.", "test_id": test_id}), 404
+    return send_from_directory(os.path.join(BASE_TEST_RESULTS_DIR, test_id), filename)
+
+
+@app.route('/perf-service/api/nodes/register', methods=['POST'])
+def register_node():
+    token_error = _pool_token_error()
+    if token_error:
+        return token_error
+    data = request.get_json(silent=True) or {}
+    if not data.get("node_id") or not data.get("url"):
+        return jsonify({"error": "'node_id' and 'url' are required."}), 400
+    try:
+        cpu_count = int(data.get("cpu_count") or 1)
+        max_workers = int(data["max_workers"]) if data.get("max_workers") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "'cpu_count' and 'max_workers' must be integers."}), 400
+    node = worker_pool.register(data["node_id"], data["url"], cpu_count, max_workers)
+    return jsonify(node.to_dict()), 200
+
+
+@app.route('/perf-service/api/nodes/<string:node_id>/heartbeat', methods=['POST'])
+def node_heartbeat(node_id):
+    token_error = _pool_token_error()
+    if token_error:
+        return token_error
+    if not worker_pool.heartbeat(node_id, request.get_json(silent=True) or {}):
+        return jsonify({"error": "Unknown node, register first.", "node_id": node_id}), 404
+    return jsonify({"node_id": node_id}), 200
 
-        if not os.path.exists(pid_file):
-            return jsonify({"error": "PID file not found for test_id", "test_id": test_id}), 404
 
-        with open(pid_file, 'r') as f:
-            pid = int(f.read().strip())
+@app.route('/perf-service/api/nodes', methods=['GET'])
+def list_nodes():
+    return jsonify({"nodes": worker_pool.nodes()}), 200
 
-        if not psutil.pid_exists(pid):
+
+@app.route('/perf-service/api/tests', methods=['GET'])
+def list_tests():
+    """Runs known to this instance (optionally ?state=queued) with the scheduler's budget usage."""
+    runs = run_scheduler.runs()
+    if request.args.get("state"):
+        runs = [run for run in runs if run["state"] == request.args["state"]]
+    return jsonify(dict(run_scheduler.usage(), runs=runs)), 200
+
+
+@app.route('/perf-service/api/test/<string:test_id>/status', methods=['GET'])
+def get_test_status(test_id):
+    run = run_scheduler.get(test_id)
+    if run is None:
+        return jsonify({"error": "Test run not found", "test_id": test_id}), 404
+    return jsonify(run_scheduler.describe(run)), 200
+
+
+@app.route('/perf-service/api/test/<string:test_id>/stop', methods=['POST'])
+def stop_test(test_id):
+    try:
+        run = run_scheduler.get(test_id)
+        if run is None:
+            return jsonify({"error": "Test run not found", "test_id": test_id}), 404
+
+        if run_scheduler.cancel(test_id):
+            return jsonify({"message": "Queued test run cancelled.", "test_id": test_id}), 200
+        if run.state == STARTING and run.process is None:
+            return jsonify({"error": "Test is starting, retry shortly.", "test_id": test_id}), 409
+        if not run.active or run.process.poll() is not None:
             return jsonify({"error": "Process not running", "test_id": test_id}), 410
 
-        proc = psutil.Process(pid)
-        proc.send_signal(signal.SIGINT)
+        # The master leads the run's process group: stop it and all of its workers
+        pid = run.process.pid
+        run_scheduler.stopping(test_id)
+        os.killpg(pid, signal.SIGINT)
+        threading.Thread(target=_escalate_stop, args=(test_id, pid), name=f"stop:{test_id}",
+                         daemon=True).start()
 
         return jsonify({"message": "Stop signal sent to Locust test.", "test_id": test_id}), 200
 
@@ -421,4 +918,5 @@ if __name__ == '__main__':
     # For local development:
     # The default Flask port is 5000. Ensure this matches what frontend expects if any.
     # Debug mode should be False in production.
+    warm_pool.fill()
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
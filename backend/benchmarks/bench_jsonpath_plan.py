@@ -0,0 +1,55 @@
+"""
+Measures per-response JSONPath overhead when expressions are parsed on every
+response versus compiled once into a JsonPathPlan.
+
+Usage:
+    python backend/benchmarks/bench_jsonpath_plan.py [num_responses]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from jsonpath_ng import parse
+
+from response_plan import JsonPathPlan
+
+EXPECTED_VALUES = {"$.status": "ok", "$.data.user.id": 42}
+METRIC_PATHS = ["$.data.items[*].price", "$.meta.elapsed_ms"]
+RESPONSE_JSON = {
+    "status": "ok",
+    "data": {"user": {"id": 42}, "items": [{"price": i} for i in range(20)]},
+    "meta": {"elapsed_ms": 12},
+}
+
+
+def parse_per_response():
+    for json_path_str, expected_value in EXPECTED_VALUES.items():
+        matches = parse(json_path_str).find(RESPONSE_JSON)
+        assert matches and matches[0].value == expected_value
+    for json_path_str in METRIC_PATHS:
+        parse(json_path_str).find(RESPONSE_JSON)
+
+
+def main():
+    num_responses = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+    start = time.perf_counter()
+    for _ in range(num_responses):
+        parse_per_response()
+    before = (time.perf_counter() - start) / num_responses
+
+    plan = JsonPathPlan(EXPECTED_VALUES, METRIC_PATHS)
+    start = time.perf_counter()
+    for _ in range(num_responses):
+        assert not plan.check(RESPONSE_JSON)
+        plan.extract_metrics(RESPONSE_JSON)
+    after = (time.perf_counter() - start) / num_responses
+
+    print(f"parse per response: {before * 1e6:,.1f} us/response")
+    print(f"compiled plan:      {after * 1e6:,.1f} us/response ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compares events/sec of the per-event (write + flush under a lock) metrics writer
+against the batched writer.
+
+Usage:
+    python backend/benchmarks/bench_locust_logger.py [num_events]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from locust_logger import LocustStatsLogger
+
+
+def run(batched, num_events, base_dir):
+    stats_logger = LocustStatsLogger("bench-batched" if batched else "bench-unbatched",
+                                     base_dir=base_dir, batched=batched)
+    start = time.perf_counter()
+    for _ in range(num_events):
+        stats_logger.log_event("request", {
+            "request_type": "POST",
+            "name": "/api/users",
+            "response_time": 12.5,
+            "response_length": 512,
+            "success": True,
+        })
+    stats_logger.close()
+    return num_events / (time.perf_counter() - start)
+
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    base_dir = tempfile.mkdtemp()
+    try:
+        before = run(False, num_events, base_dir)
+        after = run(True, num_events, base_dir)
+    finally:
+        shutil.rmtree(base_dir)
+    print(f"unbatched: {before:,.0f} events/sec")
+    print(f"batched:   {after:,.0f} events/sec ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares payloads/sec for a ~2 KB JSON template rendered the old way
+(safe_substitute -> json.loads -> json.dumps + headers copy per request)
+against PayloadRenderer, both with a warm cache and with every row unique.
+
+Usage:
+    python backend/benchmarks/bench_payload_engine.py [num_payloads]
+"""
+import json
+import os
+import sys
+import time
+from string import Template
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from payload_engine import PayloadRenderer
+
+HEADERS = {"Authorization": "Bearer token", "X-Client": "perf"}
+
+
+def build_template():
+    fields = {f"attribute_{i}": f"static value number {i} for padding" for i in range(40)}
+    fields.update({"id": "${id}", "email": "${email}", "name": "${name}"})
+    return Template(json.dumps(fields).replace('"${id}"', "${id}"))
+
+
+def old_pipeline(template, row):
+    body_str = template.safe_substitute(row)
+    payload = json.loads(body_str)
+    headers = HEADERS.copy()
+    return json.dumps(payload).encode("utf-8"), headers
+
+
+def measure(func, rows, num_payloads):
+    start = time.perf_counter()
+    for i in range(num_payloads):
+        func(rows[i % len(rows)])
+    return num_payloads / (time.perf_counter() - start)
+
+
+def main():
+    num_payloads = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    template = build_template()
+    rows = [{"id": str(i), "email": f"user{i}@example.com", "name": f"user {i}"} for i in range(1_000)]
+    unique_rows = [{"id": str(i), "email": f"user{i}@example.com", "name": f"user {i}"} for i in range(num_payloads)]
+    print(f"template size: {len(template.template)} bytes")
+
+    before = measure(lambda row: old_pipeline(template, row), rows, num_payloads)
+    warm = measure(PayloadRenderer(template, "json", HEADERS).render, rows, num_payloads)
+    cold = measure(PayloadRenderer(template, "json", HEADERS).render, unique_rows, num_payloads)
+
+    print(f"substitute + json round trip: {before:,.0f} payloads/sec")
+    print(f"renderer, cached rows:        {warm:,.0f} payloads/sec ({warm / before:.1f}x)")
+    print(f"renderer, unique rows:        {cold:,.0f} payloads/sec ({cold / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
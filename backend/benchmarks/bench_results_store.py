@@ -0,0 +1,73 @@
+"""
+Measures building the columnar results store for a long soak run and answering
+timeseries queries from it, compared with re-parsing the NDJSON metrics log.
+
+Usage:
+    python backend/benchmarks/bench_results_store.py [hours] [endpoints]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from results_store import ResultsStore, build_results_store, iter_metrics_events
+from locust_scripts.segmented_log import METRICS_LOG_FILENAME
+
+T0 = 1_700_000_000.0
+
+
+def write_soak_log(test_run_dir, seconds, endpoints):
+    with open(os.path.join(test_run_dir, METRICS_LOG_FILENAME), "w") as f:
+        for i in range(seconds):
+            for e in range(endpoints):
+                f.write(json.dumps({"request_type": "GET", "name": f"/endpoint/{e}", "interval_start": T0 + i,
+                                    "interval": 1.0, "count": 100, "failures": 0, "bytes": 51200, "min": 3.0,
+                                    "max": 80.0, "mean": 12.5, "p50": 11.0, "p90": 20.0, "p95": 25.0,
+                                    "p99": 40.0 + i % 7, "hist": {"1100": 50, "2000": 50},
+                                    "event": "request_stats", "timestamp": T0 + i + 1}) + "\n")
+            if i % 2 == 0:
+                f.write(json.dumps({"user_count": 200, "rps": 100.0 * endpoints, "fail_ratio": 0.0, "p95": 25,
+                                    "p99": 40, "event": "summary", "timestamp": T0 + i}) + "\n")
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 12
+    endpoints = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    test_run_dir = tempfile.mkdtemp()
+    try:
+        write_soak_log(test_run_dir, int(hours * 3600), endpoints)
+        log_size = os.path.getsize(os.path.join(test_run_dir, METRICS_LOG_FILENAME))
+
+        start = time.perf_counter()
+        points = [[d["timestamp"], d["p99"]] for d in iter_metrics_events(test_run_dir)
+                  if d.get("name") == "/endpoint/3"]
+        reparse = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store_path = build_results_store(test_run_dir)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = ResultsStore(store_path)
+        result = store.query("p99", name="/endpoint/3", step=60, agg="max")
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        store.query("p99", name="/endpoint/3", start=T0 + 3600, end=T0 + 7200)
+        warm = time.perf_counter() - start
+
+        print(f"{hours:g} h soak, {endpoints} endpoints: log {log_size / 1e6:,.1f} MB, "
+              f"store {os.path.getsize(store_path) / 1e6:,.2f} MB")
+        print(f"re-parse log for one series: {reparse * 1000:,.0f} ms ({len(points):,} points)")
+        print(f"build store (once, at run end): {build * 1000:,.0f} ms")
+        print(f"query p99 step=60 (open + decompress): {cold * 1000:,.1f} ms ({len(result['points']):,} points)")
+        print(f"query p99 1 h raw range (cached columns): {warm * 1000:,.2f} ms")
+    finally:
+        shutil.rmtree(test_run_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,558 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import queue
+import select
+import sys
+import threading
+import time
+from collections import deque
+
+from locust_scripts.segmented_log import SegmentedLogReader
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long a tailer sleeps between file checks when no change notification arrives
+DEFAULT_POLL_INTERVAL = 0.05
+# Idle subscribers receive a keep-alive after this many seconds, which also surfaces client disconnects
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+READ_CHUNK_SIZE = 64 * 1024
+# Closed segments are caught up in pieces of this size, so one rotation never loads a whole segment
+CATCH_UP_CHUNK_SIZE = 4 * 1024 * 1024
+# Recent events kept per test for late joiners and cheap reconnects
+DEFAULT_RING_SIZE = 1000
+TERMINAL_STATES = ("stopped", "finished", "cleanup")
+
+
+class _InotifyWatcher:
+    """
+    Blocks until something in a directory changes, using Linux inotify through ctypes.
+
+    ``create`` returns None where inotify is unavailable, and callers fall back to polling.
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    @classmethod
+    def create(cls, directory: str):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = cls.IN_MODIFY | cls.IN_CLOSE_WRITE | cls.IN_MOVED_TO | cls.IN_CREATE
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return cls(fd)
+
+    def wait(self, timeout: float):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                os.read(self.fd, READ_CHUNK_SIZE)  # Drain the queued notifications
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LiveEvent:
+    """
+    One metrics log event, parsed once by the hub and shared by every subscriber.
+
+    ``frame`` is the ready-to-send SSE frame. The log line is already JSON, so it is used as
+    the data field as is. ``completed_frame`` is set when the event reports a terminal test state.
+    """
+    __slots__ = ("event_id", "event_type", "data", "frame", "completed_frame", "_projections")
+
+    def __init__(self, event_id: int, data: dict, line: str, test_id: str):
+        self.event_id = event_id
+        self.event_type = data.get("event") or "update"
+        self.data = data
+        self.frame = format_sse_frame(self.event_type, line, event_id)
+        self.completed_frame = None
+        self._projections = None
+        state = data.get("state")
+        if isinstance(state, str) and state.lower() in TERMINAL_STATES:
+            self.completed_frame = format_sse_frame("test_completed", json.dumps({
+                "message": f"Test {state}.",
+                "test_id": test_id,
+                "state": state
+            }))
+
+    def projected_frame(self, fields: tuple) -> str:
+        """
+        SSE frame with only ``fields`` (plus ``event``) in the data. Cached per field set, so
+        subscribers asking for the same projection share one serialization.
+        """
+        if self._projections is None:
+            self._projections = {}
+        frame = self._projections.get(fields)
+        if frame is None:
+            data = {"event": self.event_type}
+            for field in fields:
+                if field in self.data:
+                    data[field] = self.data[field]
+            frame = self._projections[fields] = format_sse_frame(self.event_type, json.dumps(data), self.event_id)
+        return frame
+
+
+def format_sse_frame(event_type: str, data: str, event_id: int = None) -> str:
+    if event_id is None:
+        return f"event: {event_type}\ndata: {data}\n\n"
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+def parse_event_line(event_id: int, line: str, test_id: str):
+    """Returns a LiveEvent for JSON log lines that carry an ``event`` key, None for anything else."""
+    if not (line.startswith('{') and line.endswith('}')):
+        return None
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if "event" not in data:
+        return None
+    return LiveEvent(event_id, data, line, test_id)
+
+
+class LiveSubscription:
+    """
+    A subscriber's view of a LiveStreamHub.
+
+    Iterating (or calling ``get``) yields lists of LiveEvent. ``event_id`` is the byte offset
+    just past the event's line in the logical log (all segments concatenated), so it stays
+    valid across reconnects and log rotations. Iterating
+    yields an empty list after ``heartbeat_interval`` seconds without new events. If the
+    tailer fails, its exception is raised to the reader.
+    """
+    def __init__(self, hub, backlog: list, cold_range, heartbeat_interval: float, resume_after: int = 0):
+        self.hub = hub
+        self.heartbeat_interval = heartbeat_interval
+        self._backlog = backlog
+        self._cold_range = cold_range
+        self._resume_after = resume_after
+        self._queue = queue.Queue()
+
+    def push(self, batch):
+        self._queue.put(batch)
+
+    def _skip_seen(self, batch):
+        if self._resume_after:
+            batch = [live_event for live_event in batch if live_event.event_id > self._resume_after]
+            if batch:
+                self._resume_after = 0
+        return batch
+
+    def get(self, timeout: float):
+        """Returns the next list of events (possibly empty), or None if nothing arrived within ``timeout``."""
+        if self._cold_range is not None:
+            # Resuming from before the ring buffer: the gap is read back from the file
+            cold_range, self._cold_range = self._cold_range, None
+            batch = self._skip_seen(self.hub.read_events(*cold_range))
+            if batch:
+                return batch
+        if self._backlog is not None:
+            backlog, self._backlog = self._skip_seen(self._backlog), None
+            if backlog:
+                return backlog
+        try:
+            batch = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if isinstance(batch, Exception):
+            raise batch
+        return self._skip_seen(batch)
+
+    def __iter__(self):
+        while True:
+            batch = self.get(self.heartbeat_interval)
+            if batch is None:
+                yield []
+            elif batch:
+                yield batch
+
+
+class LiveStreamHub:
+    """
+    Tails one test's metrics log on a background thread and fans events out to subscribers.
+
+    Each new line is parsed once into a LiveEvent with a pre-serialized SSE frame, and that
+    shared event is pushed to every subscriber. The most recent ``ring_size`` events are kept
+    so late joiners start with recent history, and reconnects within that window resume
+    without touching the file.
+
+    The file is kept open and read incrementally from the last offset. Segmented logs (see
+    SegmentedLogReader) are followed across rotations: when the active segment is moved
+    away, the rest of it is drained and tailing continues in the new one, catching up from
+    closed segments if any were skipped. A hub on a segmented log starts at the last closed
+    segment, and older resumes are read back from the compressed segments. Truncation, or a
+    replacement that does not continue the logical log, restarts reading from the beginning.
+    The tailer wakes on inotify change notifications when available, otherwise it polls every
+    ``poll_interval`` seconds, so new lines reach subscribers well within 100 ms either way.
+
+    Args:
+        test_id (str): Test the log belongs to, echoed in test_completed frames.
+        path (str): Path of the log file to tail. It may not exist yet.
+        poll_interval (float): Maximum seconds between file checks.
+        ring_size (int): Number of recent events kept for late joiners.
+    """
+    def __init__(self, test_id: str, path: str, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 ring_size: int = DEFAULT_RING_SIZE):
+        self.test_id = test_id
+        self.path = path
+        self.poll_interval = poll_interval
+        self._reader = self._new_reader()  # Used by the tailer thread only
+        segments = self._reader.index["segments"]
+        # Logical offset up to which complete lines have been published
+        self.offset = segments[-1]["start"] if segments else 0
+        self._ring = deque(maxlen=max(1, ring_size))
+        self._ring_start = self.offset  # The ring holds every event after this offset
+        self._base = 0  # Logical offset of the first byte of the open file
+        self._fd = None
+        self._inode = None
+        self._partial = b""
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=f"live-tail:{test_id}", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, last_event_id: int = None, heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL) -> LiveSubscription:
+        """
+        Registers a subscriber. Without ``last_event_id`` it starts with the events in the ring
+        buffer; otherwise every event after ``last_event_id`` is replayed before live events.
+        """
+        if last_event_id is not None and not 0 < last_event_id <= self._file_size():
+            last_event_id = None  # Unknown position, e.g. the log was replaced
+        with self._lock:
+            cold_range = None
+            if last_event_id is None:
+                backlog = list(self._ring)
+            elif last_event_id >= self._ring_start:
+                backlog = [live_event for live_event in self._ring if live_event.event_id > last_event_id]
+            else:
+                cold_range = (last_event_id, self._ring_start)
+                backlog = list(self._ring)
+            # Events past the tail position arrive through the live stream; already-seen ones are skipped
+            subscription = LiveSubscription(self, backlog, cold_range, heartbeat_interval,
+                                            resume_after=last_event_id or 0)
+            if self._error is not None:
+                subscription.push(self._error)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LiveSubscription) -> bool:
+        """Removes a subscriber, stopping the tailer after the last one. Returns True if it stopped."""
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if self._subscribers or self._stopped.is_set():
+                return False
+            self._stopped.set()
+        return True
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def _new_reader(self) -> SegmentedLogReader:
+        return SegmentedLogReader(os.path.dirname(self.path) or ".", os.path.basename(self.path))
+
+    def _file_size(self) -> int:
+        try:
+            return self._new_reader().size()
+        except (OSError, ValueError):
+            return 0
+
+    def read_events(self, start: int, end: int) -> list:
+        """Reads and parses the events between two offsets of the logical log."""
+        batch = []
+        try:
+            data = self._new_reader().read_range(start, end)
+        except (OSError, ValueError):
+            return batch
+        offset = start
+        for raw_line in data.split(b"\n")[:-1]:
+            offset += len(raw_line) + 1
+            live_event = parse_event_line(offset, raw_line.decode("utf-8", errors="replace").strip(), self.test_id)
+            if live_event is not None:
+                batch.append(live_event)
+        return batch
+
+    def _run(self):
+        watcher = _InotifyWatcher.create(os.path.dirname(self.path) or ".")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self._read_new_lines()
+                except OSError as e:
+                    logger.warning(f"Live tail of {self.path} failed, retrying: {e}")
+                    self._close_file()
+                except Exception as e:
+                    logger.error(f"Live tail of {self.path} stopped: {e}", exc_info=True)
+                    with self._lock:
+                        self._error = e
+                        self._stopped.set()
+                        for subscription in self._subscribers:
+                            subscription.push(e)
+                    break
+                if watcher is not None:
+                    watcher.wait(self.poll_interval * 10)
+                else:
+                    self._stopped.wait(self.poll_interval)
+        finally:
+            if watcher is not None:
+                watcher.close()
+            self._close_file()
+
+    def _open_file(self, replaced: bool = False) -> bool:
+        try:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            self._catch_up()  # E.g. a finished segmented run: everything is in closed segments
+            return False
+        self._inode = os.fstat(self._fd).st_ino
+        self._reader.refresh()
+        try:
+            rotated = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self._close_file()  # Rotated again while opening, retry on the next pass
+            return False
+        self._base = self._reader.active_start
+        position = self.offset + len(self._partial)
+        if position <= self._base:
+            self._catch_up(self._base)
+            if self.offset + len(self._partial) != self._base:
+                self._restart()  # Closed segments missing, continue with the active one
+        elif replaced or position - self._base > os.fstat(self._fd).st_size:
+            self._restart()  # Not a continuation of what was read so far
+        else:
+            os.lseek(self._fd, position - self._base, os.SEEK_SET)
+        return True
+
+    def _catch_up(self, end: int = None):
+        """Publishes the lines of closed segments between the tail position and ``end`` (the active segment)."""
+        if end is None:
+            self._reader.refresh()
+            end = self._reader.active_start
+        position = self.offset + len(self._partial)
+        while position < end:
+            data = self._reader.read_range(position, min(position + CATCH_UP_CHUNK_SIZE, end))
+            if not data:
+                break
+            self._publish(data)
+            position += len(data)
+
+    def _close_file(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _restart(self):
+        """Starts over at the beginning of the open file."""
+        with self._lock:
+            self.offset = self._base
+            self._ring.clear()
+            self._ring_start = self._base
+        self._partial = b""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+
+    def _read_new_lines(self):
+        if self._fd is None and not self._open_file():
+            return
+        try:
+            replaced = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            replaced = False  # Keep draining the old file until a new one appears
+        if replaced:
+            self._drain()  # The rest of a rotated segment
+            self._close_file()
+            if not self._open_file(replaced=True):
+                return
+        elif os.fstat(self._fd).st_size < self.offset - self._base + len(self._partial):
+            self._restart()  # Truncated
+        self._drain()
+
+    def _drain(self):
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        if chunks:
+            self._publish(b"".join(chunks))
+
+    def _publish(self, data: bytes):
+        """Parses the complete lines of data read at the tail position and fans them out."""
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        if not lines:
+            return  # Only part of a line so far
+
+        batch = []
+        offset = self.offset
+        for raw_line in lines:
+            offset += len(raw_line) + 1
+            live_event = parse_event_line(offset, raw_line.decode("utf-8", errors="replace").strip(), self.test_id)
+            if live_event is not None:
+                batch.append(live_event)
+
+        with self._lock:
+            self.offset = offset
+            for live_event in batch:
+                if len(self._ring) == self._ring.maxlen:
+                    self._ring_start = self._ring[0].event_id
+                self._ring.append(live_event)
+            if batch:
+                for subscription in self._subscribers:
+                    subscription.push(batch)
+
+
+class LiveStreamRegistry:
+    """
+    Reference-counts one LiveStreamHub per test_id: the hub starts with the first subscriber
+    and is shut down when the last one unsubscribes.
+    """
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL, ring_size: int = DEFAULT_RING_SIZE):
+        self.poll_interval = poll_interval
+        self.ring_size = ring_size
+        self._hubs = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, test_id: str, path: str, last_event_id: int = None, **kwargs) -> LiveSubscription:
+        with self._lock:
+            hub = self._hubs.get(test_id)
+            if hub is None or hub.stopped:
+                hub = LiveStreamHub(test_id, path, poll_interval=self.poll_interval, ring_size=self.ring_size)
+                self._hubs[test_id] = hub
+            subscription = hub.subscribe(last_event_id, **kwargs)
+        return subscription
+
+    def unsubscribe(self, test_id: str, subscription: LiveSubscription):
+        with self._lock:
+            if subscription.hub.unsubscribe(subscription) and self._hubs.get(test_id) is subscription.hub:
+                del self._hubs[test_id]
+
+    def hub(self, test_id: str):
+        return self._hubs.get(test_id)
+
+
+class LiveStreamView:
+    """
+    Per-client shaping of a live stream: event-type filter, frame-rate cap and field projection.
+
+    With ``max_fps`` set, events are coalesced server-side: within each ``1 / max_fps`` window
+    only the latest event per stream (event type, request type, name, node and worker) is sent. Events that
+    end the test are never held back.
+
+    Args:
+        event_types (iterable): Event types to forward; all when empty.
+        max_fps (float): Maximum updates per second per stream; unlimited when None.
+        fields (iterable): Data fields to keep; all when empty.
+    """
+    def __init__(self, event_types=None, max_fps: float = None, fields=None):
+        self.event_types = frozenset(event_types) if event_types else None
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.fields = tuple(dict.fromkeys(fields)) if fields else None
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Builds a view from query parameters: ``events`` and ``fields`` (comma separated) and ``maxFps``.
+        Raises ValueError for an invalid ``maxFps``.
+        """
+        def split(name):
+            value = args.get(name) or ""
+            return [item.strip() for item in value.split(",") if item.strip()]
+
+        max_fps = args.get("maxFps")
+        if max_fps not in (None, ""):
+            try:
+                max_fps = float(max_fps)
+            except ValueError:
+                raise ValueError(f"maxFps must be a number, got '{max_fps}'.")
+            if max_fps <= 0:
+                raise ValueError("maxFps must be greater than 0.")
+        else:
+            max_fps = None
+        return cls(split("events"), max_fps, split("fields"))
+
+    def _frame(self, live_event: LiveEvent) -> str:
+        return live_event.projected_frame(self.fields) if self.fields else live_event.frame
+
+    @staticmethod
+    def _stream_key(live_event: LiveEvent):
+        data = live_event.data
+        return live_event.event_type, data.get("request_type"), data.get("name"), data.get("node"), data.get("worker")
+
+    def iter_frames(self, subscription: LiveSubscription):
+        """
+        Yields lists of SSE frames for a subscription. An empty list means no events arrived for
+        ``subscription.heartbeat_interval`` seconds. Iteration ends after the test_completed frame.
+        """
+        pending = {}
+        next_flush = 0.0
+        while True:
+            now = time.monotonic()
+            timeout = max(0.0, next_flush - now) if pending else subscription.heartbeat_interval
+            batch = subscription.get(timeout)
+            frames = []
+            for live_event in batch or ():
+                wanted = self.event_types is None or live_event.event_type in self.event_types
+                if live_event.completed_frame:
+                    # Flush whatever is held back, then finish the stream
+                    frames.extend(self._frame(pending_event) for pending_event in pending.values())
+                    if wanted:
+                        frames.append(self._frame(live_event))
+                    frames.append(live_event.completed_frame)
+                    yield frames
+                    return
+                if not wanted:
+                    continue
+                if self.min_interval:
+                    key = self._stream_key(live_event)
+                    pending.pop(key, None)  # Keep only the latest event per stream, ordered by arrival
+                    pending[key] = live_event
+                else:
+                    frames.append(self._frame(live_event))
+
+            now = time.monotonic()
+            if pending and now >= next_flush:
+                frames.extend(self._frame(pending_event) for pending_event in pending.values())
+                pending.clear()
+                next_flush = now + self.min_interval
+            if frames:
+                yield frames
+            elif batch is None and not pending:
+                yield []
+
+
+def parse_last_event_id(value):
+    """Parses an SSE Last-Event-ID header value, returning None when absent or malformed."""
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,196 @@
+import logging
+import time
+
+import gevent.local
+from geventhttpclient.client import HTTPClient, HTTPClientPool
+from geventhttpclient.connectionpool import ConnectionPool, SSLConnectionPool
+from geventhttpclient.url import URL
+
+# Phases of a request reported per name in the request_stats events, in milliseconds. dns,
+# connect and tls only occur for requests that open a new connection, tls only for HTTPS.
+PHASE_POOL = "pool"  # Waiting for a free connection in the client's pool
+PHASE_DNS = "dns"  # Resolving the host name
+PHASE_CONNECT = "connect"  # TCP handshake
+PHASE_TLS = "tls"  # TLS handshake
+PHASE_TTFB = "ttfb"  # Sending the request until the response headers arrived
+PHASE_BODY = "body"  # Reading the response body
+PHASES = (PHASE_POOL, PHASE_DNS, PHASE_CONNECT, PHASE_TLS, PHASE_TTFB, PHASE_BODY)
+
+# Timing of the request the current greenlet is sending, see begin_request
+_state = gevent.local.local()
+
+logger = logging.getLogger(__name__)
+
+# geventhttpclient has no public way to choose the connection pool an HTTPClient builds, or to
+# hook into its connects, so timing relies on these private ConnectionPool methods and on
+# HTTPClient._connection_pool. They are checked against the versions allowed by
+# requirements.txt; when they are missing, requests are sent untimed instead.
+POOL_HOOKS = ("_resolve", "_create_socket", "get_socket")
+TIMING_SUPPORTED = all(callable(getattr(ConnectionPool, name, None)) for name in POOL_HOOKS)
+_untimed_warned = False
+
+
+def _warn_untimed(reason: str):
+    global _untimed_warned
+    if not _untimed_warned:
+        _untimed_warned = True
+        logger.warning(f"Connection phase timing is off: {reason}. "
+                       f"Check the geventhttpclient version against requirements.txt.")
+
+
+class RequestTiming:
+    """Durations (seconds) of one request, filled in by TimedHTTPClient and its connection pool."""
+    __slots__ = ("pool_wait", "dns", "established", "tls", "connections", "headers")
+
+    def __init__(self):
+        # Waiting for the pool to hand out a connection, not counting opening a new one
+        self.pool_wait = 0.0
+        self.dns = 0.0
+        # Opening new connections in total: DNS, TCP and TLS
+        self.established = 0.0
+        self.tls = 0.0
+        self.connections = 0
+        # From handing the request to the client until its response headers were read,
+        # including the pool wait and any connection setup; None if the client was never reached
+        self.headers = None
+
+    def phases_ms(self, total: float = None) -> dict:
+        """
+        The request's phase durations in ms, leaving out phases it did not go through.
+
+        Args:
+            total (float): Seconds until the response body was read, for the body phase.
+        """
+        if self.headers is None:
+            return {}
+        phases = {PHASE_POOL: self.pool_wait * 1000,
+                  PHASE_TTFB: max(self.headers - self.pool_wait - self.established, 0.0) * 1000}
+        if self.connections:
+            phases[PHASE_DNS] = self.dns * 1000
+            phases[PHASE_CONNECT] = max(self.established - self.dns - self.tls, 0.0) * 1000
+            if self.tls:
+                phases[PHASE_TLS] = self.tls * 1000
+        if total is not None:
+            phases[PHASE_BODY] = max(total - self.headers, 0.0) * 1000
+        return phases
+
+
+def begin_request() -> RequestTiming:
+    """Starts timing the next request sent by the calling greenlet (through a TimedHTTPClientPool)."""
+    timing = _state.timing = RequestTiming()
+    return timing
+
+
+def end_request():
+    """The timing started by begin_request, once the request is done, or None."""
+    timing = getattr(_state, "timing", None)
+    _state.timing = None
+    return timing
+
+
+class _ConnectTimingMixin:
+    def get_socket(self):
+        timing = getattr(_state, "timing", None)
+        if timing is None:
+            return super().get_socket()
+        started = time.perf_counter()
+        established = timing.established
+        sock = super().get_socket()
+        # Blocks while all of the pool's connections are in use; a connection opened here is
+        # already counted by _create_socket
+        timing.pool_wait += time.perf_counter() - started - (timing.established - established)
+        return sock
+
+    def _resolve(self):
+        started = time.perf_counter()
+        addresses = super()._resolve()
+        timing = getattr(_state, "timing", None)
+        if timing is not None:
+            timing.dns += time.perf_counter() - started
+        return addresses
+
+    def _create_socket(self):
+        started = time.perf_counter()
+        sock = super()._create_socket()
+        timing = getattr(_state, "timing", None)
+        if timing is not None:
+            timing.established += time.perf_counter() - started
+            timing.connections += 1
+        return sock
+
+
+class TimedConnectionPool(_ConnectTimingMixin, ConnectionPool):
+    pass
+
+
+class _TimedSSLContext:
+    """Wraps an SSL context so that the TLS handshake done in its wrap_socket is timed on its own."""
+    def __init__(self, context):
+        self._context = context
+
+    def wrap_socket(self, *args, **kwargs):
+        started = time.perf_counter()
+        sock = self._context.wrap_socket(*args, **kwargs)
+        timing = getattr(_state, "timing", None)
+        if timing is not None:
+            timing.tls += time.perf_counter() - started
+        return sock
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+class TimedSSLConnectionPool(_ConnectTimingMixin, SSLConnectionPool):
+    def time_handshakes(self):
+        # Without a context (not created by every geventhttpclient version) TLS counts as connect
+        if getattr(self, "ssl_context", None) is not None and not isinstance(self.ssl_context, _TimedSSLContext):
+            self.ssl_context = _TimedSSLContext(self.ssl_context)
+
+
+# Exact pool classes HTTPClient builds, and the timed class each is switched to
+_TIMED_POOL_CLASSES = {ConnectionPool: TimedConnectionPool, SSLConnectionPool: TimedSSLConnectionPool}
+
+
+class TimedHTTPClient(HTTPClient):
+    """HTTPClient that times each request up to its response headers, and each connection it opens."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # HTTPClient builds its pool itself; only the class changes, not the pool's state
+        pool = getattr(self, "_connection_pool", None)
+        timed_class = _TIMED_POOL_CLASSES.get(type(pool))
+        self.timed = TIMING_SUPPORTED and timed_class is not None
+        if not self.timed:
+            _warn_untimed("the HTTP client's connection pool has no known timing hooks")
+            return
+        pool.__class__ = timed_class
+        if timed_class is TimedSSLConnectionPool:
+            pool.time_handshakes()
+
+    def request(self, *args, **kwargs):
+        timing = getattr(_state, "timing", None)
+        if timing is None or not self.timed:
+            return super().request(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            # Summed over redirects and retries, like the response time Locust reports
+            timing.headers = (timing.headers or 0.0) + time.perf_counter() - started
+
+
+class TimedHTTPClientPool(HTTPClientPool):
+    """
+    Client pool for FastHttpUser's ``client_pool`` whose clients time requests for begin_request.
+
+    Args:
+        **kw: HTTPClient arguments (concurrency, connection_timeout, network_timeout, TLS settings).
+    """
+    def get_client(self, url):
+        if not isinstance(url, URL):
+            url = URL(url)
+        client_key = url.host, url.port
+        client = self.clients.get(client_key)
+        if client is None:
+            client = self.clients[client_key] = TimedHTTPClient.from_url(url, **self.client_args)
+        return client
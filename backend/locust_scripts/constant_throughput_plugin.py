@@ -5,67 +5,99 @@ from locust.env import Environment
 
 logger = logging.getLogger(__name__)
 
+# How far (in seconds of permits) the scheduler may fall behind and then burst to catch up.
+# Bounds the catch-up burst after a stall instead of silently dropping the missed permits.
+DEFAULT_MAX_CATCH_UP = 1.0
+
+
 class ConstantThroughput:
     """
-    A custom wait_time callable that makes sure a single user executes tasks
-    at a maximum calculated rate per second, dynamically adapting to the total user count.
+    A shared wait_time callable that issues request permits at an exact global rate.
+
+    One instance is shared by every user in the worker process. Each call reserves
+    the next slot on a fixed schedule (``1 / rate`` apart) and sleeps until it, so the
+    achieved rate no longer depends on the user count, response times or ramp-up,
+    as long as enough users are available to pick up the permits. In distributed
+    mode the global rate is split evenly across ``worker_count`` workers.
 
     Args:
         target_qps (float): The *global* target requests per second for the *entire* test.
-                            This QPS will be distributed among all active users.
-        env (locust.env.Environment): The Locust Environment object, used to get
-                                      the current total user count dynamically.
+        env (locust.env.Environment): The Locust Environment object (optional, informational).
+        worker_count (int): Number of worker processes sharing the global rate.
+        max_catch_up (float): Seconds worth of missed permits that may be issued back-to-back
+                              after the scheduler fell behind.
     """
-    def __init__(self, target_qps: float, env: Environment):
+    def __init__(self, target_qps: float, env: Environment = None, worker_count: int = 1,
+                 max_catch_up: float = DEFAULT_MAX_CATCH_UP):
         if not isinstance(target_qps, (int, float)):
             raise TypeError("target_qps must be a number.")
         if target_qps < 0:
             logger.warning(f"ConstantThroughput initialized with negative target_qps ({target_qps}). Treating as 0 (no wait).")
 
-        self.target_qps = target_qps
+        self.target_qps = max(target_qps, 0)
         self.env = env
-        self._last_task_start_time = time.monotonic()
+        self.max_catch_up = max_catch_up
+        self.worker_count = 1
+        self._interval = 0
+        self._next_slot = None
+        self._reset_window(time.monotonic())
+        self.set_worker_count(worker_count)
         logger.info(f"Initialized ConstantThroughput with global target QPS: {self.target_qps}.")
 
+    @property
+    def worker_target_qps(self) -> float:
+        return self.target_qps / self.worker_count
+
+    def set_worker_count(self, worker_count: int):
+        """Re-splits the global rate, e.g. when the master reports how many workers are running."""
+        self.worker_count = max(1, int(worker_count or 1))
+        self._interval = 1.0 / self.worker_target_qps if self.target_qps > 0 else 0
+        logger.info(f"ConstantThroughput: {self.worker_count} worker(s), {self.worker_target_qps:.2f} QPS per worker.")
+
     def __call__(self):
         """
-        Calculates the per-user rate based on the current total user count,
-        then waits if necessary to maintain that rate.
+        Waits for the next permit and returns 0, since the wait already happened here
+        (returning it would make Locust sleep a second time).
         """
-        # --- Robustness Check: Ensure runner is active and has users ---
-        # If the runner is not yet active or there are no users, we can't calculate throughput.
-        # In such cases, return 0 to allow tasks to proceed without waiting,
-        # or implement a minimal default wait if that's desired.
-        if not self.env or not self.env.runner or self.env.runner.user_count <= 0:
-            self._last_task_start_time = time.monotonic()
-            return 0  # No wait if runner not ready or no users
-
-        current_user_count = self.env.runner.user_count
-
-        # Handle edge cases for target_qps (already checked in init, but safe to double-check)
-        if self.target_qps <= 0:
-            self._last_task_start_time = time.monotonic()
-            return 0
-
-        # Calculate the desired per-user rate based on current user count
-        current_per_user_rate = self.target_qps / current_user_count
-
-        # If the calculated per-user rate is too low or invalid, treat as no wait
-        if current_per_user_rate <= 0:
-            self._last_task_start_time = time.monotonic()
+        if self._interval <= 0:
             return 0
 
-        current_interval = 1.0 / current_per_user_rate
+        now = time.monotonic()
+        if self._next_slot is None:
+            self._next_slot = now
+        # Never let a stall accumulate more than max_catch_up seconds worth of permits
+        slot = max(self._next_slot, now - self.max_catch_up)
+        self._next_slot = slot + self._interval
 
-        current_time = time.monotonic()
-        elapsed_since_last_task = current_time - self._last_task_start_time
+        if slot > now:
+            gevent.sleep(slot - now)
+        self._record_permit(max(0.0, time.monotonic() - slot))
+        return 0
 
-        time_to_wait = current_interval - elapsed_since_last_task
-        actual_wait_duration = 0
+    def _record_permit(self, lag: float):
+        self._window_permits += 1
+        self._window_lag_total += lag
+        if lag > self._window_lag_max:
+            self._window_lag_max = lag
 
-        if time_to_wait > 0:
-            actual_wait_duration = time_to_wait
-            gevent.sleep(time_to_wait)
+    def _reset_window(self, now: float):
+        self._window_start = now
+        self._window_permits = 0
+        self._window_lag_total = 0.0
+        self._window_lag_max = 0.0
 
-        self._last_task_start_time = time.monotonic()
-        return actual_wait_duration
+    def snapshot(self) -> dict:
+        """Achieved vs. target QPS and scheduling lag since the previous snapshot."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        permits = self._window_permits
+        stats = {
+            "target_qps": self.target_qps,
+            "worker_target_qps": self.worker_target_qps,
+            "achieved_qps": permits / elapsed if elapsed > 0 else 0.0,
+            "permits": permits,
+            "schedule_lag_avg_ms": self._window_lag_total / permits * 1000 if permits else 0.0,
+            "schedule_lag_max_ms": self._window_lag_max * 1000,
+        }
+        self._reset_window(now)
+        return stats
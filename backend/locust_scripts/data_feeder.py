@@ -0,0 +1,261 @@
+import os
+import csv
+import json
+import mmap
+import random
+import logging
+import operator
+from array import array
+from itertools import accumulate, compress, repeat
+
+logger = logging.getLogger(__name__)
+
+FEED_MODE_SEQUENTIAL = "sequential"
+FEED_MODE_PARTITIONED = "partitioned"
+FEED_MODE_RANDOM = "random"
+FEED_MODE_UNIQUE = "unique"
+FEED_MODES = (FEED_MODE_SEQUENTIAL, FEED_MODE_PARTITIONED, FEED_MODE_RANDOM, FEED_MODE_UNIQUE)
+
+STREAMING_FILE_EXTENSIONS = (".ndjson", ".jsonl")
+# CSV files at least this large are memory-mapped instead of parsed into dicts up front
+DEFAULT_STREAMING_THRESHOLD_BYTES = 100 * 1024 * 1024
+INDEX_FILE_SUFFIX = ".idx"
+# The newline index is built from slices of this size, so each one is split by C code in one call
+INDEX_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def block_bounds(total: int, index: int, count: int) -> tuple:
+    """``(start, size)`` of block ``index`` when ``total`` rows are split into ``count`` contiguous
+    blocks; the remainder goes to the first blocks, so sizes differ by at most one."""
+    base, remainder = divmod(total, count)
+    return index * base + min(index, remainder), base + (1 if index < remainder else 0)
+
+
+class RowShard:
+    """
+    Read-only view of a contiguous block of another row sequence, without copying it.
+
+    Args:
+        rows (Sequence[dict]): All data rows (a list or MappedRowSource).
+        start (int): Index of the block's first row.
+        size (int): Rows in the block.
+    """
+    def __init__(self, rows, start: int, size: int):
+        self.rows = rows
+        self.start = start
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("row index out of range")
+        return self.rows[self.start + index]
+
+
+def shard_rows(rows, worker_index: int, worker_count: int):
+    """
+    The share of ``rows`` one load-generator process feeds from: block ``worker_index`` of
+    ``worker_count``, so workers never hand out the same row. ``rows`` itself for one worker.
+    """
+    if worker_count <= 1:
+        return rows
+    return RowShard(rows, *block_bounds(len(rows), worker_index, worker_count))
+
+
+class DataFeeder:
+    """
+    Hands out data rows to users in O(1) per request, independent of data set size.
+
+    Rows are never moved or copied; each mode only advances integer cursors into
+    the shared, read-only ``rows`` sequence.
+
+    Modes:
+        sequential:  One cursor shared by all users. Wraps around when ``reuse`` is True.
+        partitioned: Rows are split into ``partitions`` contiguous blocks and each user
+                     only reads its own block (``user_index % partitions``).
+        random:      Every request picks a uniformly random row (always reuses).
+        unique:      Every row is handed out exactly once, regardless of ``reuse``.
+
+    Args:
+        rows (Sequence[dict]): The loaded data rows.
+        mode (str): One of FEED_MODES.
+        reuse (bool): Whether sequential/partitioned cursors wrap around when exhausted.
+        partitions (int): Number of blocks for the partitioned mode.
+    """
+    def __init__(self, rows, mode: str = FEED_MODE_SEQUENTIAL, reuse: bool = True, partitions: int = 1):
+        if mode not in FEED_MODES:
+            raise ValueError(f"Unknown data feed mode '{mode}'. Expected one of: {', '.join(FEED_MODES)}.")
+        self.rows = rows
+        self.mode = mode
+        self.reuse = reuse and mode != FEED_MODE_UNIQUE
+        self.partitions = max(1, int(partitions))
+        self._cursor = 0
+        self._partition_cursors = [0] * self.partitions
+        self._random = random.Random()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def next_row(self, user_index: int = 0):
+        """Returns the next row for the given user, or None once the data is exhausted."""
+        total = len(self.rows)
+        if not total:
+            return None
+
+        if self.mode == FEED_MODE_RANDOM:
+            return self.rows[self._random.randrange(total)]
+
+        if self.mode == FEED_MODE_PARTITIONED:
+            return self._next_partitioned_row(user_index, total)
+
+        # sequential / unique
+        position = self._cursor
+        if position >= total:
+            if not self.reuse:
+                return None
+            position %= total
+        self._cursor = position + 1
+        return self.rows[position]
+
+    def _next_partitioned_row(self, user_index: int, total: int):
+        partition = user_index % self.partitions
+        start, size = block_bounds(total, partition, self.partitions)
+        if not size:
+            return None
+
+        offset = self._partition_cursors[partition]
+        if offset >= size:
+            if not self.reuse:
+                return None
+            offset %= size
+        self._partition_cursors[partition] = offset + 1
+        return self.rows[start + offset]
+
+
+class MappedRowSource:
+    """
+    Read-only, memory-mapped sequence of data rows backed by a CSV or NDJSON file.
+
+    Only a line-offset index is kept in memory (4-8 bytes per row); rows are
+    decoded on demand in ``__getitem__``, so memory stays roughly constant
+    regardless of file size and it plugs straight into DataFeeder. With
+    ``index_dir`` the index is cached there (``<file name>.idx``) so other
+    worker processes of the run skip the newline scan; the data file's own
+    directory is never written to, since it may be read-only or shared.
+
+    Every row must be on a single line, i.e. CSV fields may not contain
+    embedded newlines.
+
+    Args:
+        path (str): Path to a .csv, .ndjson or .jsonl file.
+        index_dir (str): Directory to cache the line index in, normally the run's result
+            directory. None builds the index without caching it.
+    """
+    def __init__(self, path: str, index_dir: str = None):
+        self.path = path
+        self.index_dir = index_dir
+        self.row_format = "csv" if path.endswith(".csv") else "ndjson"
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b""
+        self._offsets = self._load_index()
+
+        self.fieldnames = None
+        if self.row_format == "csv" and self._offsets:
+            self.fieldnames = next(csv.reader([self._line_at(self._offsets[0])]))
+            self._first_row = 1
+        else:
+            self._first_row = 0
+
+    def __len__(self):
+        return len(self._offsets) - self._first_row
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        line = self._line_at(self._offsets[index + self._first_row])
+        if self.row_format == "csv":
+            return dict(zip(self.fieldnames, next(csv.reader([line]))))
+        return json.loads(line)
+
+    def _line_at(self, start: int) -> str:
+        end = self._mmap.find(b"\n", start)
+        if end == -1:
+            end = self._size
+        return self._mmap[start:end].rstrip(b"\r").decode("utf-8")
+
+    def _build_index(self) -> array:
+        # 4-byte offsets are enough for files under 4 GB, halving the index size
+        offsets = array("I" if self._size < 2 ** 32 else "Q")
+        position = 0
+        while position < self._size:
+            end = min(position + INDEX_CHUNK_BYTES, self._size)
+            if end < self._size:
+                # Cut the chunk after its last newline so no line spans two chunks
+                newline = self._mmap.rfind(b"\n", position, end)
+                if newline == -1:
+                    newline = self._mmap.find(b"\n", end)
+                end = self._size if newline == -1 else newline + 1
+            chunk = self._mmap[position:end]
+            lines = chunk.split(b"\n")
+            # Line starts are running sums of the line lengths plus their newlines; compress()
+            # drops blank lines (empty, or just "\r" in CRLF files) without a Python-level loop
+            starts = accumulate(map(operator.add, map(len, lines), repeat(1)), initial=position)
+            nonblank = map(bytes.rstrip, lines, repeat(b"\r")) if b"\r" in chunk else lines
+            offsets.extend(compress(starts, nonblank))
+            position = end
+        return offsets
+
+    def _load_index(self) -> array:
+        if self.index_dir is None:
+            return self._build_index()
+        index_path = os.path.join(self.index_dir, os.path.basename(self.path) + INDEX_FILE_SUFFIX)
+        stat = os.stat(self.path)
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+        try:
+            with open(index_path, "rb") as f:
+                header, typecode = f.readline().decode().split()
+                if header == signature:
+                    offsets = array(typecode)
+                    offsets.frombytes(f.read())
+                    logger.info(f"Loaded cached line index for {self.path} ({len(offsets)} lines).")
+                    return offsets
+        except (OSError, ValueError):
+            pass
+
+        offsets = self._build_index()
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            temp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(f"{signature} {offsets.typecode}\n".encode())
+                offsets.tofile(f)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            logger.warning(f"Could not cache line index for {self.path}: {e}")
+        logger.info(f"Indexed {len(offsets)} lines in {self.path}.")
+        return offsets
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+
+def should_stream_data_file(path: str) -> bool:
+    """Whether a data file should be read through MappedRowSource rather than parsed eagerly."""
+    if path.endswith(STREAMING_FILE_EXTENSIONS):
+        return True
+    if not path.endswith(".csv"):
+        return False
+    streaming = os.getenv("DATA_STREAMING", "auto").lower()
+    if streaming in ("true", "false"):
+        return streaming == "true"
+    threshold = int(os.getenv("DATA_STREAMING_THRESHOLD_BYTES", DEFAULT_STREAMING_THRESHOLD_BYTES))
+    return os.path.getsize(path) >= threshold
@@ -0,0 +1,264 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import gevent
+import psutil
+
+from metrics_aggregator import LatencyHistogram
+from node_stats import SATURATION_CPU_PERCENT
+from run_config import ACTION_NONE, ACTION_ABORT, ACTION_ADD_WORKERS, SATURATION_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+# Average event loop lag above which greenlets (request timers included) run noticeably late
+DEFAULT_LOOP_LAG_THRESHOLD_MS = 50.0
+# Seconds a generator process must stay saturated before the run counts as generator-bound
+DEFAULT_SATURATION_SECONDS = 30.0
+DEFAULT_HEALTH_INTERVAL = 2.0
+LOOP_LAG_PROBE_INTERVAL = 0.05
+
+
+class LoopLagProbe:
+    """
+    Measures gevent event loop lag: a greenlet sleeps ``interval`` seconds in a loop and
+    records how much later than requested it wakes up. A busy loop delays every greenlet,
+    including the ones timing requests, so lag shows up as inflated response times.
+    ``snapshot`` and ``take_histogram`` read and reset separate windows.
+
+    Args:
+        interval (float): Seconds between probes.
+    """
+    def __init__(self, interval: float = LOOP_LAG_PROBE_INTERVAL):
+        self.interval = interval
+        self._greenlet = None
+        self.histogram = LatencyHistogram()
+        self._reset()
+
+    def start(self):
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+
+    def _run(self):
+        while True:
+            started = time.perf_counter()
+            gevent.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - started - self.interval))
+
+    def record(self, lag: float):
+        self._count += 1
+        self._total += lag
+        if lag > self._max:
+            self._max = lag
+        self.histogram.record(lag * 1000)
+
+    def _reset(self):
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def snapshot(self) -> dict:
+        """Average and maximum lag since the previous snapshot, in milliseconds."""
+        stats = {
+            "loop_lag_avg_ms": self._total / self._count * 1000 if self._count else 0.0,
+            "loop_lag_max_ms": self._max * 1000,
+        }
+        self._reset()
+        return stats
+
+    def take_histogram(self) -> LatencyHistogram:
+        """Lag histogram (milliseconds) since the previous call."""
+        histogram, self.histogram = self.histogram, LatencyHistogram()
+        return histogram
+
+
+class GeneratorHealthMonitor:
+    """
+    Samples the health of this load-generator process: CPU and RSS of the process and any
+    child processes, and event loop lag. A process counts as saturated when its own CPU use
+    (a gevent process is limited to one core) or its average loop lag crosses a threshold.
+
+    Args:
+        cpu_threshold (float): Process CPU percent that counts as saturated.
+        lag_threshold_ms (float): Average loop lag that counts as saturated.
+    """
+    def __init__(self, cpu_threshold: float = SATURATION_CPU_PERCENT,
+                 lag_threshold_ms: float = DEFAULT_LOOP_LAG_THRESHOLD_MS):
+        self.cpu_threshold = cpu_threshold
+        self.lag_threshold_ms = lag_threshold_ms
+        self.probe = LoopLagProbe()
+        self._process = psutil.Process()
+        self._process.cpu_percent()  # cpu_percent measures from the previous call
+        self._children = {}
+
+    def start(self):
+        self.probe.start()
+
+    def stop(self):
+        self.probe.stop()
+
+    def sample(self) -> dict:
+        cpu = self._process.cpu_percent()
+        rss = self._process.memory_info().rss
+        children_cpu = 0.0
+        children = {}
+        for child in self._process.children(recursive=True):
+            # Keep the Process objects so cpu_percent measures since the previous sample
+            child = self._children.get(child.pid, child)
+            try:
+                children_cpu += child.cpu_percent()
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+            children[child.pid] = child
+        self._children = children
+
+        stats = {
+            "cpu_percent": cpu,
+            "tree_cpu_percent": cpu + children_cpu,
+            "rss_mb": rss / (1024 * 1024),
+            "processes": 1 + len(children),
+        }
+        stats.update(self.probe.snapshot())
+        stats["saturated"] = cpu >= self.cpu_threshold or stats["loop_lag_avg_ms"] >= self.lag_threshold_ms
+        return stats
+
+    @staticmethod
+    def from_env():
+        return GeneratorHealthMonitor(
+            cpu_threshold=float(os.getenv("GENERATOR_CPU_THRESHOLD", SATURATION_CPU_PERCENT)),
+            lag_threshold_ms=float(os.getenv("GENERATOR_LOOP_LAG_THRESHOLD_MS", DEFAULT_LOOP_LAG_THRESHOLD_MS)))
+
+
+class SaturationGuard:
+    """
+    Decides when a run is generator-bound. Fed the health samples of every load-generator
+    process of a run (on the master, or the only process in standalone mode), it tracks how
+    long each process has been saturated without interruption. Once one stays saturated for
+    ``threshold_seconds`` the run is marked generator-bound and the configured action runs:
+
+    - ``none``: only mark the run (the results are suspect, latencies may be inflated).
+    - ``abort``: stop the test.
+    - ``add_workers``: start another local worker process, up to ``max_workers``; the
+      saturation clocks restart so the next worker is only added if it was not enough.
+
+    Args:
+        threshold_seconds (float): Continuous saturation that marks the run generator-bound.
+        action (str): One of SATURATION_ACTIONS.
+        on_abort (callable): Stops the test.
+        add_worker (callable): Starts one more worker and returns True, or None if workers
+                               cannot be added in this run (e.g. standalone or pool placement).
+        worker_count (callable): Current number of workers.
+        max_workers (int): Upper bound on workers for ``add_workers``.
+    """
+    def __init__(self, threshold_seconds: float = DEFAULT_SATURATION_SECONDS, action: str = ACTION_NONE,
+                 on_abort=None, add_worker=None, worker_count=None, max_workers: int = None):
+        if action not in SATURATION_ACTIONS:
+            raise ValueError(f"Saturation action must be one of {', '.join(SATURATION_ACTIONS)}, got '{action}'.")
+        self.threshold_seconds = threshold_seconds
+        self.action = action
+        self.on_abort = on_abort
+        self.add_worker = add_worker
+        self.worker_count = worker_count
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.generator_bound = False
+        self._saturated_since = {}
+        self._aborted = False
+
+    def observe(self, process: str, sample: dict, now: float = None):
+        """
+        Records one process' health sample. Returns the ``generator_bound`` event to log when
+        this sample pushed the process over the threshold, else None. Adds ``saturated_seconds``
+        to the sample.
+        """
+        now = time.monotonic() if now is None else now
+        if not sample.get("saturated"):
+            self._saturated_since.pop(process, None)
+            sample["saturated_seconds"] = 0.0
+            return None
+        since = self._saturated_since.setdefault(process, now)
+        sample["saturated_seconds"] = now - since
+        if now - since < self.threshold_seconds:
+            return None
+
+        self.generator_bound = True
+        event = {"process": process, "saturated_seconds": now - since, "cpu_percent": sample.get("cpu_percent"),
+                 "loop_lag_avg_ms": sample.get("loop_lag_avg_ms"), "action": self.action}
+        if self.action == ACTION_ABORT and not self._aborted:
+            self._aborted = True
+            logger.error(f"Load generator {process} saturated for {now - since:.0f}s, aborting the test.")
+            if self.on_abort is not None:
+                self.on_abort()
+        elif self.action == ACTION_ADD_WORKERS:
+            workers = self.worker_count() if self.worker_count is not None else 0
+            if workers >= self.max_workers:
+                event["action"] = ACTION_NONE
+                event["reason"] = f"already at the maximum of {self.max_workers} workers"
+            elif self.add_worker is None or not self.add_worker():
+                event["action"] = ACTION_NONE
+                event["reason"] = "workers can only be added to distributed runs with local workers"
+            else:
+                logger.warning(f"Load generator {process} saturated for {now - since:.0f}s, added a worker "
+                               f"({workers + 1} now).")
+        else:
+            logger.warning(f"Load generator {process} saturated for {now - since:.0f}s; "
+                           f"results are generator-bound.")
+        # Restart every clock: the next event needs another full period of saturation
+        self._saturated_since.clear()
+        return event
+
+
+class LocalWorkerLauncher:
+    """
+    Starts extra Locust worker processes next to a master bound to this host, for
+    SaturationGuard's ``add_workers`` action. The workers join the master's process group,
+    so stopping the run stops them too; ``stop`` reaps them when the master quits.
+
+    Args:
+        environment (locust.env.Environment): The master's environment.
+        locustfile (str): Path of the locust script the workers run.
+        first_index (int): LOCUST_WORKER_INDEX of the first added worker.
+    """
+    def __init__(self, environment, locustfile: str, first_index: int):
+        self.environment = environment
+        self.locustfile = locustfile
+        self.next_index = first_index
+        self.processes = []
+
+    def available(self) -> bool:
+        options = self.environment.parsed_options
+        return options is not None and getattr(options, "master_bind_host", None) in ("127.0.0.1", "localhost")
+
+    def add_worker(self) -> bool:
+        if not self.available():
+            return False
+        options = self.environment.parsed_options
+        index = self.next_index
+        log_dir = os.path.dirname(os.path.abspath(options.logfile)) if options.logfile else os.getcwd()
+        cmd = [sys.executable, "-m", "locust", "-f", self.locustfile, "--worker",
+               "--master-host", "127.0.0.1", "--master-port", str(options.master_bind_port),
+               "--logfile", os.path.join(log_dir, f"locust_worker_{index}.log")]
+        if self.environment.host:
+            cmd.extend(["--host", self.environment.host])
+        env = dict(os.environ, LOCUST_ROLE="worker", LOCUST_WORKER_INDEX=str(index))
+        with open(os.path.join(log_dir, f"flask_locust_runner_worker_{index}.log"), "wb") as output:
+            self.processes.append(subprocess.Popen(cmd, env=env, stdout=output, stderr=subprocess.STDOUT))
+        self.next_index += 1
+        logger.info(f"Started extra Locust worker {index} (PID {self.processes[-1].pid}).")
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
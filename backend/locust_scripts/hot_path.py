@@ -0,0 +1,90 @@
+import time
+
+import gevent
+
+from metrics_aggregator import LatencyHistogram
+
+# Phases of one request on a load generator. Everything but "network" is our own code.
+PHASE_RENDER = "render"  # Payload template rendering
+PHASE_PAYLOAD = "payload"  # Data row, binary payload and request arguments
+PHASE_NETWORK = "network"  # Sending the request until the response is available
+PHASE_RESPONSE = "response"  # Content checks and decoding, JSONPath excluded
+PHASE_JSONPATH = "jsonpath"  # JSONPath assertions and custom metric extraction
+PHASE_LOGGING = "logging"  # Request event listeners: stats, metrics aggregation, logging
+PHASES = (PHASE_RENDER, PHASE_PAYLOAD, PHASE_NETWORK, PHASE_RESPONSE, PHASE_JSONPATH, PHASE_LOGGING)
+
+
+class HotPathTimer:
+    """
+    Splits the time a load generator spends per request into phases, so a missed QPS target
+    can be traced to the target (network) or to our own per-request code.
+
+    Phases are measured with ``mark``/``add_since`` around code that does not yield to the
+    hub; time recorded for nested phases (e.g. the request event fired for a JSONPath metric
+    inside response handling) is subtracted, so every millisecond is counted once. The
+    network phase does yield: it also covers time the greenlet waited for a busy hub after
+    its response arrived, which the loop lag histogram shows.
+    """
+    def __init__(self):
+        self._recorded = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._totals = dict.fromkeys(PHASES, 0.0)
+        self._requests = 0
+
+    def mark(self) -> tuple:
+        return time.perf_counter(), self._recorded
+
+    def add(self, phase: str, seconds: float):
+        self._totals[phase] += seconds
+        self._recorded += seconds
+
+    def add_since(self, phase: str, mark: tuple):
+        """Records the time since ``mark`` as ``phase``, less any phases recorded in between."""
+        started, recorded = mark
+        self.add(phase, time.perf_counter() - started - (self._recorded - recorded))
+
+    def record_request(self):
+        self._requests += 1
+
+    def snapshot(self) -> dict:
+        """Milliseconds per phase since the previous snapshot, in total and per request."""
+        requests = self._requests
+        stats = {"hot_path_requests": requests}
+        own = 0.0
+        for phase in PHASES:
+            total = self._totals[phase] * 1000
+            stats[f"hot_path_{phase}_ms"] = total
+            if phase != PHASE_NETWORK:
+                own += total
+        stats["hot_path_own_ms"] = own
+        stats["hot_path_own_avg_ms"] = own / requests if requests else 0.0
+        stats["hot_path_network_avg_ms"] = stats["hot_path_network_ms"] / requests if requests else 0.0
+        self._reset()
+        return stats
+
+
+def loop_lag_stats(histogram: LatencyHistogram) -> dict:
+    """Summary fields for an event loop lag histogram (milliseconds)."""
+    return {
+        "loop_lag_histogram": histogram.to_dict(),
+        "loop_lag_samples": histogram.count,
+        "loop_lag_p50_ms": histogram.percentile(0.5) or 0.0,
+        "loop_lag_p99_ms": histogram.percentile(0.99) or 0.0,
+        "loop_lag_max_ms": histogram.max or 0.0,
+    }
+
+
+def greenlet_counts(runner) -> dict:
+    """
+    Cheap greenlet and hub counters: running user greenlets plus the hub's active and pending
+    watchers (waiting sockets and timers). Walking the heap for every greenlet is too slow to
+    do on a loaded generator.
+    """
+    loop = gevent.get_hub().loop
+    return {
+        "user_greenlets": len(runner.user_greenlets) if runner is not None else 0,
+        "hub_active_watchers": getattr(loop, "activecnt", 0),
+        "hub_pending_watchers": getattr(loop, "pendingcnt", 0),
+    }
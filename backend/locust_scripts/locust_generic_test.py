@@ -1,17 +1,18 @@
-from flask import current_app
-from locust import task, events, between
-from locust.contrib.fasthttp import FastHttpUser
+from locust import task, events, between, constant
+from locust.contrib.fasthttp import FastHttpUser, insecure_ssl_context_factory
+from locust.runners import MasterRunner, WorkerRunner, STATE_RUNNING, STATE_SPAWNING
 import os, csv, json, sys
+import itertools
+import math
 from string import Template
 from urllib.parse import urlencode
-from jsonpath_ng import jsonpath, parse
 import logging
 import time
 from locust import events
 
-from backend.app import BASE_TEST_RESULTS_DIR
-from locust_logger import get_logger
+from locust_logger import get_logger, METRICS_EVENTS_MESSAGE
 from gevent import sleep, spawn
+import gevent.ssl
 
 # Get the absolute path of the directory containing this script.
 # This ensures it works regardless of the current working directory from which Locust is started.
@@ -23,6 +24,21 @@ if current_script_dir not in sys.path:
 
 # Now, use an absolute import for your plugin:
 from constant_throughput_plugin import ConstantThroughput
+from metrics_aggregator import RequestMetricsAggregator, LatencyHistogram, DEFAULT_AGGREGATION_INTERVAL
+from hot_path import (HotPathTimer, loop_lag_stats, greenlet_counts, PHASE_RENDER, PHASE_PAYLOAD, PHASE_NETWORK,
+                      PHASE_RESPONSE, PHASE_JSONPATH, PHASE_LOGGING)
+from response_plan import (JsonPathPlan, ResponsePlan, body_preview, BODY_DECODE, ERROR_PREVIEW_BYTES, KIND_ERROR,
+                           KIND_JSON, KIND_TEXT, KIND_BINARY, KIND_NO_CONTENT)
+from payload_engine import (PayloadRenderer, BinaryPayloadSource, DEFAULT_PAYLOAD_CACHE_SIZE,
+                            DEFAULT_BINARY_CONTENT_TYPE, DEFAULT_BINARY_MMAP_THRESHOLD_BYTES)
+from open_workload import OpenWorkloadExecutor, ARRIVAL_CONSTANT, DEFAULT_MAX_CONCURRENCY
+from node_stats import WorkerLoadSampler, combine_node_stats
+from generator_health import (GeneratorHealthMonitor, SaturationGuard, LocalWorkerLauncher, ACTION_NONE,
+                              DEFAULT_HEALTH_INTERVAL, DEFAULT_SATURATION_SECONDS)
+from data_feeder import (DataFeeder, MappedRowSource, should_stream_data_file, shard_rows, FEED_MODE_SEQUENTIAL,
+                         FEED_MODE_UNIQUE)
+from connection_timing import TimedHTTPClientPool, begin_request, end_request
+from run_config import POOL_PER_USER, POOL_SHARED, CONNECTION_POOL_MODES, test_results_dir
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,38 +49,236 @@ logger = logging.getLogger(__name__)
 DEFAULT_WAIT_TIME_MIN = 1
 DEFAULT_WAIT_TIME_MAX = 2
 GLOBAL_TARGET_QPS = float(os.getenv("TARGET_QPS", 0)) # Define GLOBAL_TARGET_QPS here
-
+# "open" launches requests on an arrival schedule (see OpenWorkloadExecutor) instead of closed-loop users
+OPEN_WORKLOAD = os.getenv("LOCUST_MODE", "").lower() == "open"
+# Sent by the master so every worker takes an equal share of GLOBAL_TARGET_QPS
+QPS_WORKER_COUNT_MESSAGE = "qps_worker_count"
+# Sent by workers with their per-interval request stats, merged by the master's aggregator
+REQUEST_METRICS_MESSAGE = "request_metrics"
+
+# --- Request metrics logging ---
+# "aggregate" (default) emits one per-interval histogram record per request name.
+# "raw" writes one line per request and is meant for debugging only.
+REQUEST_LOG_MODE = os.getenv("REQUEST_LOG_MODE", "aggregate").lower()
+METRICS_AGGREGATION_INTERVAL = float(os.getenv("METRICS_AGGREGATION_INTERVAL", DEFAULT_AGGREGATION_INTERVAL))
+
+# On distributed workers this forwards to the master, which is the only writer of the metrics log
 locust_log = get_logger()
+request_aggregator = RequestMetricsAggregator(locust_log, interval=METRICS_AGGREGATION_INTERVAL)
+# Latest worker_summary per worker with the master's receive time (master only), combined
+# into the run summary and the per-node node_stats events
+worker_snapshots = {}
+# Request rate and CPU use of this worker process (distributed workers only)
+load_sampler = None
+SUMMARY_INTERVAL = 5
+# CPU, RSS and event loop lag of this process, logged as generator_health events. The master
+# (or the only process in standalone mode) judges saturation for the whole run.
+health_monitor = None
+saturation_guard = None
+# Starts extra local workers for GENERATOR_SATURATION_ACTION=add_workers (master only)
+worker_launcher = None
+GENERATOR_HEALTH_INTERVAL = float(os.getenv("GENERATOR_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL))
+# Where this process spends its time per request (our code vs. network), reported with each summary
+hot_path_timer = HotPathTimer()
+# Epoch time the service launched the run (RUN_LAUNCHED_AT); this process' first request
+# is reported against it once, as start-to-first-request latency
+RUN_LAUNCHED_AT = float(os.getenv("RUN_LAUNCHED_AT", 0))
+first_request_sent = False
 
 @events.request.add_listener
 def log_request(request_type, name, response_time, response_length, response, context, exception, **kwargs):
-    locust_log.log_event("request", {
-        "request_type": request_type,
-        "name": name,
-        "response_time": response_time,
-        "response_length": response_length,
-        "success": exception is None
-    })
+    mark = hot_path_timer.mark()
+    if REQUEST_LOG_MODE == "raw":
+        locust_log.log_event("request", {
+            "request_type": request_type,
+            "name": name,
+            "response_time": response_time,
+            "response_length": response_length,
+            "success": exception is None
+        })
+    else:
+        request_aggregator.record(request_type, name, response_time, response_length, exception is None)
+    if load_sampler is not None:
+        load_sampler.record_request()
+    hot_path_timer.add_since(PHASE_LOGGING, mark)
 
 @events.test_start.add_listener
 def on_test_start(environment, **kwargs):
+    if REQUEST_LOG_MODE != "raw":
+        request_aggregator.start()
+
+    if isinstance(environment.runner, MasterRunner) and GLOBAL_TARGET_QPS > 0:
+        environment.runner.send_message(QPS_WORKER_COUNT_MESSAGE, environment.runner.worker_count)
+    health_monitor.start()
+
+    def periodic_health_logger():
+        process = "master" if isinstance(environment.runner, MasterRunner) else "standalone"
+        while True:
+            sleep(GENERATOR_HEALTH_INTERVAL)
+            try:
+                sample = health_monitor.sample()
+                if isinstance(environment.runner, WorkerRunner):
+                    locust_log.log_event("generator_health", dict(sample, process="worker"))
+                else:
+                    sample["process"] = process
+                    _judge_generator_health(process, sample)
+                    locust_log.log_event("generator_health", sample)
+            except Exception as e:
+                locust_log.log_event("error", {"message": f"Failed to sample generator health: {e}"})
+                break
+
     def periodic_summary_logger():
         while True:
             try:
+                if isinstance(environment.runner, WorkerRunner):
+                    # The master logs the run summary; workers report their own load and scheduler state
+                    snapshot = _scheduler_snapshot()
+                    snapshot.update(_hot_path_snapshot(environment))
+                    snapshot.update(load_sampler.sample())
+                    snapshot["user_count"] = environment.runner.user_count
+                    locust_log.log_event("worker_summary", snapshot)
+                    sleep(SUMMARY_INTERVAL)
+                    continue
                 stats = environment.stats.total
-                locust_log.log_event("summary", {
+                summary = {
                     "user_count": environment.runner.user_count,
                     "rps": stats.total_rps,
                     "fail_ratio": stats.fail_ratio,
                     "p95": stats.get_response_time_percentile(0.95),
                     "p99": stats.get_response_time_percentile(0.99),
-                })
-                sleep(5)
+                }
+                if isinstance(environment.runner, MasterRunner):
+                    summary["workers"] = environment.runner.worker_count
+                    summary.update(_combine_worker_snapshots(snapshot for snapshot, _ in worker_snapshots.values()))
+                else:
+                    summary.update(_scheduler_snapshot())
+                    summary.update(_hot_path_snapshot(environment))
+                # Run-wide DNS/connect/TLS/TTFB/body percentiles, to tell connection setup from server time
+                summary.update(request_aggregator.phase_summary())
+                # Latencies of a saturated generator are inflated; see the generator_bound event
+                summary["generator_bound"] = saturation_guard.generator_bound
+                locust_log.log_event("summary", summary)
+                if isinstance(environment.runner, MasterRunner):
+                    # Health, CPU saturation and achieved RPS per load-generator node
+                    for node in combine_node_stats(worker_snapshots.values(), stale_after=3 * SUMMARY_INTERVAL):
+                        locust_log.log_event("node_stats", node)
+                sleep(SUMMARY_INTERVAL)
             except Exception as e:
                 locust_log.log_event("error", {"message": f"Failed to emit summary stats: {e}"})
                 break
 
     spawn(periodic_summary_logger)
+    spawn(periodic_health_logger)
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner):
+        # Hand the last partial interval to the master while it is still listening
+        request_aggregator.flush()
+        locust_log.flush()
+
+def _scheduler_snapshot():
+    if isinstance(GenericUser.wait_time, ConstantThroughput):
+        # Achieved vs. target QPS and permit scheduling lag for this worker
+        return GenericUser.wait_time.snapshot()
+    if GenericUser.open_workload is not None:
+        # Arrival rate plus dropped/late arrivals for this worker
+        return GenericUser.open_workload.snapshot()
+    return {}
+
+def _hot_path_snapshot(environment):
+    """Per-phase request time, event loop lag histogram and greenlet counts of this process."""
+    snapshot = hot_path_timer.snapshot()
+    snapshot.update(loop_lag_stats(health_monitor.probe.take_histogram()))
+    snapshot.update(greenlet_counts(environment.runner))
+    return snapshot
+
+# worker_summary fields that describe the worker itself rather than its share of the schedule
+_WORKER_ONLY_FIELDS = ("worker_target_qps", "user_count", "timestamp", "rps", "cpu_percent", "host_cpu_percent")
+
+# The count behind each *_avg_ms field of a worker_summary, by field name prefix. The workers' averages are
+# weighted by it, so a worker that sent 10 requests counts less than one that sent 10,000
+_AVERAGE_WEIGHT_FIELDS = {"hot_path_": "hot_path_requests", "schedule_lag_": "permits"}
+
+def _average_weight(snapshot, key):
+    for prefix, weight_field in _AVERAGE_WEIGHT_FIELDS.items():
+        if key.startswith(prefix):
+            return snapshot.get(weight_field, 1)
+    return 1
+
+def _combine_worker_snapshots(snapshots):
+    """Run-wide view of the workers' scheduler snapshots: rates and counters add up, maxima and lags do not."""
+    combined = {}
+    # *_avg_ms key -> [sum of weighted averages, sum of weights] over the snapshots that have it
+    averages = {}
+    loop_lag = None
+    for snapshot in snapshots:
+        if "loop_lag_histogram" in snapshot:
+            # Percentiles do not add up; merge the histograms and take them from the result
+            loop_lag = loop_lag or LatencyHistogram()
+            loop_lag.merge(LatencyHistogram.from_dict(snapshot["loop_lag_histogram"]))
+        for key, value in snapshot.items():
+            if key in _WORKER_ONLY_FIELDS or key.startswith("loop_lag_") or not isinstance(value, (int, float)):
+                continue
+            if key.endswith("_avg_ms"):
+                weight = _average_weight(snapshot, key)
+                totals = averages.setdefault(key, [0.0, 0])
+                totals[0] += value * weight
+                totals[1] += weight
+            elif key == "target_qps" or key.endswith("_max_ms"):
+                combined[key] = max(combined.get(key, value), value)
+            else:
+                combined[key] = combined.get(key, 0) + value
+    for key, (total, weight) in averages.items():
+        combined[key] = total / weight if weight else 0.0
+    if loop_lag is not None:
+        combined.update(loop_lag_stats(loop_lag))
+    return combined
+
+def _report_first_request():
+    """Logs how long this process took from the run's launch to sending its first request."""
+    global first_request_sent
+    first_request_sent = True
+    data = {"warm_start": os.getenv("LOCUST_WARM_START") == "1",
+            "role": os.getenv("LOCUST_ROLE", "standalone")}
+    if RUN_LAUNCHED_AT:
+        data["start_latency_ms"] = (time.time() - RUN_LAUNCHED_AT) * 1000
+    locust_log.log_event("first_request", data)
+
+def _judge_generator_health(process, sample):
+    """Master/standalone: tracks saturation of one generator process, acting on it once it lasts."""
+    bound = saturation_guard.observe(process, sample)
+    if bound is not None:
+        locust_log.log_event("generator_bound", bound)
+
+def _on_metrics_events(environment, msg, **kwargs):
+    for data in msg.data:
+        data["worker"] = msg.node_id
+        if data.get("event") == "worker_summary":
+            worker_snapshots[msg.node_id] = (data, time.time())
+        elif data.get("event") == "generator_health":
+            _judge_generator_health(msg.node_id, data)
+        locust_log.log(data)
+
+def _on_worker_joined(environment, client_id, timeout=10.0):
+    """Master: spreads the load over a worker that joined a running test (e.g. one added on saturation)."""
+    runner = environment.runner
+    if runner.state not in (STATE_RUNNING, STATE_SPAWNING):
+        return
+    # worker_connect fires before the worker is registered, and Locust then respawns onto it
+    deadline = time.monotonic() + timeout
+    while client_id not in runner.clients or runner.state != STATE_RUNNING:
+        if time.monotonic() > deadline:
+            return
+        sleep(0.1)
+    if GLOBAL_TARGET_QPS > 0:
+        runner.send_message(QPS_WORKER_COUNT_MESSAGE, runner.worker_count)
+        # Every worker paces its share of the rate and needs a user to send it
+        if runner.target_user_count < runner.worker_count:
+            runner.start(runner.worker_count, max(runner.spawn_rate, runner.worker_count))
+
+def _on_request_metrics(environment, msg, **kwargs):
+    request_aggregator.merge(msg.data)
 
 # --- Custom Event for JSONPath Metrics ---
 @events.init.add_listener
@@ -74,23 +288,81 @@ def _locust_init_handler(environment, **kwargs):
 
     logger.info("Locust environment initialized.")
 
+    # Load config and data once per process; all spawned users share it read-only.
+    # The master in distributed mode never runs users, so it skips the data load.
+    if not isinstance(environment.runner, MasterRunner):
+        GenericUser._load_test_config(environment)
+
+    if isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message(QPS_WORKER_COUNT_MESSAGE, _on_qps_worker_count)
+        # Metrics go to the master, which aggregates them into the one metrics log
+        global load_sampler
+        load_sampler = WorkerLoadSampler()
+        locust_log.attach(environment.runner)
+        request_aggregator.forward = lambda messages: environment.runner.send_message(REQUEST_METRICS_MESSAGE, messages)
+    elif isinstance(environment.runner, MasterRunner):
+        environment.runner.register_message(METRICS_EVENTS_MESSAGE, _on_metrics_events)
+        environment.runner.register_message(REQUEST_METRICS_MESSAGE, _on_request_metrics)
+        global worker_launcher
+        worker_launcher = LocalWorkerLauncher(environment, os.path.abspath(__file__),
+                                              first_index=int(os.getenv("LOCUST_WORKER_COUNT", 1)))
+        # Locust fires this before it counts the new worker, so look once the handler returned
+        environment.events.worker_connect.add_listener(
+            lambda client_id, **_: spawn(_on_worker_joined, environment, client_id))
+
+    global health_monitor, saturation_guard
+    health_monitor = GeneratorHealthMonitor.from_env()
+    if not isinstance(environment.runner, WorkerRunner):
+        master = isinstance(environment.runner, MasterRunner)
+        try:
+            saturation_guard = SaturationGuard(
+                threshold_seconds=float(os.getenv("GENERATOR_SATURATION_SECONDS", DEFAULT_SATURATION_SECONDS)),
+                action=os.getenv("GENERATOR_SATURATION_ACTION", ACTION_NONE).lower(),
+                on_abort=environment.runner.quit if environment.runner else None,
+                add_worker=worker_launcher.add_worker if master else None,
+                worker_count=(lambda: environment.runner.worker_count) if master else None,
+                max_workers=int(os.getenv("GENERATOR_MAX_WORKERS", 0)) or None)
+        except ValueError as e:
+            logger.error(f"{e} Saturation is only reported.")
+            saturation_guard = SaturationGuard()
+
     # Attach a separate, explicit function to the quitting event for clarity
     # This event listener receives the environment instance as its argument
     @environment.events.quitting.add_listener
     def _locust_quitting_handler(environment, **quitting_kwargs): # Accept env and any other kwargs
         logger.info("Locust is quitting. Performing final cleanup (if any).")
-        # You can add cleanup logic here, e.g., closing connections, writing final reports
+        health_monitor.stop()
+        if worker_launcher is not None:
+            worker_launcher.stop()
+        # Emit the last partial aggregation interval, then drain the batched writer
+        request_aggregator.stop()
+        locust_log.close()
+
+def _on_qps_worker_count(environment, msg, **kwargs):
+    if isinstance(GenericUser.wait_time, ConstantThroughput):
+        GenericUser.wait_time.set_worker_count(msg.data)
+    if GenericUser.open_workload is not None:
+        GenericUser.open_workload.set_worker_count(msg.data)
 
 class GenericUser(FastHttpUser):
     # Default wait time (will be overridden if TARGET_QPS is set)
     wait_time_min = float(os.getenv("WAIT_TIME_MIN", DEFAULT_WAIT_TIME_MIN))
     wait_time_max = float(os.getenv("WAIT_TIME_MAX", DEFAULT_WAIT_TIME_MAX))
 
-    # wait_time will be set in the __init__ method for dynamic calculation
+    # wait_time is set once per process by _configure_wait_time
     wait_time = None
+    # Arrival scheduler shared per process when LOCUST_MODE is "open"
+    open_workload = None
 
     data_rows = []
+    # Shared by all users so the row cursor is global, see DATA_FEED_MODE
+    data_feeder = None
+    _user_index_counter = itertools.count()
     payload_template = None
+    # Built from payload_template/payload_type/headers by _load_test_config
+    payload_renderer = None
+    # Set instead of payload_renderer when PAYLOAD_TYPE is binary
+    binary_payload = None
     payload_type = None
     endpoint = None
     method = None
@@ -98,20 +370,61 @@ class GenericUser(FastHttpUser):
     reuse_data = True
     expected_json_path_values = {}
     custom_metrics_json_paths = []
-
-    # Initialize wait_time in __init__ to access self.environment
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._load_test_config() # Load config first as it might be needed for wait_time setup
-        self._configure_wait_time()
+    # Compiled from the two settings above by _load_test_config
+    json_path_plan = JsonPathPlan()
+    # Which response bodies are decoded, and which only drained (see ResponsePlan)
+    response_plan = ResponsePlan()
+    # HTTP connection settings, see _configure_connections. FastHttpUser's concurrency,
+    # connection_timeout, network_timeout and insecure attributes are set there as well.
+    connection_pool_mode = POOL_PER_USER
+    keep_alive = True
+
+    # Set once the per-process config has been loaded by the init hook
+    _config_loaded = False
+
+    def __init__(self, environment, *args, **kwargs):
+        if not self._config_loaded:
+            # Only reached if the init hook did not run (e.g. users created directly in tests)
+            self._load_test_config(environment)
+        if self.connection_pool_mode == POOL_PER_USER:
+            # FastHttpUser builds the user's session from client_pool
+            self.client_pool = self._build_client_pool(self.concurrency)
+        super().__init__(environment, *args, **kwargs)
+        self.user_index = next(GenericUser._user_index_counter)
+
+    def on_start(self):
+        if isinstance(self.wait_time, ConstantThroughput):
+            # Locust only waits after each task, so the first request takes its permit here;
+            # otherwise every user spawned by a ramp-up or spike would send one request at once
+            self.wait_time()
 
 
     @classmethod
-    def _configure_wait_time(cls):
-        if GLOBAL_TARGET_QPS > 0:
-            cls.wait_time = ConstantThroughput(GLOBAL_TARGET_QPS, None)  # Env gets injected later
-            # Log initial calculated per-user rate, but remind it's dynamic
-            logger.info(f"Using ConstantThroughput with GLOBAL_TARGET_QPS: {GLOBAL_TARGET_QPS}. Per-user rate will dynamically adjust.")
+    def _configure_wait_time(cls, environment=None):
+        if OPEN_WORKLOAD:
+            if cls.open_workload is None and environment is not None:
+                try:
+                    cls.open_workload = OpenWorkloadExecutor(
+                        GLOBAL_TARGET_QPS,
+                        distribution=os.getenv("ARRIVAL_DISTRIBUTION", ARRIVAL_CONSTANT).lower(),
+                        max_concurrency=int(os.getenv("OPEN_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                        worker_count=int(os.getenv("LOCUST_WORKER_COUNT", 1)))
+                except ValueError as e:
+                    logger.error(str(e))
+                    if environment.runner: # Check if runner exists
+                        environment.runner.quit()
+                    return
+                # Every in-flight arrival needs its own connection from the user's client pool
+                cls.concurrency = cls.open_workload.max_concurrency
+                logger.info(f"Using open workload model: {cls.open_workload.distribution} arrivals at {GLOBAL_TARGET_QPS} QPS, up to {cls.open_workload.max_concurrency} in flight.")
+            cls.wait_time = constant(0)
+        elif GLOBAL_TARGET_QPS > 0:
+            if isinstance(cls.wait_time, ConstantThroughput):
+                return  # One scheduler per process, shared by every user
+            # LOCUST_WORKER_COUNT is the initial split; the master corrects it at test start
+            cls.wait_time = ConstantThroughput(GLOBAL_TARGET_QPS, environment,
+                                               worker_count=int(os.getenv("LOCUST_WORKER_COUNT", 1)))
+            logger.info(f"Using ConstantThroughput with GLOBAL_TARGET_QPS: {GLOBAL_TARGET_QPS}. Permits are scheduled at the exact global rate.")
             logger.warning("WAIT_TIME_MIN and WAIT_TIME_MAX environment variables will be ignored when TARGET_QPS is set.")
         else:
             # Otherwise, use the configured wait_time_min/max
@@ -124,77 +437,117 @@ class GenericUser(FastHttpUser):
         cls._configure_wait_time()
 
 
-    def _load_test_config(self):
+    @classmethod
+    def _load_test_config(cls, environment):
+        """
+        Parses the test configuration and data file once per process and stores it on the
+        class, so every spawned user shares the same read-only data instead of re-parsing it.
+        """
         data_file = os.getenv("DATA_FILE")
         payload_template_path = os.getenv("PAYLOAD_TEMPLATE")
-        self.payload_type = os.getenv("PAYLOAD_TYPE", "json").lower()
-        self.endpoint = os.getenv("ENDPOINT", "/")
-        self.method = os.getenv("METHOD", "POST").upper()
+        cls.payload_type = os.getenv("PAYLOAD_TYPE", "json").lower()
+        cls.endpoint = os.getenv("ENDPOINT", "/")
+        cls.method = os.getenv("METHOD", "POST").upper()
         headers_env = os.getenv("HEADERS")
-        self.reuse_data = os.getenv("REUSE_DATA", "true").lower() == "true"
+        cls.reuse_data = os.getenv("REUSE_DATA", "true").lower() == "true"
 
         # --- Error Handling for Headers ---
         if headers_env:
             try:
-                self.headers = json.loads(headers_env)
-                logger.info(f"Loaded custom headers: {self.headers}")
+                cls.headers = json.loads(headers_env)
+                logger.info(f"Loaded custom headers: {cls.headers}")
             except json.JSONDecodeError:
                 logger.error(f"Failed to parse HEADERS environment variable as JSON. Value: '{headers_env}'")
-                self.headers = {} # Ensure it's an empty dict if parsing fails
+                cls.headers = {} # Ensure it's an empty dict if parsing fails
             except Exception as e:
                 logger.error(f"An unexpected error occurred while parsing HEADERS: {e}")
-                self.headers = {}
+                cls.headers = {}
+
+        # HTTP_KEEP_ALIVE=false opens a new connection (and TLS handshake) for every request:
+        # each one asks the server to close the connection after its response
+        cls.keep_alive = os.getenv("HTTP_KEEP_ALIVE", "true").lower() == "true"
+        if not cls.keep_alive:
+            cls.headers = dict(cls.headers, Connection="close")
 
         # --- Error Handling for Data File ---
         if not data_file:
             logger.warning("DATA_FILE environment variable not set. No data will be used for requests.")
         elif not os.path.exists(data_file):
             logger.error(f"DATA_FILE '{data_file}' not found. Please check the path.")
-            if self.environment and self.environment.runner: # Check if runner exists
-                self.environment.runner.quit()
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
         else:
             try:
-                if data_file.endswith(".csv"):
+                if should_stream_data_file(data_file):
+                    # The line index is cached in the run's own directory, shared by its processes
+                    index_dir = os.path.join(test_results_dir(), os.getenv("TEST_ID", "unknown"))
+                    cls.data_rows = MappedRowSource(data_file, index_dir=index_dir)
+                    logger.info(f"Memory-mapped {len(cls.data_rows)} rows from: {data_file}")
+                elif data_file.endswith(".csv"):
                     with open(data_file, newline='') as f:
-                        self.data_rows = list(csv.DictReader(f))
-                    logger.info(f"Loaded {len(self.data_rows)} rows from CSV: {data_file}")
+                        cls.data_rows = list(csv.DictReader(f))
+                    logger.info(f"Loaded {len(cls.data_rows)} rows from CSV: {data_file}")
                 elif data_file.endswith(".json"):
                     with open(data_file) as f:
-                        self.data_rows = json.load(f)
-                    logger.info(f"Loaded {len(self.data_rows)} entries from JSON: {data_file}")
+                        cls.data_rows = json.load(f)
+                    logger.info(f"Loaded {len(cls.data_rows)} entries from JSON: {data_file}")
                 else:
-                    logger.error(f"Unsupported data file type: {data_file}. Only .csv and .json are supported.")
-                    if self.environment and self.environment.runner: # Check if runner exists
-                        self.environment.runner.quit()
+                    logger.error(f"Unsupported data file type: {data_file}. Only .csv, .json and .ndjson/.jsonl are supported.")
+                    if environment and environment.runner: # Check if runner exists
+                        environment.runner.quit()
             except Exception as e:
                 logger.error(f"Error loading data file '{data_file}': {e}")
-                if self.environment and self.environment.runner: # Check if runner exists
-                    self.environment.runner.quit()
+                if environment and environment.runner: # Check if runner exists
+                    environment.runner.quit()
+
+        if cls.data_rows:
+            cls._configure_data_feeder(environment)
 
         # --- Error Handling for Payload Template ---
         if not payload_template_path:
             logger.warning("PAYLOAD_TEMPLATE environment variable not set. Requests will be sent without templated bodies.")
-            self.payload_template = Template("") # Empty template
+            cls.payload_template = Template("") # Empty template
         elif not os.path.exists(payload_template_path):
             logger.error(f"PAYLOAD_TEMPLATE '{payload_template_path}' not found. Please check the path.")
-            if self.environment and self.environment.runner: # Check if runner exists
-                self.environment.runner.quit()
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
+        elif cls.payload_type == "binary":
+            # Binary payloads are loaded once per process (file, directory or archive), never as a text template
+            try:
+                cls.binary_payload = BinaryPayloadSource(
+                    payload_template_path, cls.headers,
+                    content_type=os.getenv("BINARY_CONTENT_TYPE", DEFAULT_BINARY_CONTENT_TYPE),
+                    rotate=os.getenv("BINARY_PAYLOAD_ROTATE", "false").lower() == "true",
+                    mmap_threshold=int(os.getenv("BINARY_MMAP_THRESHOLD_BYTES", DEFAULT_BINARY_MMAP_THRESHOLD_BYTES)))
+                logger.info(f"Loaded {len(cls.binary_payload)} binary payload file(s) from: {payload_template_path}")
+            except Exception as e:
+                logger.error(f"Error loading binary payload '{payload_template_path}': {e}")
+                if environment and environment.runner: # Check if runner exists
+                    environment.runner.quit()
         else:
             try:
                 with open(payload_template_path) as f:
-                    self.payload_template = Template(f.read())
+                    cls.payload_template = Template(f.read())
                 logger.info(f"Loaded payload template from: {payload_template_path}")
             except Exception as e:
                 logger.error(f"Error loading payload template '{payload_template_path}': {e}")
-                if self.environment and self.environment.runner: # Check if runner exists
-                    self.environment.runner.quit()
+                if environment and environment.runner: # Check if runner exists
+                    environment.runner.quit()
+
+        # --- Precompile the payload rendering pipeline ---
+        if cls.payload_type != "binary":
+            cls.payload_renderer = PayloadRenderer(
+                cls.payload_template, cls.payload_type, cls.headers,
+                cache_size=int(os.getenv("PAYLOAD_CACHE_SIZE", DEFAULT_PAYLOAD_CACHE_SIZE)))
+            if cls.payload_renderer.identifiers and not cls.data_rows:
+                logger.warning("No data rows loaded, but payload template appears to expect variables. Request might fail or send incomplete data.")
 
         # --- Load JSONPath Assertions ---
         expected_json_path_value_str = os.getenv("EXPECTED_JSON_PATH_VALUE")
         if expected_json_path_value_str:
             try:
-                self.expected_json_path_values = json.loads(expected_json_path_value_str)
-                logger.info(f"Loaded JSONPath assertions: {self.expected_json_path_values}")
+                cls.expected_json_path_values = json.loads(expected_json_path_value_str)
+                logger.info(f"Loaded JSONPath assertions: {cls.expected_json_path_values}")
             except json.JSONDecodeError:
                 logger.error(f"Failed to parse EXPECTED_JSON_PATH_VALUE. Expected JSON string. Got: '{expected_json_path_value_str}'")
             except Exception as e:
@@ -204,40 +557,160 @@ class GenericUser(FastHttpUser):
         custom_metrics_json_path_str = os.getenv("CUSTOM_METRICS_JSON_PATH")
         if custom_metrics_json_path_str:
             try:
-                self.custom_metrics_json_paths = json.loads(custom_metrics_json_path_str)
-                if not isinstance(self.custom_metrics_json_paths, list):
+                cls.custom_metrics_json_paths = json.loads(custom_metrics_json_path_str)
+                if not isinstance(cls.custom_metrics_json_paths, list):
                     logger.warning("CUSTOM_METRICS_JSON_PATH should be a JSON list of JSONPath strings. Ignoring.")
-                    self.custom_metrics_json_paths = []
-                logger.info(f"Loaded custom metrics JSONPaths: {self.custom_metrics_json_paths}")
+                    cls.custom_metrics_json_paths = []
+                logger.info(f"Loaded custom metrics JSONPaths: {cls.custom_metrics_json_paths}")
             except json.JSONDecodeError:
                 logger.error(f"Failed to parse CUSTOM_METRICS_JSON_PATH. Expected JSON list. Got: '{custom_metrics_json_path_str}'")
             except Exception as e:
                 logger.error(f"Error processing CUSTOM_METRICS_JSON_PATH: {e}")
 
+        # --- Compile JSONPath expressions once; an invalid path aborts before the test starts ---
+        try:
+            cls.json_path_plan = JsonPathPlan(cls.expected_json_path_values, cls.custom_metrics_json_paths)
+        except ValueError as e:
+            logger.error(str(e))
+            cls.json_path_plan = JsonPathPlan()
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
+
+        # --- Decide once which response bodies need reading in full ---
+        try:
+            max_bytes = os.getenv("RESPONSE_MAX_BYTES")
+            cls.response_plan = ResponsePlan(cls.json_path_plan, max_bytes=int(max_bytes) if max_bytes else None)
+        except ValueError as e:
+            logger.error(f"Invalid RESPONSE_MAX_BYTES '{os.getenv('RESPONSE_MAX_BYTES')}': {e}")
+            cls.response_plan = ResponsePlan(cls.json_path_plan)
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
+
+        cls._configure_wait_time(environment)
+        cls._configure_connections(environment)
+        cls._config_loaded = True
+
+    @classmethod
+    def _configure_connections(cls, environment):
+        """
+        Applies the HTTP_* connection settings. Runs after _configure_wait_time, since an open
+        workload sizes each user's pool to its in-flight limit unless HTTP_CONNECTIONS_PER_USER is set.
+        """
+        try:
+            connections = os.getenv("HTTP_CONNECTIONS_PER_USER")
+            if connections:
+                cls.concurrency = int(connections)
+            for var, attr in (("HTTP_CONNECT_TIMEOUT", "connection_timeout"), ("HTTP_READ_TIMEOUT", "network_timeout")):
+                if os.getenv(var):
+                    setattr(cls, attr, float(os.getenv(var)))
+            if min(cls.concurrency, cls.connection_timeout, cls.network_timeout) <= 0:
+                raise ValueError("connections and timeouts must be positive")
+            mode = os.getenv("HTTP_CONNECTION_POOL", POOL_PER_USER).lower()
+            if mode not in CONNECTION_POOL_MODES:
+                raise ValueError(f"HTTP_CONNECTION_POOL must be one of: {', '.join(CONNECTION_POOL_MODES)}")
+        except ValueError as e:
+            logger.error(f"Invalid HTTP connection settings: {e}")
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
+            return
+        cls.insecure = os.getenv("HTTP_VERIFY_TLS", "false").lower() != "true"
+        cls.connection_pool_mode = mode
+        cls.client_pool = None
+        if mode == POOL_SHARED:
+            # One pool for all users of this process, sized for its share of the users
+            users = 1
+            if environment and environment.parsed_options:
+                users = getattr(environment.parsed_options, "num_users", None) or 1
+            users_per_process = math.ceil(users / int(os.getenv("LOCUST_WORKER_COUNT", 1)))
+            cls.client_pool = cls._build_client_pool(cls.concurrency * users_per_process)
+        logger.info(f"HTTP connections: {mode} pool, {cls.concurrency} per user, keep-alive {cls.keep_alive}, "
+                    f"timeouts {cls.connection_timeout}s connect / {cls.network_timeout}s read, "
+                    f"TLS verification {not cls.insecure}.")
+
+    @classmethod
+    def _build_client_pool(cls, concurrency):
+        """Connection-timing client pool with the arguments FastHttpSession would build its own with."""
+        return TimedHTTPClientPool(
+            concurrency=concurrency, connection_timeout=cls.connection_timeout, network_timeout=cls.network_timeout,
+            insecure=cls.insecure,
+            ssl_context_factory=insecure_ssl_context_factory if cls.insecure else gevent.ssl.create_default_context)
+
+    @classmethod
+    def _configure_data_feeder(cls, environment):
+        """
+        Builds this process's DataFeeder. In distributed runs every worker feeds from its own
+        block of the rows (LOCUST_WORKER_INDEX of LOCUST_WORKER_COUNT), so unique rows are used
+        once per run rather than once per worker, and partitions split the worker's block.
+        """
+        feed_mode = os.getenv("DATA_FEED_MODE", FEED_MODE_SEQUENTIAL).lower()
+        worker_count = int(os.getenv("LOCUST_WORKER_COUNT", 1)) if os.getenv("LOCUST_ROLE") == "worker" else 1
+        worker_index = int(os.getenv("LOCUST_WORKER_INDEX", 0))
+        rows = cls.data_rows
+        if worker_index >= worker_count:
+            # Added by the saturation guard once the rows were split between the initial workers
+            if feed_mode == FEED_MODE_UNIQUE or not cls.reuse_data:
+                logger.warning(f"Worker {worker_index} joined after the data rows were split between "
+                               f"{worker_count} workers; it has no rows of its own to send.")
+                rows = []
+            worker_index %= worker_count
+        rows = shard_rows(rows, worker_index, worker_count)
+
+        partitions = os.getenv("DATA_PARTITIONS")
+        if not partitions and environment and environment.parsed_options:
+            partitions = getattr(environment.parsed_options, "num_users", None)
+        try:
+            # Partitions (one per user by default) are split between the workers like the rows
+            cls.data_feeder = DataFeeder(rows, mode=feed_mode, reuse=cls.reuse_data,
+                                         partitions=math.ceil(int(partitions or 1) / worker_count))
+            logger.info(f"Using '{feed_mode}' data feed mode over {len(rows)} of {len(cls.data_rows)} rows.")
+        except ValueError as e:
+            logger.error(str(e))
+            if environment and environment.runner: # Check if runner exists
+                environment.runner.quit()
+
     @task
     def execute_request(self):
+        if OPEN_WORKLOAD:
+            self._run_open_workload()
+        else:
+            self._send_request()
+
+    def _run_open_workload(self):
+        if self.open_workload is None:
+            return
+        if self.open_workload.running:
+            # One arrival loop per worker process; any additional users stay idle
+            sleep(1)
+            return
+        self.open_workload.run(self._send_request)
+
+    def _send_request(self, intended_start=None):
+        """
+        Sends one request. ``intended_start`` (perf_counter seconds) is set in open-workload mode,
+        where the reported response time is measured from the intended send time.
+        """
+        mark = hot_path_timer.mark()
         current_data_row = {}
-        if self.data_rows:
-            try:
-                current_data_row = self.data_rows.pop(0)
-                if self.reuse_data:
-                    self.data_rows.append(current_data_row)
-            except IndexError:
+        if self.data_feeder is not None:
+            current_data_row = self.data_feeder.next_row(self.user_index)
+            if current_data_row is None:
                 logger.warning("Data rows exhausted. If REUSE_DATA is 'false', tasks may idle.")
                 return
-        elif not self.data_rows and (
-                self.payload_template and "${" in self.payload_template.template):  # Check if template exists before accessing .template
-            logger.warning(
-                "No data rows loaded, but payload template appears to expect variables. Request might fail or send incomplete data.")
-
-        # Ensure payload_template is not None before calling safe_substitute
-        body_str = self.payload_template.safe_substitute(current_data_row) if self.payload_template else ""
 
-        payload, content_type = self._prepare_payload(body_str)
-
-        full_headers = self.headers.copy()
-        if content_type:  # Ensure content_type is not None before assigning
-            full_headers["Content-Type"] = content_type
+        if self.payload_renderer is not None:
+            # Pre-rendered bytes with shared headers; FastHttpSession copies headers itself
+            render_mark = hot_path_timer.mark()
+            body = self.payload_renderer.render(current_data_row)
+            hot_path_timer.add_since(PHASE_RENDER, render_mark)
+            payload = {"data": body} if body else None
+            full_headers = self.payload_renderer.headers
+        elif self.binary_payload is not None:
+            body, full_headers = self.binary_payload.next_payload()
+            payload = {"data": body}
+        else:
+            logger.warning("PAYLOAD_TYPE is 'binary' but PAYLOAD_TEMPLATE was not loaded. Sending empty binary data.")
+            payload = {"data": b""}
+            full_headers = dict(self.headers, **{"Content-Type": DEFAULT_BINARY_CONTENT_TYPE})
 
         req_method_name = self.method.lower()
         if not hasattr(self.client, req_method_name):
@@ -249,6 +722,7 @@ class GenericUser(FastHttpUser):
             "headers": full_headers,
             "name": self.endpoint,  # Use endpoint as the default name for grouping in Locust stats
             "catch_response": True,  # FastHttpUser uses catch_response
+            "stream": True,  # The body is consumed by _consume_body, as response_plan decides
         }
         if payload:  # Ensure payload is not None or empty before updating
             req_args.update(payload)
@@ -256,26 +730,83 @@ class GenericUser(FastHttpUser):
         # For FastHttpUser, the path is the first argument.
         # self.endpoint should be like "/api/users"
         effective_endpoint = self.endpoint if self.endpoint.startswith("/") else "/" + self.endpoint
+        hot_path_timer.add_since(PHASE_PAYLOAD, mark)
 
+        if not first_request_sent:
+            _report_first_request()
+        begin_request()
+        sent = time.perf_counter()
         with req_method(effective_endpoint, **req_args) as response:
-            if 200 <= response.status_code < 300:
-                resp_content_type = response.headers.get("Content-Type", "").lower()
-
-                if "application/json" in resp_content_type:
+            # Status 0: no response at all (e.g. connection refused); Locust reports the exception
+            if response.status_code:
+                content_type = response.headers.get("Content-Type", "").lower()
+                kind, action = self.response_plan.route(response.status_code, content_type)
+                length, head, body_failure = self._consume_body(response, kind, action)
+            # Not add_since: other greenlets run (and record phases) while this one waits
+            received = time.perf_counter() - sent
+            hot_path_timer.add(PHASE_NETWORK, received)
+            mark = hot_path_timer.mark()
+            # Locust stops a streamed request's clock at the headers; include reading the body
+            response.request_meta["response_time"] = received * 1000
+            if intended_start is not None:
+                # Include any time the arrival spent waiting to be sent (coordinated omission)
+                response.request_meta["response_time"] = (time.perf_counter() - intended_start) * 1000
+
+            if not response.status_code:
+                logger.error(f"Request failed: {self.method} {effective_endpoint} - {response.error}")
+            elif kind == KIND_ERROR:
+                preview = body_preview(head)
+                response.failure(f"❌ HTTP {response.status_code} - {preview}")
+                logger.error(f"Request failed: {self.method} {effective_endpoint} - {response.status_code} - {preview}")
+            elif body_failure is not None:
+                response.failure(f"❌ {body_failure}")
+            elif kind == KIND_JSON:
+                if action == BODY_DECODE:
                     self._handle_json_response(response)
-                elif "text/" in resp_content_type or "application/xml" in resp_content_type:
-                    self._handle_text_response(response, resp_content_type)
-                elif "image/" in resp_content_type or "application/octet-stream" in resp_content_type or "application/pdf" in resp_content_type:
-                    self._handle_binary_response(response, resp_content_type)
-                elif response.status_code == 204:  # No Content
-                    self._handle_no_content_response(response)
                 else:
-                    self._handle_unknown_content_type(response, resp_content_type)
+                    response.success()  # Nothing to check in the body
+            elif kind == KIND_TEXT:
+                self._handle_text_response(response, content_type, length)
+            elif kind == KIND_BINARY:
+                self._handle_binary_response(response, content_type, length)
+            elif kind == KIND_NO_CONTENT:
+                self._handle_no_content_response(response, length)
             else:
-                response.failure(f"❌ HTTP {response.status_code} - {response.text}")
-                logger.error(
-                    f"Request failed: {self.method} {effective_endpoint} - {response.status_code} - {response.text[:200]}")
-
+                self._handle_unknown_content_type(response, content_type, length)
+            hot_path_timer.add_since(PHASE_RESPONSE, mark)
+            # Leaving the block fires the request event (Locust stats and our listeners)
+            mark = hot_path_timer.mark()
+        timing = end_request()
+        if timing is not None and REQUEST_LOG_MODE != "raw":
+            # DNS, connect, TLS, time to first byte and body, next to the request's response time
+            request_aggregator.record_phases(self.method, self.endpoint, timing.phases_ms(received),
+                                             timing.connections)
+        hot_path_timer.add_since(PHASE_LOGGING, mark)
+        hot_path_timer.record_request()
+
+
+    def _consume_body(self, response, kind, action):
+        """
+        Reads the body of a streamed response as the plan's action says. Only BODY_DECODE keeps it
+        (as ``response.content``); others are drained. Returns ``(length, head, failure)``, with the
+        start of error bodies as head, and sets the length as the request's response_length.
+        """
+        if getattr(response, "error", None) is not None:
+            # Bad status: the HTTP client has already read the whole body, for its error log
+            content = response.content
+            length, head, failure = len(content), content[:ERROR_PREVIEW_BYTES], None
+        elif action == BODY_DECODE:
+            head = b""
+            try:
+                length = len(response.content)
+                failure = self.response_plan.oversized(length)
+            except Exception as e:
+                length, failure = 0, f"Error reading response body: {e}"
+        else:
+            keep = ERROR_PREVIEW_BYTES if kind == KIND_ERROR else 0
+            length, head, failure = self.response_plan.drain(response, keep=keep)
+        response.request_meta["response_length"] = length
+        return length, head, failure
 
     def _handle_json_response(self, response):
         is_success = True
@@ -283,54 +814,39 @@ class GenericUser(FastHttpUser):
         response_json = {}
 
         try:
-            response_json = response.json()
+            # Parsed from the bytes: no text decoding or charset detection first
+            response_json = json.loads(response.content)
         except json.JSONDecodeError:
-            if self.expected_json_path_values or self.custom_metrics_json_paths:
+            if self.json_path_plan:
                 is_success = False
                 failure_message.append("Response was not valid JSON, cannot apply JSONPath assertions/metrics.")
         except Exception as e:
             is_success = False
             failure_message.append(f"Error parsing response JSON: {e}")
 
-        if is_success and self.expected_json_path_values and response_json:
-            for json_path_str, expected_value in self.expected_json_path_values.items():
-                try:
-                    jsonpath_expr = parse(json_path_str)
-                    matches = jsonpath_expr.find(response_json)
-                    if not matches:
-                        is_success = False
-                        failure_message.append(f"JSONPath '{json_path_str}' found no matches.")
-                        break
-                    actual_value = matches[0].value
-                    if actual_value != expected_value:
-                        is_success = False
-                        failure_message.append(f"JSONPath '{json_path_str}': Expected '{expected_value}', got '{actual_value}'.")
-                        break
-                except Exception as e:
-                    is_success = False
-                    failure_message.append(f"Error evaluating JSONPath '{json_path_str}': {e}")
-                    break
-
-        if is_success and self.custom_metrics_json_paths and response_json:
-            for json_path_str in self.custom_metrics_json_paths:
-                try:
-                    jsonpath_expr = parse(json_path_str)
-                    matches = jsonpath_expr.find(response_json)
-                    for match in matches:
-                        metric_name = f"jsonpath.{json_path_str.replace('$', '').replace('.', '_').replace('[', '_').replace(']', '').strip('_')}"
-                        ctx = self.environment.context if self.environment and hasattr(self.environment, 'context') else {}
-                        events.request.fire(
-                            request_type="JSONPath_Metric",
-                            name=metric_name,
-                            response_time=match.value if isinstance(match.value, (int, float)) else 0,
-                            response_length=0,
-                            exception=None,
-                            context=ctx,
-                            response=response
-                        )
-                        logger.debug(f"Reported custom metric '{metric_name}': {match.value}")
-                except Exception as e:
-                    logger.error(f"Error extracting custom metric from JSONPath '{json_path_str}': {e}")
+        mark = hot_path_timer.mark()
+        if is_success and self.json_path_plan.assertions and response_json:
+            failure_message.extend(self.json_path_plan.check(response_json))
+            is_success = not failure_message
+
+        metrics = []
+        if is_success and self.json_path_plan.metrics and response_json:
+            metrics = list(self.json_path_plan.extract_metrics(response_json))
+        hot_path_timer.add_since(PHASE_JSONPATH, mark)
+
+        if metrics:
+            ctx = self.environment.context if self.environment and hasattr(self.environment, 'context') else {}
+            for metric_name, value in metrics:
+                events.request.fire(
+                    request_type="JSONPath_Metric",
+                    name=metric_name,
+                    response_time=value if isinstance(value, (int, float)) else 0,
+                    response_length=0,
+                    exception=None,
+                    context=ctx,
+                    response=response
+                )
+                logger.debug(f"Reported custom metric '{metric_name}': {value}")
 
         if is_success:
             response.success()
@@ -338,66 +854,27 @@ class GenericUser(FastHttpUser):
             failure_str = f"❌ JSON Assertion Failed: {' '.join(failure_message)}" if failure_message else "❌ Processing Failed"
             response.failure(failure_str)
 
-    def _handle_text_response(self, response, content_type):
-        try:
-            text_content = response.text
-            if text_content:
-                response.success()
-                logger.info(f"{content_type}: Text response received (length: {len(text_content)})")
-            else:
-                response.failure(f"{content_type}: Empty text response.")
-        except Exception as e:
-            response.failure(f"{content_type}: Error processing text: {e} - Body: {response.text[:200]}...")
+    def _handle_text_response(self, response, content_type, length):
+        if length:
+            response.success()
+            logger.debug(f"{content_type}: Text response received (length: {length})")
+        else:
+            response.failure(f"{content_type}: Empty text response.")
 
-    def _handle_binary_response(self, response, content_type):
-        binary_content = response.content
-        if len(binary_content) > 0:
-            logger.info(f"{content_type}: Binary data received (length: {len(binary_content)} bytes)")
+    def _handle_binary_response(self, response, content_type, length):
+        if length > 0:
+            logger.debug(f"{content_type}: Binary data received (length: {length} bytes)")
             response.success()
         else:
             response.failure(f"{content_type}: Empty binary response")
 
-    def _handle_no_content_response(self, response):
-        if not response.content:
-            logger.info("204 No Content: As expected")
+    def _handle_no_content_response(self, response, length):
+        if not length:
+            logger.debug("204 No Content: As expected")
             response.success()
         else:
-            response.failure(f"204 No Content: Unexpected body present. Length: {len(response.content)}")
+            response.failure(f"204 No Content: Unexpected body present. Length: {length}")
 
-    def _handle_unknown_content_type(self, response, content_type):
-        logger.warning(f"Unknown Content-Type ({content_type}) received for {self.method} {self.endpoint}. Status: {response.status_code}. Body: {response.text[:200]}...")
+    def _handle_unknown_content_type(self, response, content_type, length):
+        logger.warning(f"Unknown Content-Type ({content_type}) received for {self.method} {self.endpoint}. Status: {response.status_code}. Length: {length}.")
         response.success()
-
-    def _prepare_payload(self, body_str):
-        if self.payload_type == "json":
-            try:
-                return {"json": json.loads(body_str)}, None
-            except json.JSONDecodeError:
-                logger.warning(f"Payload type is 'json' but body is not valid JSON. Sending as raw data with Content-Type application/json. Body: {body_str[:100]}")
-                return {"data": body_str}, "application/json"
-        elif self.payload_type == "form":
-            # body_str is now expected to be a pre-urlencoded string,
-            # possibly with template values substituted (e.g., "key=value&name=actual_username").
-            # This string will be passed directly as the request body.
-            # FastHttpUser with `Content-Type: application/x-www-form-urlencoded`
-            # should handle this pre-urlencoded string correctly.
-            logger.info(f"Using pre-urlencoded string for form payload: {body_str[:200]}")
-            return {"data": body_str}, "application/x-www-form-urlencoded"
-        elif self.payload_type == "text":
-            return {"data": body_str}, "text/plain"
-        elif self.payload_type == "binary":
-            binary_file_path = os.getenv("PAYLOAD_TEMPLATE")
-            if binary_file_path and os.path.exists(binary_file_path):
-                try:
-                    with open(binary_file_path, "rb") as f:
-                        binary_data = f.read()
-                    return {"data": binary_data}, "application/octet-stream"
-                except Exception as e:
-                    logger.error(f"Error reading binary file specified in PAYLOAD_TEMPLATE ('{binary_file_path}'): {e}")
-                    return {"data": b""}, "application/octet-stream"
-            else:
-                logger.warning(f"PAYLOAD_TYPE is 'binary' but PAYLOAD_TEMPLATE ('{binary_file_path}') not found or not set. Sending empty binary data.")
-                return {"data": b""}, "application/octet-stream"
-        else:
-            logger.warning(f"Unknown payload type '{self.payload_type}'. Sending as raw data with no explicit Content-Type.")
-            return {"data": body_str}, None
@@ -1,28 +1,131 @@
 import os
 import time
 import json
+import logging
 from threading import Lock
 
+import gevent
+
+from run_config import test_results_dir
+from segmented_log import (SegmentedLogWriter, METRICS_LOG_FILENAME, DEFAULT_SEGMENT_BYTES,
+                           DEFAULT_SEGMENT_SECONDS)
+
+# Batched writer defaults: flush at least every 250 ms or whenever 64 KB of
+# serialized events are pending, whichever comes first.
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_FLUSH_BYTES = 64 * 1024
+# Custom message carrying a batch of metrics events from a distributed worker to the master
+METRICS_EVENTS_MESSAGE = "metrics_events"
+
+logger = logging.getLogger(__name__)
+
+
 class LocustStatsLogger:
-    def __init__(self, test_id: str, base_dir: str = "test_results"):
+    """
+    Appends NDJSON metric events to ``<base_dir>/<test_id>/flask_locust_runner_metrics.log``.
+
+    With ``segment_bytes`` set, the log is a SegmentedLogWriter: that file is the active
+    segment, and closed segments are zstd-compressed on a worker thread.
+
+    Args:
+        test_id (str): Test run identifier, used as the log sub-directory.
+        base_dir (str): Root directory for test results.
+        batched (bool): When True, events are buffered in memory and written by a
+                        background greenlet instead of one write + flush per event.
+        flush_interval (float): Maximum seconds an event may sit in the buffer (batched mode).
+        flush_bytes (int): Pending byte count that triggers an immediate flush (batched mode).
+        segment_bytes (int): Active segment size that triggers rotation; 0 keeps a single plain file.
+        segment_seconds (float): Active segment age that triggers rotation (segmented mode).
+    """
+    def __init__(self, test_id: str, base_dir: str = "test_results", batched: bool = False,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 segment_bytes: int = 0, segment_seconds: float = DEFAULT_SEGMENT_SECONDS):
         self.test_id = test_id
         self.log_dir = os.path.join(base_dir, test_id)
         os.makedirs(self.log_dir, exist_ok=True)
-        self.log_file_path = os.path.join(self.log_dir, "flask_locust_runner_metrics.log")
-        self._file = open(self.log_file_path, "a")
+        self.log_file_path = os.path.join(self.log_dir, METRICS_LOG_FILENAME)
         self._lock = Lock()
+        self._file = None
+        self._segments = None
+        self._compressor = None
+        if segment_bytes:
+            threadpool = gevent.get_hub().threadpool
+            self._segments = SegmentedLogWriter(self.log_dir, segment_bytes, segment_seconds,
+                                                offload=lambda fn, *args: threadpool.apply(fn, args))
+        else:
+            self._file = open(self.log_file_path, "a")
+
+        self.batched = batched
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._flusher = None
+        if self.batched:
+            self._flusher = gevent.spawn(self._flush_loop)
 
     def log(self, data: dict):
-        with self._lock:
-            self._file.write(json.dumps(data) + "\n")
-            self._file.flush()
+        line = json.dumps(data) + "\n"
+        if not self.batched:
+            with self._lock:
+                self._write(line)
+            return
+
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        if self._buffered_bytes >= self.flush_bytes:
+            self.flush()
 
     def log_event(self, event_name: str, payload: dict):
         payload["event"] = event_name
         payload["timestamp"] = time.time()
         self.log(payload)
 
+    def flush(self):
+        """Writes all buffered events to disk with a single write + flush."""
+        if not self._buffer:
+            return
+        # Swap the buffer out before writing so events logged meanwhile land in the next batch.
+        pending, self._buffer = self._buffer, []
+        self._buffered_bytes = 0
+        with self._lock:
+            self._write("".join(pending))
+
+    def _write(self, text: str):
+        if self._segments is not None:
+            if self._segments.closed:
+                return
+            segment_count = len(self._segments.index["segments"])
+            self._segments.write(text)
+            if len(self._segments.index["segments"]) != segment_count:
+                self._start_compression()
+            return
+        if self._file.closed:
+            return
+        self._file.write(text)
+        self._file.flush()
+
+    def _start_compression(self):
+        """Compresses rotated segments in the background (the work itself runs on gevent's thread pool)."""
+        if self._compressor is None or self._compressor.dead:
+            self._compressor = gevent.spawn(self._segments.compress_pending)
+
+    def _flush_loop(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
+
     def close(self):
+        if self._flusher is not None:
+            self._flusher.kill(block=False)
+            self._flusher = None
+        self.flush()
+        if self._segments is not None:
+            if self._compressor is not None:
+                self._compressor.join()
+            with self._lock:
+                self._segments.close()
+            return
         with self._lock:
             if not self._file.closed:
                 self._file.close()
@@ -30,7 +133,64 @@ class LocustStatsLogger:
     @staticmethod
     def from_env():
         test_id = os.getenv("TEST_ID", "unknown")
-        return LocustStatsLogger(test_id)
+        batched = os.getenv("METRICS_LOG_BATCHED", "true").lower() == "true"
+        flush_interval = float(os.getenv("METRICS_LOG_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL * 1000)) / 1000
+        flush_bytes = int(os.getenv("METRICS_LOG_FLUSH_BYTES", DEFAULT_FLUSH_BYTES))
+        segment_bytes = int(os.getenv("METRICS_LOG_SEGMENT_BYTES", DEFAULT_SEGMENT_BYTES))
+        segment_seconds = float(os.getenv("METRICS_LOG_SEGMENT_SECONDS", DEFAULT_SEGMENT_SECONDS))
+        return LocustStatsLogger(test_id, base_dir=test_results_dir(), batched=batched, flush_interval=flush_interval, flush_bytes=flush_bytes,
+                                 segment_bytes=segment_bytes, segment_seconds=segment_seconds)
+
+
+class WorkerEventForwarder:
+    """
+    Stand-in for LocustStatsLogger on distributed workers. Events are batched and sent to
+    the master as METRICS_EVENTS_MESSAGE; the master writes them to the run's metrics log,
+    so only one process ever writes it. Events logged before ``attach`` are kept until then.
+
+    Args:
+        flush_interval (float): Seconds between batches sent to the master.
+    """
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._runner = None
+        self._flusher = None
+
+    def attach(self, runner):
+        """Starts forwarding through a WorkerRunner."""
+        self._runner = runner
+        if self._flusher is None:
+            self._flusher = gevent.spawn(self._flush_loop)
+
+    def log(self, data: dict):
+        self._buffer.append(data)
+
+    def log_event(self, event_name: str, payload: dict):
+        payload["event"] = event_name
+        payload["timestamp"] = time.time()
+        self.log(payload)
+
+    def flush(self):
+        if not self._buffer or self._runner is None:
+            return
+        pending, self._buffer = self._buffer, []
+        try:
+            self._runner.send_message(METRICS_EVENTS_MESSAGE, pending)
+        except Exception as e:
+            logger.error(f"Failed to forward {len(pending)} metrics events to the master: {e}")
+
+    def _flush_loop(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        if self._flusher is not None:
+            self._flusher.kill(block=False)
+            self._flusher = None
+        self.flush()
+
 
 # Singleton instance (optional)
 logger_instance = None
@@ -38,5 +198,10 @@ logger_instance = None
 def get_logger():
     global logger_instance
     if logger_instance is None:
-        logger_instance = LocustStatsLogger.from_env()
+        if os.getenv("LOCUST_ROLE") == "worker":
+            # Distributed workers send their events to the master instead of writing the log
+            flush_interval = float(os.getenv("METRICS_LOG_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL * 1000)) / 1000
+            logger_instance = WorkerEventForwarder(flush_interval)
+        else:
+            logger_instance = LocustStatsLogger.from_env()
     return logger_instance
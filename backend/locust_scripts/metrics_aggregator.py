@@ -0,0 +1,303 @@
+import math
+import time
+import logging
+
+import gevent
+
+logger = logging.getLogger(__name__)
+
+# Relative bucket width of the latency histograms. Any recorded value is
+# reported back within this fraction of its true value.
+HISTOGRAM_PRECISION = 0.01
+# Values at or below this (ms) all fall into the lowest bucket.
+HISTOGRAM_MIN_VALUE = 0.001
+
+DEFAULT_AGGREGATION_INTERVAL = 1.0
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear latency histogram.
+
+    Values are bucketed by ``floor(log(value) / log(1 + precision))``, so every
+    bucket spans the same relative width and percentiles are accurate to within
+    ``precision`` regardless of the magnitude of the latency. Only non-empty
+    buckets are stored, which keeps a per-second histogram to a few dozen entries.
+    """
+    _log_base = math.log1p(HISTOGRAM_PRECISION)
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def bucket_for(cls, value: float) -> int:
+        return int(math.floor(math.log(max(value, HISTOGRAM_MIN_VALUE)) / cls._log_base))
+
+    @classmethod
+    def value_for(cls, bucket: int) -> float:
+        # Midpoint of the bucket's [lower, upper) range
+        return math.exp((bucket + 0.5) * cls._log_base)
+
+    def record(self, value: float):
+        # bucket_for inlined: this runs several times per request (response time and its phases)
+        bucket = math.floor(math.log(value if value > HISTOGRAM_MIN_VALUE else HISTOGRAM_MIN_VALUE) / self._log_base)
+        buckets = self.buckets
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, fraction: float):
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                # Clamp to the observed extremes so p0/p100 are exact
+                return min(max(self.value_for(bucket), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {str(bucket): count for bucket, count in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, buckets: dict) -> "LatencyHistogram":
+        histogram = cls()
+        for bucket, count in buckets.items():
+            bucket = int(bucket)
+            histogram.buckets[bucket] = histogram.buckets.get(bucket, 0) + count
+            histogram.count += count
+            value = cls.value_for(bucket)
+            histogram.total += value * count
+            if histogram.min is None or value < histogram.min:
+                histogram.min = value
+            if histogram.max is None or value > histogram.max:
+                histogram.max = value
+        return histogram
+
+
+def _histogram_message(histogram: LatencyHistogram) -> dict:
+    return {"hist": histogram.to_dict(), "total": histogram.total, "min": histogram.min, "max": histogram.max}
+
+
+def _histogram_from_message(message: dict) -> LatencyHistogram:
+    histogram = LatencyHistogram.from_dict(message["hist"])
+    # Exact values instead of the bucket midpoints from_dict estimates
+    histogram.total, histogram.min, histogram.max = message["total"], message["min"], message["max"]
+    return histogram
+
+
+def phase_stats(phase: str, histogram: LatencyHistogram) -> dict:
+    """Summary fields of one phase's histogram, prefixed with the phase name."""
+    return {f"{phase}_count": histogram.count,
+            f"{phase}_mean": histogram.total / histogram.count,
+            f"{phase}_p50": histogram.percentile(0.50),
+            f"{phase}_p95": histogram.percentile(0.95),
+            f"{phase}_p99": histogram.percentile(0.99),
+            f"{phase}_max": histogram.max}
+
+
+class _IntervalStats:
+    __slots__ = ("histogram", "failures", "bytes", "phases", "connections")
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.failures = 0
+        self.bytes = 0
+        # Phase name -> histogram of that part of the response time (see record_phases)
+        self.phases = {}
+        self.connections = 0
+
+    def phase(self, phase: str) -> LatencyHistogram:
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = LatencyHistogram()
+        return histogram
+
+    def to_message(self, request_type: str, name: str) -> dict:
+        message = {"request_type": request_type, "name": name, "failures": self.failures, "bytes": self.bytes,
+                   **_histogram_message(self.histogram)}
+        if self.phases:
+            message["phases"] = {phase: _histogram_message(histogram) for phase, histogram in self.phases.items()}
+            message["connections"] = self.connections
+        return message
+
+
+class RequestMetricsAggregator:
+    """
+    Pre-aggregates request events in memory and emits one ``request_stats`` record
+    per ``(request_type, name)`` per interval instead of one log line per request.
+
+    In distributed mode workers set ``forward``: each interval's raw stats (histogram
+    buckets, failures, bytes) are handed to it instead of being logged, and the master
+    ``merge``s them into its own current interval, so the log holds one combined record
+    per name per interval with percentiles computed over all workers.
+
+    Phases of the response time recorded with ``record_phases`` (pool wait, DNS, connect, TLS, TTFB,
+    body) get their own histograms and are emitted in the same record as ``<phase>_mean``,
+    ``<phase>_p50`` ... ``<phase>_max`` fields. The aggregator that logs also keeps them per
+    name for the whole run: ``phase_summary`` gives run-wide figures for the summary events,
+    and ``stop`` logs a ``phase_breakdown`` record per name.
+
+    Args:
+        stats_logger (LocustStatsLogger): Destination for the aggregated records.
+        interval (float): Aggregation window in seconds.
+        forward (callable): Receives the list of interval stats messages instead of logging them.
+    """
+    def __init__(self, stats_logger, interval: float = DEFAULT_AGGREGATION_INTERVAL, forward=None):
+        self.stats_logger = stats_logger
+        self.interval = interval
+        self.forward = forward
+        self._current = {}
+        self._interval_start = time.time()
+        self._greenlet = None
+        # (request_type, name) -> phase -> histogram over the whole run (logging aggregator only)
+        self._run_phases = {}
+
+    def _stats_for(self, request_type: str, name: str) -> _IntervalStats:
+        key = (request_type, name)
+        stats = self._current.get(key)
+        if stats is None:
+            stats = self._current[key] = _IntervalStats()
+        return stats
+
+    def record(self, request_type: str, name: str, response_time: float, response_length: int, success: bool):
+        stats = self._stats_for(request_type, name)
+        stats.histogram.record(response_time or 0)
+        stats.bytes += response_length or 0
+        if not success:
+            stats.failures += 1
+
+    def record_phases(self, request_type: str, name: str, phases: dict, connections: int = 0):
+        """
+        Records the phase durations of one request.
+
+        Args:
+            request_type (str): Request type of the request's ``record`` call.
+            name (str): Request name of the request's ``record`` call.
+            phases (dict): Phase name to duration in ms; phases a request skipped are left out.
+            connections (int): New connections the request opened.
+        """
+        stats = self._stats_for(request_type, name)
+        histograms = stats.phases
+        for phase, duration in phases.items():
+            histogram = histograms.get(phase)
+            if histogram is None:
+                histogram = histograms[phase] = LatencyHistogram()
+            histogram.record(duration)
+        stats.connections += connections
+
+    def merge(self, messages: list):
+        """Adds interval stats forwarded by a worker to the current interval."""
+        for message in messages:
+            stats = self._stats_for(message["request_type"], message["name"])
+            stats.histogram.merge(_histogram_from_message(message))
+            stats.failures += message["failures"]
+            stats.bytes += message["bytes"]
+            for phase, phase_message in message.get("phases", {}).items():
+                stats.phase(phase).merge(_histogram_from_message(phase_message))
+            stats.connections += message.get("connections", 0)
+
+    def flush(self):
+        """Emits a record for every name seen in the current interval and starts a new one."""
+        current, self._current = self._current, {}
+        interval_start, self._interval_start = self._interval_start, time.time()
+        interval = round(self._interval_start - interval_start, 3)
+
+        if self.forward is not None:
+            if current:
+                self.forward([stats.to_message(request_type, name)
+                              for (request_type, name), stats in current.items()])
+            return
+
+        for (request_type, name), stats in current.items():
+            histogram = stats.histogram
+            if not histogram.count:
+                # Phases recorded just before the interval ended, ahead of their request
+                self._current[(request_type, name)] = stats
+                continue
+            data = {
+                "request_type": request_type,
+                "name": name,
+                "interval_start": interval_start,
+                "interval": interval,
+                "count": histogram.count,
+                "failures": stats.failures,
+                "bytes": stats.bytes,
+                "min": histogram.min,
+                "max": histogram.max,
+                "mean": histogram.total / histogram.count,
+                "p50": histogram.percentile(0.50),
+                "p90": histogram.percentile(0.90),
+                "p95": histogram.percentile(0.95),
+                "p99": histogram.percentile(0.99),
+                "hist": histogram.to_dict(),
+            }
+            if stats.phases:
+                data["connections"] = stats.connections
+                run_phases = self._run_phases.setdefault((request_type, name), {})
+                for phase, phase_histogram in stats.phases.items():
+                    data.update(phase_stats(phase, phase_histogram))
+                    run_phases.setdefault(phase, LatencyHistogram()).merge(phase_histogram)
+            self.stats_logger.log_event("request_stats", data)
+
+    def phase_summary(self) -> dict:
+        """Run-wide ``<phase>_*`` fields over all names, from the intervals flushed so far."""
+        combined = {}
+        for phases in self._run_phases.values():
+            for phase, histogram in phases.items():
+                combined.setdefault(phase, LatencyHistogram()).merge(histogram)
+        summary = {}
+        for phase, histogram in combined.items():
+            summary.update(phase_stats(phase, histogram))
+        return summary
+
+    def log_phase_breakdown(self):
+        """Logs a ``phase_breakdown`` record per name with its phases over the whole run."""
+        for (request_type, name), phases in self._run_phases.items():
+            data = {"request_type": request_type, "name": name}
+            for phase, histogram in phases.items():
+                data.update(phase_stats(phase, histogram))
+            self.stats_logger.log_event("phase_breakdown", data)
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to emit aggregated request stats: {e}")
+
+    def start(self):
+        if self._greenlet is None:
+            self._interval_start = time.time()
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+        self.flush()
+        if self.forward is None:
+            self.log_phase_breakdown()
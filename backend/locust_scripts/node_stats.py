@@ -0,0 +1,78 @@
+import os
+import socket
+import time
+
+import psutil
+
+# A gevent worker is bound to one core; this much CPU means it cannot generate more load
+SATURATION_CPU_PERCENT = 90.0
+
+
+class WorkerLoadSampler:
+    """
+    Worker side of the per-node view: this worker's request rate and CPU use since the
+    previous sample, tagged with the node it runs on.
+
+    Args:
+        node_id (str): Node name; defaults to LOCUST_NODE_ID (set by worker agents) or the hostname.
+    """
+    def __init__(self, node_id: str = None):
+        self.node_id = node_id or os.getenv("LOCUST_NODE_ID") or socket.gethostname()
+        self.requests = 0
+        self._process = psutil.Process()
+        # cpu_percent measures from the previous call, so the first one only starts the window
+        self._process.cpu_percent()
+        psutil.cpu_percent()
+        self._last_requests = 0
+        self._last_sample = time.monotonic()
+
+    def record_request(self):
+        self.requests += 1
+
+    def sample(self) -> dict:
+        now = time.monotonic()
+        elapsed = now - self._last_sample
+        requests = self.requests
+        stats = {
+            "node": self.node_id,
+            "rps": (requests - self._last_requests) / elapsed if elapsed > 0 else 0.0,
+            "cpu_percent": self._process.cpu_percent(),
+            "host_cpu_percent": psutil.cpu_percent(),
+        }
+        self._last_requests = requests
+        self._last_sample = now
+        return stats
+
+
+def combine_node_stats(worker_samples, stale_after: float, now: float = None) -> list:
+    """
+    Master side: rolls the latest sample of every worker up into one record per node.
+
+    Args:
+        worker_samples (iterable): ``(sample, received_at)`` pairs, one per worker, where
+                                   ``received_at`` is the master's ``time.time()`` on arrival.
+        stale_after (float): Seconds without a sample after which a worker counts as unhealthy.
+        now (float): Current time, ``time.time()`` by default.
+    """
+    now = time.time() if now is None else now
+    nodes = {}
+    for sample, received_at in worker_samples:
+        node = nodes.setdefault(sample.get("node") or "unknown", {
+            "node": sample.get("node") or "unknown", "workers": 0, "healthy_workers": 0, "rps": 0.0,
+            "cpu_percent": 0.0, "cpu_percent_max": 0.0, "host_cpu_percent": 0.0})
+        node["workers"] += 1
+        if now - received_at > stale_after:
+            continue
+        node["healthy_workers"] += 1
+        node["rps"] += sample.get("rps") or 0.0
+        cpu = sample.get("cpu_percent") or 0.0
+        node["cpu_percent"] += cpu
+        node["cpu_percent_max"] = max(node["cpu_percent_max"], cpu)
+        node["host_cpu_percent"] = max(node["host_cpu_percent"], sample.get("host_cpu_percent") or 0.0)
+
+    for node in nodes.values():
+        if node["healthy_workers"]:
+            node["cpu_percent"] /= node["healthy_workers"]  # Mean per worker process
+        node["healthy"] = node["healthy_workers"] == node["workers"]
+        node["saturated"] = node["cpu_percent_max"] >= SATURATION_CPU_PERCENT
+    return sorted(nodes.values(), key=lambda node: node["node"])
@@ -0,0 +1,128 @@
+import random
+import time
+import logging
+
+import gevent
+from gevent.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+ARRIVAL_CONSTANT = "constant"
+ARRIVAL_POISSON = "poisson"
+ARRIVAL_DISTRIBUTIONS = (ARRIVAL_CONSTANT, ARRIVAL_POISSON)
+
+DEFAULT_MAX_CONCURRENCY = 1000
+# Arrivals dispatched more than this many seconds after their intended time count as late
+DEFAULT_LATE_THRESHOLD = 0.01
+
+
+class OpenWorkloadExecutor:
+    """
+    Open-model (arrival-rate) load generator.
+
+    Requests are launched on a constant or Poisson arrival schedule, independent of
+    how long earlier requests take, from a greenlet pool that grows on demand up to
+    ``max_concurrency``. Each request is handed its *intended* start time
+    (``time.perf_counter()`` based) so latency can be measured from when it should
+    have been sent, which avoids coordinated omission. Arrivals that find the pool
+    full are dropped, and arrivals dispatched after ``late_threshold`` are counted as
+    late; both are reported by ``snapshot``.
+
+    Args:
+        target_qps (float): Global arrival rate for the entire test.
+        distribution (str): One of ARRIVAL_DISTRIBUTIONS.
+        max_concurrency (int): Maximum number of requests in flight per worker.
+        late_threshold (float): Dispatch delay (seconds) above which an arrival counts as late.
+        worker_count (int): Number of worker processes sharing the global rate.
+    """
+    def __init__(self, target_qps: float, distribution: str = ARRIVAL_CONSTANT,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, late_threshold: float = DEFAULT_LATE_THRESHOLD,
+                 worker_count: int = 1):
+        if distribution not in ARRIVAL_DISTRIBUTIONS:
+            raise ValueError(f"Unknown arrival distribution '{distribution}'. Expected one of: {', '.join(ARRIVAL_DISTRIBUTIONS)}.")
+        self.target_qps = max(float(target_qps), 0.0)
+        self.distribution = distribution
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.late_threshold = late_threshold
+        self.worker_count = max(1, int(worker_count or 1))
+        self.running = False
+        self._pool = None
+        self._random = random.Random()
+        self._max_in_flight = 0
+        self._reset_window(time.monotonic())
+
+    @property
+    def worker_target_qps(self) -> float:
+        return self.target_qps / self.worker_count
+
+    def set_worker_count(self, worker_count: int):
+        self.worker_count = max(1, int(worker_count or 1))
+
+    def _next_interval(self) -> float:
+        rate = self.worker_target_qps
+        if self.distribution == ARRIVAL_POISSON:
+            return self._random.expovariate(rate)
+        return 1.0 / rate
+
+    def run(self, send):
+        """
+        Dispatches arrivals until the calling greenlet is killed.
+
+        Args:
+            send (callable): Called in a pool greenlet with the arrival's intended start time.
+        """
+        if self.worker_target_qps <= 0:
+            logger.warning("Open workload started without a positive target QPS. No requests will be sent.")
+            return
+        self.running = True
+        self._pool = Pool(self.max_concurrency)
+        next_arrival = time.perf_counter()
+        try:
+            while True:
+                now = time.perf_counter()
+                if next_arrival > now:
+                    gevent.sleep(next_arrival - now)
+                    now = time.perf_counter()
+                else:
+                    gevent.sleep(0)  # Behind schedule: still let in-flight requests progress
+
+                self._window_arrivals += 1
+                if self._pool.full():
+                    self._window_dropped += 1
+                else:
+                    delay = now - next_arrival
+                    if delay > self.late_threshold:
+                        self._window_late += 1
+                    if delay > self._window_max_delay:
+                        self._window_max_delay = delay
+                    self._pool.spawn(send, next_arrival)
+                    self._max_in_flight = max(self._max_in_flight, len(self._pool))
+                next_arrival += self._next_interval()
+        finally:
+            self.running = False
+            self._pool.kill(block=False)
+
+    def _reset_window(self, now: float):
+        self._window_start = now
+        self._window_arrivals = 0
+        self._window_dropped = 0
+        self._window_late = 0
+        self._window_max_delay = 0.0
+
+    def snapshot(self) -> dict:
+        """Arrival counters since the previous snapshot."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        stats = {
+            "target_qps": self.target_qps,
+            "worker_target_qps": self.worker_target_qps,
+            "arrival_qps": self._window_arrivals / elapsed if elapsed > 0 else 0.0,
+            "arrivals_dropped": self._window_dropped,
+            "arrivals_late": self._window_late,
+            "dispatch_delay_max_ms": self._window_max_delay * 1000,
+            "in_flight": len(self._pool) if self._pool is not None else 0,
+            "max_in_flight": self._max_in_flight,
+        }
+        self._reset_window(now)
+        self._max_in_flight = stats["in_flight"]
+        return stats
@@ -0,0 +1,232 @@
+import os
+import json
+import mmap
+import logging
+import mimetypes
+import tarfile
+import zipfile
+from collections import OrderedDict
+from string import Template
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAYLOAD_CACHE_SIZE = 10_000
+_MISSING = object()
+# Binary payload files at least this large are memory-mapped instead of read into memory
+DEFAULT_BINARY_MMAP_THRESHOLD_BYTES = 16 * 1024 * 1024
+DEFAULT_BINARY_CONTENT_TYPE = "application/octet-stream"
+
+# Content-Type sent for each PAYLOAD_TYPE. The form aliases match the payloadType
+# values accepted by the Flask start endpoints.
+PAYLOAD_CONTENT_TYPES = {
+    "json": "application/json",
+    "form": "application/x-www-form-urlencoded",
+    "form-urlencoded": "application/x-www-form-urlencoded",
+    "application/x-www-form-urlencoded": "application/x-www-form-urlencoded",
+    "text": "text/plain",
+}
+
+
+def template_identifiers(template: Template) -> tuple:
+    """Placeholder names used by a string.Template, in order of first appearance."""
+    identifiers = []
+    for match in template.pattern.finditer(template.template):
+        name = match.group("named") or match.group("braced")
+        if name and name not in identifiers:
+            identifiers.append(name)
+    return tuple(identifiers)
+
+
+class PayloadRenderer:
+    """
+    Renders request bodies from a payload template straight to bytes.
+
+    The template is analyzed once: a template without placeholders is rendered a
+    single time, otherwise bodies are rendered per data row and kept in an LRU
+    cache keyed by the row's values for the template's placeholders. Bodies are
+    sent verbatim via ``data=`` with a fixed Content-Type, so the hot path never
+    does a JSON parse/dump round trip. Request headers are merged once and shared.
+
+    Args:
+        template (string.Template): The payload template.
+        payload_type (str): PAYLOAD_TYPE, see PAYLOAD_CONTENT_TYPES.
+        headers (dict): Custom request headers (HEADERS).
+        cache_size (int): Maximum number of rendered bodies kept in memory.
+    """
+    def __init__(self, template: Template, payload_type: str = "json", headers: dict = None,
+                 cache_size: int = DEFAULT_PAYLOAD_CACHE_SIZE):
+        self.template = template if template is not None else Template("")
+        self.payload_type = payload_type
+        self.content_type = PAYLOAD_CONTENT_TYPES.get(payload_type)
+        self.identifiers = template_identifiers(self.template)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        self.headers = dict(headers or {})
+        if self.content_type:
+            self.headers["Content-Type"] = self.content_type
+        if payload_type == "json":
+            # Previously added by FastHttpUser when sending with json=
+            self.headers.setdefault("Accept", "application/json")
+
+        self._static_body = None if self.identifiers else self.template.safe_substitute({}).encode("utf-8")
+        if payload_type not in PAYLOAD_CONTENT_TYPES:
+            logger.warning(f"Unknown payload type '{payload_type}'. Sending as raw data with no explicit Content-Type.")
+        elif payload_type == "json":
+            self._validate_json_template()
+
+    def _validate_json_template(self):
+        # Substitute every placeholder with a number so both quoted and bare placeholders stay valid JSON
+        sample = self.template.safe_substitute({name: 0 for name in self.identifiers})
+        if not sample.strip():
+            return
+        try:
+            json.loads(sample)
+        except json.JSONDecodeError:
+            logger.warning(f"Payload type is 'json' but the template is not valid JSON. It will be sent as-is. Template: {self.template.template[:100]}")
+
+    def render(self, row: dict = None) -> bytes:
+        """Returns the request body for a data row."""
+        if self._static_body is not None:
+            return self._static_body
+        row = row or {}
+        try:
+            key = tuple(row.get(name, _MISSING) for name in self.identifiers)
+            body = self._cache.get(key)
+        except TypeError:  # Unhashable values (e.g. nested JSON rows) are rendered uncached
+            return self.template.safe_substitute(row).encode("utf-8")
+
+        if body is not None:
+            self._cache.move_to_end(key)
+            return body
+        body = self.template.safe_substitute(row).encode("utf-8")
+        self._cache[key] = body
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return body
+
+
+class MappedPayload:
+    """
+    Request body reading a memory-mapped payload file, one per request. geventhttpclient sends
+    any body that is not ``bytes`` with ``sock.sendfile``, so this is file-like: ``len()`` gives
+    the Content-Length, ``read`` the next block and ``seek`` rewinds it for a redirect.
+
+    Args:
+        view (memoryview): The mapped file, shared by all requests.
+    """
+    mode = "rb"  # sendfile only accepts binary files
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def __len__(self):
+        return len(self._view)
+
+    def read(self, size: int = -1) -> bytes:
+        start = self._position
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: len(self._view)}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class BinaryPayloadSource:
+    """
+    Serves binary request bodies loaded once per process.
+
+    ``path`` may be a single file, a directory, or (with ``rotate=True``) a .zip/.tar
+    archive. Directories and archives are rotated through file by file; each file is
+    read on first use and cached. Files of at least ``mmap_threshold`` bytes are
+    memory-mapped and each request gets a MappedPayload reading the mapping, so
+    multi-MB uploads are never read into memory or copied whole per request.
+
+    Args:
+        path (str): File, directory or archive holding the payloads (PAYLOAD_TEMPLATE).
+        headers (dict): Custom request headers (HEADERS).
+        content_type (str): Content-Type to send, or "auto" to guess it from each file name.
+        rotate (bool): Treat a .zip/.tar file as an archive of payloads rather than one payload.
+        mmap_threshold (int): Minimum file size for memory-mapping.
+
+    Raises:
+        ValueError: If no payload files are found.
+    """
+    def __init__(self, path: str, headers: dict = None, content_type: str = DEFAULT_BINARY_CONTENT_TYPE,
+                 rotate: bool = False, mmap_threshold: int = DEFAULT_BINARY_MMAP_THRESHOLD_BYTES):
+        self.path = path
+        self.content_type = content_type
+        self.mmap_threshold = mmap_threshold
+        self._headers = dict(headers or {})
+        self._archive = None
+        self._open_files = []
+        self._cache = {}
+        self._headers_by_type = {}
+        self._cursor = 0
+
+        if os.path.isdir(path):
+            self.names = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if not name.startswith(".") and os.path.isfile(os.path.join(path, name)))
+        elif rotate and zipfile.is_zipfile(path):
+            self._archive = zipfile.ZipFile(path)
+            self.names = sorted(info.filename for info in self._archive.infolist() if not info.is_dir())
+        elif rotate and tarfile.is_tarfile(path):
+            self._archive = tarfile.open(path)
+            self.names = sorted(member.name for member in self._archive.getmembers() if member.isfile())
+        else:
+            self.names = [path]
+        if not self.names:
+            raise ValueError(f"No binary payload files found in '{path}'.")
+
+    def __len__(self):
+        return len(self.names)
+
+    def next_payload(self):
+        """Returns ``(body, headers)`` for the next payload file in rotation."""
+        name = self.names[self._cursor % len(self.names)]
+        self._cursor += 1
+        body = self._cache.get(name)
+        if body is None:
+            body = self._cache[name] = self._load(name)
+        if isinstance(body, memoryview):
+            body = MappedPayload(body)  # Each request reads the mapping from its start
+        return body, self._headers_for(name)
+
+    def _load(self, name: str):
+        if isinstance(self._archive, zipfile.ZipFile):
+            return self._archive.read(name)
+        if isinstance(self._archive, tarfile.TarFile):
+            return self._archive.extractfile(name).read()
+
+        size = os.path.getsize(name)
+        if size >= self.mmap_threshold:
+            f = open(name, "rb")
+            self._open_files.append(f)
+            logger.info(f"Memory-mapped binary payload '{name}' ({size} bytes).")
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        with open(name, "rb") as f:
+            return f.read()
+
+    def _headers_for(self, name: str) -> dict:
+        content_type = self.content_type
+        if content_type == "auto":
+            content_type = mimetypes.guess_type(name)[0] or DEFAULT_BINARY_CONTENT_TYPE
+        headers = self._headers_by_type.get(content_type)
+        if headers is None:
+            headers = self._headers_by_type[content_type] = dict(self._headers, **{"Content-Type": content_type})
+        return headers
+
+    def close(self):
+        self._cache.clear()
+        if self._archive is not None:
+            self._archive.close()
+        for f in self._open_files:
+            f.close()
@@ -0,0 +1,219 @@
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Kinds of response GenericUser checks differently (ResponsePlan.route)
+KIND_ERROR = "error"  # Not 2xx
+KIND_JSON = "json"
+KIND_TEXT = "text"
+KIND_BINARY = "binary"
+KIND_NO_CONTENT = "no_content"  # 204 without a recognised content type
+KIND_UNKNOWN = "unknown"
+
+# What is done with a response body
+BODY_DECODE = "decode"  # Read into memory and parsed, for JSONPath assertions and metrics
+BODY_LENGTH = "length"  # Drained; only its size is checked (empty or not)
+BODY_DRAIN = "drain"  # Drained unchecked, so the connection can be reused
+
+DEFAULT_DRAIN_CHUNK_BYTES = 64 * 1024
+# Bytes of an error response's body quoted in its failure message
+ERROR_PREVIEW_BYTES = 200
+# Distinct Content-Type values whose route is remembered
+MAX_CACHED_CONTENT_TYPES = 64
+
+
+def parse(json_path_str: str):
+    """jsonpath_ng's parser, imported on first use so runs without JSONPath never load it."""
+    from jsonpath_ng import parse as jsonpath_parse
+    return jsonpath_parse(json_path_str)
+
+
+def metric_name_for(json_path_str: str) -> str:
+    return f"jsonpath.{json_path_str.replace('$', '').replace('.', '_').replace('[', '_').replace(']', '').strip('_')}"
+
+
+class JsonPathPlan:
+    """
+    JSONPath assertions and custom metric extractions, compiled once at config-load time.
+
+    Args:
+        expected_values (dict): Mapping of JSONPath string -> expected value (EXPECTED_JSON_PATH_VALUE).
+        metric_paths (list): JSONPath strings whose numeric matches are reported as metrics
+                             (CUSTOM_METRICS_JSON_PATH).
+
+    Raises:
+        ValueError: If any JSONPath expression fails to parse, so the test can abort before it starts.
+    """
+    def __init__(self, expected_values: dict = None, metric_paths: list = None):
+        if expected_values and not isinstance(expected_values, dict):
+            raise ValueError("EXPECTED_JSON_PATH_VALUE must be a JSON object mapping JSONPath to expected value.")
+        self.assertions = [(path, self._compile(path), expected) for path, expected in (expected_values or {}).items()]
+        self.metrics = [(path, self._compile(path), metric_name_for(path)) for path in (metric_paths or [])]
+
+    @staticmethod
+    def _compile(json_path_str: str):
+        try:
+            return parse(json_path_str)
+        except Exception as e:
+            raise ValueError(f"Invalid JSONPath expression '{json_path_str}': {e}") from e
+
+    def __bool__(self):
+        return bool(self.assertions or self.metrics)
+
+    def check(self, response_json) -> list:
+        """Evaluates the assertions and returns failure messages; stops at the first failure."""
+        for json_path_str, jsonpath_expr, expected_value in self.assertions:
+            try:
+                matches = jsonpath_expr.find(response_json)
+                if not matches:
+                    return [f"JSONPath '{json_path_str}' found no matches."]
+                actual_value = matches[0].value
+                if actual_value != expected_value:
+                    return [f"JSONPath '{json_path_str}': Expected '{expected_value}', got '{actual_value}'."]
+            except Exception as e:
+                return [f"Error evaluating JSONPath '{json_path_str}': {e}"]
+        return []
+
+    def extract_metrics(self, response_json) -> list:
+        """Returns ``(metric_name, value)`` for every match of every metric path."""
+        extracted = []
+        for json_path_str, jsonpath_expr, metric_name in self.metrics:
+            try:
+                for match in jsonpath_expr.find(response_json):
+                    extracted.append((metric_name, match.value))
+            except Exception as e:
+                logger.error(f"Error extracting custom metric from JSONPath '{json_path_str}': {e}")
+        return extracted
+
+
+def body_preview(head: bytes) -> str:
+    """Start of a body for log and failure messages; never fails on undecodable bytes."""
+    return head[:ERROR_PREVIEW_BYTES].decode("utf-8", errors="replace")
+
+
+class _DeflateDecoder:
+    """'deflate' bodies should be zlib streams, but some servers send raw deflate data; like the
+    HTTP client's ``response.content``, both are accepted."""
+    def __init__(self):
+        self._decompressor = None
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._decompressor is None:
+            try:
+                self._decompressor = zlib.decompressobj()
+                return self._decompressor.decompress(chunk)
+            except zlib.error:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(chunk)
+
+
+def body_decoder(content_encoding: str):
+    """
+    Streaming decompressor for a response's Content-Encoding: a function taking the next chunk of
+    the body as sent and returning the decoded bytes it completes, or None for unencoded bodies.
+    Decodes the encodings ``response.content`` does, so drained and decoded bodies count alike.
+    """
+    encoding = (content_encoding or "").strip().lower()
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if encoding == "deflate":
+        return _DeflateDecoder().decompress
+    if encoding == "br":
+        import brotli  # A dependency of the HTTP client, which already imported it
+        return brotli.Decompressor().process
+    return None
+
+
+class ResponsePlan:
+    """
+    How GenericUser consumes response bodies, decided once per run. Requests are streamed, and
+    only JSON bodies that JSONPath assertions or metrics look at are read into memory and
+    decoded. Every other body is drained in chunks, counting its size, which is all the checks
+    of text, binary and empty responses need.
+
+    Args:
+        json_path_plan (JsonPathPlan): JSON bodies are decoded only if it has assertions or metrics.
+        max_bytes (int): Bodies larger than this fail the request (RESPONSE_MAX_BYTES); None for no limit.
+        chunk_size (int): Bytes read at a time while draining.
+
+    Raises:
+        ValueError: If max_bytes is not positive.
+    """
+    def __init__(self, json_path_plan: JsonPathPlan = None, max_bytes: int = None,
+                 chunk_size: int = DEFAULT_DRAIN_CHUNK_BYTES):
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("RESPONSE_MAX_BYTES must be a positive number of bytes.")
+        self.decode_json = bool(json_path_plan)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._routes = {}
+
+    def route(self, status_code: int, content_type: str) -> tuple:
+        """``(kind, action)`` for a response: its KIND_* and what to do with its body (BODY_*)."""
+        if not 200 <= status_code < 300:
+            return KIND_ERROR, BODY_DRAIN
+        route = self._routes.get(content_type)
+        if route is None:
+            route = self._route_content_type(content_type)
+            if len(self._routes) < MAX_CACHED_CONTENT_TYPES:
+                self._routes[content_type] = route
+        if route[0] == KIND_UNKNOWN and status_code == 204:
+            return KIND_NO_CONTENT, BODY_LENGTH
+        return route
+
+    def _route_content_type(self, content_type: str) -> tuple:
+        if "application/json" in content_type:
+            return KIND_JSON, BODY_DECODE if self.decode_json else BODY_DRAIN
+        if "text/" in content_type or "application/xml" in content_type:
+            return KIND_TEXT, BODY_LENGTH
+        if "image/" in content_type or "application/octet-stream" in content_type or "application/pdf" in content_type:
+            return KIND_BINARY, BODY_LENGTH
+        return KIND_UNKNOWN, BODY_DRAIN
+
+    def oversized(self, length: int):
+        """Failure message if a body of ``length`` bytes exceeds max_bytes, else None."""
+        if self.max_bytes is not None and length > self.max_bytes:
+            return f"Response body of {length} bytes exceeds the {self.max_bytes} byte limit."
+        return None
+
+    def drain(self, response, keep: int = 0) -> tuple:
+        """
+        Reads a streamed body in chunks without keeping it, then hands back the connection.
+        Compressed bodies are decompressed as they stream, so lengths and max_bytes count the
+        decoded body, as for a decoded ``response.content``. A body over max_bytes is not read
+        further, and an unencoded one whose Content-Length is over it not at all; the
+        connection is then closed instead of reused.
+
+        Args:
+            response: Streamed Locust FastResponse.
+            keep (int): Leading bytes to return, e.g. for a failure message.
+
+        Returns:
+            ``(length, head, failure)``: decoded bytes, the first ``keep`` of them, and a failure
+            message if the body was too large or could not be read, else None.
+        """
+        head = b""
+        length = 0
+        try:
+            decode = body_decoder(response.headers.get("Content-Encoding"))
+            declared = response.headers.get("Content-Length")
+            if decode is None and declared and declared.isdigit() and self.oversized(int(declared)):
+                return 0, head, self.oversized(int(declared))
+            while True:
+                chunk = response.read(self.chunk_size)
+                if not chunk:
+                    break
+                if decode is not None:
+                    chunk = decode(chunk)
+                length += len(chunk)
+                if len(head) < keep:
+                    head += chunk[:keep - len(head)]
+                failure = self.oversized(length)
+                if failure:
+                    return length, head, failure
+        except Exception as e:
+            return length, head, f"Error reading response body: {e}"
+        finally:
+            response.release()
+        return length, head, None
@@ -0,0 +1,46 @@
+import os
+
+# Settings shared by the service (app.py) and the Locust processes it starts. Every load
+# generator imports this module, so it must stay free of anything beyond the standard library.
+
+TEST_RESULTS_DIRNAME = "test_results"
+LOCUST_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locust_generic_test.py")
+
+# What a run does once a load generator stays saturated (see generator_health.SaturationGuard)
+ACTION_NONE = "none"
+ACTION_ABORT = "abort"
+ACTION_ADD_WORKERS = "add_workers"
+SATURATION_ACTIONS = (ACTION_NONE, ACTION_ABORT, ACTION_ADD_WORKERS)
+
+# HTTP connection pools of the load-generating users (HTTP_CONNECTION_POOL): one per user,
+# or one per load-generator process shared by all of its users
+POOL_PER_USER = "per_user"
+POOL_SHARED = "shared"
+CONNECTION_POOL_MODES = (POOL_PER_USER, POOL_SHARED)
+
+# Run settings a pool run hands to the workers on remote nodes, and all that agents apply: the
+# rest of a run's environment (PYTHONPATH, LD_PRELOAD, ...) must not reach a node's processes
+WORKER_ENV_KEYS = frozenset((
+    "ARRIVAL_DISTRIBUTION", "BINARY_CONTENT_TYPE", "BINARY_MMAP_THRESHOLD_BYTES", "BINARY_PAYLOAD_ROTATE",
+    "CUSTOM_METRICS_JSON_PATH", "DATA_FEED_MODE", "DATA_FILE", "DATA_PARTITIONS", "DATA_STREAMING",
+    "DATA_STREAMING_THRESHOLD_BYTES", "ENDPOINT", "EXPECTED_JSON_PATH_VALUE", "GENERATOR_CPU_THRESHOLD",
+    "GENERATOR_HEALTH_INTERVAL", "GENERATOR_LOOP_LAG_THRESHOLD_MS", "GENERATOR_MAX_WORKERS",
+    "GENERATOR_SATURATION_ACTION", "GENERATOR_SATURATION_SECONDS", "HEADERS", "HTTP_CONNECTIONS_PER_USER",
+    "HTTP_CONNECTION_POOL", "HTTP_CONNECT_TIMEOUT", "HTTP_KEEP_ALIVE", "HTTP_READ_TIMEOUT", "HTTP_VERIFY_TLS",
+    "LOCUST_MODE", "LOCUST_WORKER_COUNT", "METHOD", "METRICS_AGGREGATION_INTERVAL", "METRICS_LOG_BATCHED",
+    "METRICS_LOG_FLUSH_BYTES", "METRICS_LOG_FLUSH_INTERVAL_MS", "METRICS_LOG_SEGMENT_BYTES",
+    "METRICS_LOG_SEGMENT_SECONDS", "OPEN_MAX_CONCURRENCY", "PAYLOAD_CACHE_SIZE", "PAYLOAD_TEMPLATE",
+    "PAYLOAD_TYPE", "REQUEST_LOG_MODE", "RESPONSE_MAX_BYTES", "REUSE_DATA", "RUN_LAUNCHED_AT", "TARGET_QPS",
+    "WAIT_TIME_MAX", "WAIT_TIME_MIN",
+))
+# Input files workers download from the service instead of reading a path on the service host
+WORKER_FILE_KEYS = frozenset(("DATA_FILE", "PAYLOAD_TEMPLATE"))
+
+
+def test_results_dir() -> str:
+    """
+    Root of the per-run result directories: TEST_RESULTS_DIR, which the service sets for the
+    runs it starts, else ``test_results`` in the working directory. Read on every call, since
+    warm Locust processes import this module before they receive a run's environment.
+    """
+    return os.path.abspath(os.getenv("TEST_RESULTS_DIR") or TEST_RESULTS_DIRNAME)
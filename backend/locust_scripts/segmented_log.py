@@ -0,0 +1,346 @@
+import json
+import os
+import time
+from bisect import bisect_right
+
+import zstandard
+
+METRICS_LOG_FILENAME = "flask_locust_runner_metrics.log"
+SEGMENTS_DIRNAME = "metrics_segments"
+INDEX_FILENAME = "index.json"
+DICTIONARY_FILENAME = "dictionary.zdict"
+INDEX_VERSION = 1
+
+# Rotation defaults: close the active segment at 16 MB or after 15 minutes, whichever comes first
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_SEGMENT_SECONDS = 900
+# Closed segments are stored as independent zstd frames of about this many bytes of whole lines,
+# so a reader can decompress just the part of a segment it needs
+DEFAULT_FRAME_BYTES = 256 * 1024
+DEFAULT_COMPRESSION_LEVEL = 9
+DICTIONARY_SIZE = 64 * 1024
+DICTIONARY_MAX_SAMPLES = 20_000
+
+
+def compress_segment_file(plain_path: str, compressed_path: str, dict_data: bytes = None,
+                          level: int = DEFAULT_COMPRESSION_LEVEL, frame_bytes: int = DEFAULT_FRAME_BYTES):
+    """
+    Compresses a closed segment into line-aligned zstd frames.
+
+    Returns:
+        (frames, length): ``[[offset_in_segment, compressed_offset, compressed_length], ...]`` and the
+        uncompressed segment length.
+    """
+    dictionary = zstandard.ZstdCompressionDict(dict_data) if dict_data else None
+    compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    with open(plain_path, "rb") as f:
+        data = f.read()
+
+    frames = []
+    position = 0
+    compressed_offset = 0
+    tmp_path = compressed_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        while position < len(data):
+            end = data.rfind(b"\n", position, position + frame_bytes) + 1
+            if end <= position:
+                # A single line longer than frame_bytes: the frame ends after it
+                end = data.find(b"\n", position + frame_bytes) + 1 or len(data)
+            blob = compressor.compress(data[position:end])
+            out.write(blob)
+            frames.append([position, compressed_offset, len(blob)])
+            compressed_offset += len(blob)
+            position = end
+    os.replace(tmp_path, compressed_path)
+    return frames, len(data)
+
+
+def train_dictionary(plain_path: str, dict_size: int = DICTIONARY_SIZE):
+    """Trains a zstd dictionary on the lines of a closed segment. Returns its bytes, or None if training failed."""
+    samples = []
+    with open(plain_path, "rb") as f:
+        for line in f:
+            samples.append(line)
+            if len(samples) >= DICTIONARY_MAX_SAMPLES:
+                break
+    try:
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+    except zstandard.ZstdError:
+        return None  # Too little data so far, the next segment tries again
+
+
+def _write_json_atomic(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class SegmentedLogWriter:
+    """
+    Rotating, compressed storage for a run's NDJSON metrics log.
+
+    Lines are appended to the active segment, which keeps the legacy
+    ``flask_locust_runner_metrics.log`` name so plain tailing still works. Once it reaches
+    ``segment_bytes`` or ``segment_seconds`` it is moved to ``metrics_segments/`` and a new one
+    is started. ``compress_pending`` then compresses closed segments with a zstd dictionary
+    trained on the first one. ``metrics_segments/index.json`` maps the logical log (all
+    segments concatenated) to segment files and frames.
+
+    Args:
+        log_dir (str): Run directory holding the log.
+        segment_bytes (int): Active segment size that triggers rotation.
+        segment_seconds (float): Active segment age that triggers rotation (0 disables).
+        offload (callable): Runs ``fn(*args)`` and returns its result, e.g. on a thread pool, so
+                            compression does not block the caller's event loop.
+    """
+    def __init__(self, log_dir: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS, offload=None):
+        self.log_dir = log_dir
+        self.segments_dir = os.path.join(log_dir, SEGMENTS_DIRNAME)
+        self.active_path = os.path.join(log_dir, METRICS_LOG_FILENAME)
+        self.index_path = os.path.join(self.segments_dir, INDEX_FILENAME)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.offload = offload or (lambda fn, *args: fn(*args))
+        os.makedirs(self.segments_dir, exist_ok=True)
+
+        self.index = _load_index(self.index_path)
+        self.index["closed"] = False
+        self._file = open(self.active_path, "a")
+        self._active_bytes = self._file.tell()
+        self._opened_at = time.monotonic()
+        self._write_index()
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    def write(self, text: str):
+        """Appends whole lines to the active segment, rotating it first when it is full or old."""
+        if self._file is None:
+            return
+        if self._active_bytes and (self._active_bytes >= self.segment_bytes or (
+                self.segment_seconds and time.monotonic() - self._opened_at >= self.segment_seconds)):
+            self.rotate()
+        self._file.write(text)
+        self._file.flush()
+        self._active_bytes += len(text.encode("utf-8"))
+
+    def rotate(self, reopen: bool = True):
+        """Closes the active segment and, unless ``reopen`` is False, starts a new one."""
+        self._file.close()
+        self._file = None
+        length = os.path.getsize(self.active_path)
+        if length:
+            seq = len(self.index["segments"]) + 1
+            plain_name = f"{seq:06d}.log"
+            os.replace(self.active_path, os.path.join(self.segments_dir, plain_name))
+            self.index["segments"].append({"seq": seq, "file": plain_name, "start": self.index["active_start"],
+                                           "length": length, "compressed": False})
+            self.index["active_start"] += length
+        if not reopen:
+            self.index["closed"] = True
+            if not length and os.path.exists(self.active_path):
+                os.remove(self.active_path)
+        # The index is updated before the new active segment exists, so a tailer that sees the
+        # new file always finds its start offset in the index
+        self._write_index()
+        if reopen:
+            self._file = open(self.active_path, "a")
+            self._active_bytes = 0
+            self._opened_at = time.monotonic()
+
+    def compress_pending(self):
+        """Compresses every closed segment that is still plain text, updating the index after each one."""
+        for segment in self.index["segments"]:
+            if segment["compressed"]:
+                continue
+            plain_path = os.path.join(self.segments_dir, segment["file"])
+            if self.index["dictionary"] is None:
+                dict_data = self.offload(train_dictionary, plain_path)
+                if dict_data is not None:
+                    with open(os.path.join(self.segments_dir, DICTIONARY_FILENAME), "wb") as f:
+                        f.write(dict_data)
+                    self.index["dictionary"] = DICTIONARY_FILENAME
+            dict_data = self._dictionary_bytes()
+            compressed_name = f"{segment['seq']:06d}.zst"
+            frames, _ = self.offload(compress_segment_file, plain_path,
+                                     os.path.join(self.segments_dir, compressed_name), dict_data)
+            segment.update(file=compressed_name, compressed=True, frames=frames,
+                           dictionary=dict_data is not None)
+            self._write_index()
+            os.remove(plain_path)
+
+    def close(self):
+        """Closes the last segment and compresses everything, leaving only compressed segments."""
+        if self._file is None:
+            return
+        self.rotate(reopen=False)
+        self.compress_pending()
+
+    def _dictionary_bytes(self):
+        if self.index["dictionary"] is None:
+            return None
+        with open(os.path.join(self.segments_dir, self.index["dictionary"]), "rb") as f:
+            return f.read()
+
+    def _write_index(self):
+        _write_json_atomic(self.index_path, self.index)
+
+
+def _empty_index() -> dict:
+    return {"version": INDEX_VERSION, "segments": [], "active_start": 0, "dictionary": None, "closed": False}
+
+
+def _load_index(index_path: str) -> dict:
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return _empty_index()
+    if index.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported metrics segment index version: {index.get('version')}")
+    return index
+
+
+class SegmentedLogReader:
+    """
+    Reads a run's metrics log as one logical byte stream, whether it is a single plain file
+    or rotated, compressed segments plus an active segment. Logical offsets are stable, so
+    they can be used as SSE event ids across rotations.
+
+    Args:
+        test_run_dir (str): Run directory holding the log.
+        log_filename (str): Name of the active segment (the plain log of unsegmented runs).
+    """
+    def __init__(self, test_run_dir: str, log_filename: str = METRICS_LOG_FILENAME):
+        self.active_path = os.path.join(test_run_dir, log_filename)
+        self.segments_dir = os.path.join(test_run_dir, SEGMENTS_DIRNAME)
+        self.index_path = os.path.join(self.segments_dir, INDEX_FILENAME)
+        self._index_version = None
+        self._decompressors = {}
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the index if the writer changed it."""
+        try:
+            stat = os.stat(self.index_path)
+            # The index is replaced atomically, so a new inode means a new version even within one mtime tick
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        if version == self._index_version and version is not None:
+            return
+        self._index_version = version
+        # A run that was never segmented has no index: the whole log is the active file
+        self.index = _load_index(self.index_path) if version is not None else _empty_index()
+        self._segment_starts = [segment["start"] for segment in self.index["segments"]]
+
+    @property
+    def active_start(self) -> int:
+        return self.index["active_start"]
+
+    def size(self) -> int:
+        """Logical length of the log."""
+        self.refresh()
+        try:
+            return self.active_start + os.path.getsize(self.active_path)
+        except FileNotFoundError:
+            return self.active_start
+
+    def read_range(self, start: int, end: int) -> bytes:
+        """Returns the logical bytes between two offsets (shorter if the log ends earlier)."""
+        self.refresh()
+        while True:
+            index_version = self._index_version
+            try:
+                data = self._read_range(start, end)
+            except FileNotFoundError:
+                # A segment was compressed (and its plain file removed) meanwhile
+                self._index_version = None
+                self.refresh()
+                continue
+            self.refresh()
+            if self._index_version == index_version:
+                return data
+            # The writer rotated or compressed while we were reading: read again with the new index
+
+    def _read_range(self, start: int, end: int) -> bytes:
+        chunks = []
+        position = start
+        if position < self.active_start:
+            index = max(0, bisect_right(self._segment_starts, position) - 1)
+            for segment in self.index["segments"][index:]:
+                if position >= end:
+                    break
+                chunks.append(self._read_segment(segment, position - segment["start"],
+                                                 min(end, segment["start"] + segment["length"]) - segment["start"]))
+                position = segment["start"] + segment["length"]
+        if position < end:
+            try:
+                fd = os.open(self.active_path, os.O_RDONLY)
+            except FileNotFoundError:
+                pass
+            else:
+                try:
+                    chunks.append(os.pread(fd, end - position, position - self.active_start))
+                finally:
+                    os.close(fd)
+        return b"".join(chunks)
+
+    def _read_segment(self, segment: dict, start: int, end: int) -> bytes:
+        path = os.path.join(self.segments_dir, segment["file"])
+        if not segment["compressed"]:
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+
+        frames = segment["frames"]
+        first = max(0, bisect_right([frame[0] for frame in frames], start) - 1)
+        decompressor = self._decompressor(segment)
+        chunks = []
+        with open(path, "rb") as f:
+            for frame_start, compressed_offset, compressed_length in frames[first:]:
+                if frame_start >= end:
+                    break
+                f.seek(compressed_offset)
+                chunks.append(decompressor.decompress(f.read(compressed_length)))
+        data = b"".join(chunks)
+        base = frames[first][0] if frames else 0
+        return data[start - base:end - base]
+
+    def _decompressor(self, segment: dict):
+        use_dictionary = segment.get("dictionary") and self.index["dictionary"]
+        key = self.index["dictionary"] if use_dictionary else None
+        decompressor = self._decompressors.get(key)
+        if decompressor is None:
+            dictionary = None
+            if key is not None:
+                with open(os.path.join(self.segments_dir, key), "rb") as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+            decompressor = self._decompressors[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor
+
+    def iter_lines(self):
+        """Yields every complete line of the log, one segment at a time."""
+        self.refresh()
+        position = 0
+        while position < self.active_start:
+            segment = self.index["segments"][bisect_right(self._segment_starts, position) - 1]
+            try:
+                data = self._read_segment(segment, 0, segment["length"])
+            except FileNotFoundError:
+                # Compressed meanwhile: read it again from the compressed file
+                self._index_version = None
+                self.refresh()
+                continue
+            yield from data.split(b"\n")[:-1]
+            position = segment["start"] + segment["length"]
+        try:
+            with open(self.active_path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        yield line[:-1]
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,62 @@
+"""
+Entry point of a pre-warmed Locust process, kept idle by the service's WarmLocustPool
+(backend/warm_pool.py). Everything slow to import is imported up front; the run's config then
+arrives as one JSON line on stdin and Locust runs exactly as ``locust <argv>`` would have with
+that environment. locust_generic_test.py itself is only imported once the config is applied,
+since it reads its settings from the environment at import time.
+"""
+import json
+import os
+import sys
+
+# Locust pulls in gevent (and monkey-patches), requests, geventhttpclient and Flask
+import locust.main
+from locust.contrib.fasthttp import FastHttpUser  # noqa: F401
+
+# Helper modules of locust_generic_test.py, with psutil and zstandard
+import connection_timing  # noqa: F401
+import constant_throughput_plugin  # noqa: F401
+import data_feeder  # noqa: F401
+import generator_health  # noqa: F401
+import hot_path  # noqa: F401
+import locust_logger  # noqa: F401
+import metrics_aggregator  # noqa: F401
+import node_stats  # noqa: F401
+import open_workload  # noqa: F401
+import payload_engine  # noqa: F401
+import response_plan  # noqa: F401
+import run_config  # noqa: F401
+# Imported on first use by response_plan; an idle process can load it ahead of time
+import jsonpath_ng  # noqa: F401
+
+
+def _apply_config(config):
+    os.chdir(config["cwd"])
+    os.environ.clear()
+    os.environ.update(config["env"])
+    # The interpreter read PYTHONPATH at startup, from the pool's environment
+    for path in reversed(config["env"].get("PYTHONPATH", "").split(os.pathsep)):
+        if path and path not in sys.path:
+            sys.path.insert(1, path)
+    if config.get("process_group"):
+        os.setpgid(0, config["process_group"])
+    log_fd = os.open(config["log_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.close(null_fd)
+    sys.argv = ["locust"] + config["argv"]
+
+
+def main():
+    line = sys.stdin.buffer.readline()
+    if not line:
+        return 0  # The pool closed the pipe without handing out a run
+    _apply_config(json.loads(line))
+    return locust.main.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
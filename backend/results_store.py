@@ -0,0 +1,313 @@
+import json
+import logging
+import math
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import zstandard
+
+from locust_scripts.segmented_log import SegmentedLogReader
+
+logger = logging.getLogger(__name__)
+
+RESULTS_STORE_FILENAME = "metrics.colstore"
+STORE_MAGIC = b"PSCOL1\n"
+STORE_VERSION = 1
+ZSTD_LEVEL = 9
+TIMESTAMP_COLUMN = "timestamp"
+AGGREGATIONS = ("mean", "min", "max", "sum", "last", "count")
+# Decompressed columns kept per open store
+COLUMN_CACHE_SIZE = 64
+
+
+def iter_metrics_events(test_run_dir: str):
+    """
+    Yields every event dict from a run's metrics log, skipping anything that is not a JSON event.
+    Rotated, compressed segments are read transparently.
+    """
+    for line in SegmentedLogReader(test_run_dir).iter_lines():
+        line = line.strip()
+        if not line.startswith(b"{"):
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        if "event" in data:
+            yield data
+
+
+def series_key(event_type: str, request_type=None, name=None) -> str:
+    if name is None and request_type is None:
+        return event_type
+    return f"{event_type}:{request_type or ''}:{name or ''}"
+
+
+class _SeriesBuilder:
+    """Accumulates one series' numeric fields into float64 columns (NaN where a row lacks a field)."""
+    def __init__(self, meta: dict):
+        self.meta = meta
+        self.rows = 0
+        self.columns = {}
+
+    def add(self, data: dict):
+        for field, value in data.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            column = self.columns.get(field)
+            if column is None:
+                column = self.columns[field] = array("d", [math.nan]) * self.rows
+            column.append(value)
+        self.rows += 1
+        for column in self.columns.values():
+            if len(column) < self.rows:
+                column.append(math.nan)
+
+    def sorted_columns(self) -> dict:
+        """Columns ordered by timestamp (log lines from concurrent writers may interleave slightly)."""
+        timestamps = self.columns[TIMESTAMP_COLUMN]
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            return self.columns
+        order = sorted(range(self.rows), key=timestamps.__getitem__)
+        return {field: array("d", (column[i] for i in order)) for field, column in self.columns.items()}
+
+
+def build_results_store(test_run_dir: str, test_id: str = None):
+    """
+    Converts a finished run's metrics log into a compact columnar store next to it.
+
+    Events are grouped into series by event type, request type and name. Each numeric field
+    becomes a float64 column, compressed separately with zstd, so a query only reads and
+    decompresses the timestamp column and the one metric it asks for.
+
+    Layout: ``STORE_MAGIC``, an 8-byte little-endian header length, a JSON header describing
+    every series and the ``[offset, length]`` of each of its columns, then the column blobs.
+
+    Returns:
+        The store path, or None if the run has no metrics events.
+    """
+    builders = OrderedDict()
+    generator_bound = None
+    first_request = None
+    phase_breakdown = {}
+    for data in iter_metrics_events(test_run_dir):
+        if not isinstance(data.get(TIMESTAMP_COLUMN), (int, float)):
+            continue
+        if data["event"] == "generator_bound" and generator_bound is None:
+            generator_bound = data
+        # Each generator process reports its first request; the run's is the earliest
+        if data["event"] == "first_request" and (first_request is None
+                                                 or data[TIMESTAMP_COLUMN] < first_request[TIMESTAMP_COLUMN]):
+            first_request = data
+        if data["event"] == "phase_breakdown":
+            phase_breakdown[(data.get("request_type"), data.get("name"))] = data
+        key = series_key(data["event"], data.get("request_type"), data.get("name"))
+        builder = builders.get(key)
+        if builder is None:
+            builder = builders[key] = _SeriesBuilder(
+                {"event": data["event"], "request_type": data.get("request_type"), "name": data.get("name")})
+        builder.add(data)
+    if not builders:
+        return None
+
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    blobs = []
+    blob_offset = 0
+    series = {}
+    for key, builder in builders.items():
+        columns = builder.sorted_columns()
+        timestamps = columns[TIMESTAMP_COLUMN]
+        column_index = {}
+        for field, column in columns.items():
+            if sys.byteorder != "little":
+                column = array("d", column)
+                column.byteswap()
+            blob = compressor.compress(column.tobytes())
+            column_index[field] = [blob_offset, len(blob)]
+            blobs.append(blob)
+            blob_offset += len(blob)
+        series[key] = dict(builder.meta, rows=builder.rows, t_min=timestamps[0], t_max=timestamps[-1],
+                           columns=column_index)
+
+    header = json.dumps({"version": STORE_VERSION, "test_id": test_id, "generator_bound": generator_bound,
+                         "first_request": first_request, "phase_breakdown": list(phase_breakdown.values()),
+                         "series": series}).encode("utf-8")
+    store_path = os.path.join(test_run_dir, RESULTS_STORE_FILENAME)
+    # Unique per builder, so concurrent builds never write into each other's file
+    tmp_path = f"{store_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(STORE_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+class ResultsStore:
+    """
+    Read side of a columnar results store. Only the header is read on open; columns are
+    read, decompressed and cached on first use.
+
+    Args:
+        path (str): Path of a file written by build_results_store.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+                raise ValueError(f"{path} is not a results store.")
+            header_length, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length))
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported results store version: {header.get('version')}")
+        self.test_id = header.get("test_id")
+        # First generator_bound event of the run, None if the load generators kept up
+        self.generator_bound = header.get("generator_bound")
+        # Earliest first_request event (start-to-first-request latency), None without requests
+        self.first_request = header.get("first_request")
+        # phase_breakdown events: pool wait, DNS, connect, TLS, TTFB and body times per request name over the run
+        self.phase_breakdown = header.get("phase_breakdown", [])
+        self.series = header["series"]
+        self._blob_start = len(STORE_MAGIC) + 8 + header_length
+        self._columns = OrderedDict()
+        self._lock = threading.Lock()
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def find_series(self, metric: str, name: str = None, event: str = None, request_type: str = None) -> str:
+        """
+        Picks the series a query refers to. Without ``name`` the run-level ``summary`` series is
+        preferred; with it, the per-endpoint ``request_stats`` series. Raises KeyError when no
+        series has the metric.
+        """
+        candidates = []
+        for key, meta in self.series.items():
+            if metric not in meta["columns"]:
+                continue
+            if event is not None and meta["event"] != event:
+                continue
+            if name is not None and meta["name"] != name:
+                continue
+            if request_type is not None and meta["request_type"] != request_type:
+                continue
+            candidates.append(key)
+        if not candidates:
+            raise KeyError(f"No series with metric '{metric}'" + (f" for name '{name}'" if name else "") + ".")
+        preferred = "request_stats" if name is not None else "summary"
+        for key in candidates:
+            if self.series[key]["event"] == preferred:
+                return key
+        return candidates[0]
+
+    def column(self, key: str, field: str) -> array:
+        cache_key = (key, field)
+        with self._lock:
+            column = self._columns.get(cache_key)
+            if column is not None:
+                self._columns.move_to_end(cache_key)
+                return column
+        offset, length = self.series[key]["columns"][field]
+        with open(self.path, "rb") as f:
+            f.seek(self._blob_start + offset)
+            blob = f.read(length)
+        column = array("d")
+        column.frombytes(self._decompressor.decompress(blob))
+        if sys.byteorder != "little":
+            column.byteswap()
+        with self._lock:
+            self._columns[cache_key] = column
+            if len(self._columns) > COLUMN_CACHE_SIZE:
+                self._columns.popitem(last=False)
+        return column
+
+    def query(self, metric: str, name: str = None, event: str = None, request_type: str = None,
+              start: float = None, end: float = None, step: float = None, agg: str = "mean") -> dict:
+        """
+        Returns ``[timestamp, value]`` points of one metric between ``start`` and ``end`` (epoch
+        seconds, inclusive). With ``step`` the points are bucketed into ``step``-second windows
+        aligned to ``start`` (or the first point) and reduced with ``agg``.
+        """
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{agg}'. Expected one of: {', '.join(AGGREGATIONS)}.")
+        if step is not None and step <= 0:
+            raise ValueError("step must be greater than 0.")
+        key = self.find_series(metric, name, event, request_type)
+        timestamps = self.column(key, TIMESTAMP_COLUMN)
+        values = self.column(key, metric)
+        lo = bisect_left(timestamps, start) if start is not None else 0
+        hi = bisect_right(timestamps, end) if end is not None else len(timestamps)
+
+        points = []
+        if step is None:
+            for i in range(lo, hi):
+                value = values[i]
+                if value == value:  # Skip NaN (rows without this metric)
+                    points.append([timestamps[i], value])
+        elif lo < hi:
+            origin = start if start is not None else timestamps[lo]
+            bucket = None
+            bucket_values = []
+            for i in range(lo, hi):
+                value = values[i]
+                if value != value:
+                    continue
+                index = int((timestamps[i] - origin) // step)
+                if index != bucket:
+                    if bucket_values:
+                        points.append([origin + bucket * step, _reduce(bucket_values, agg)])
+                    bucket = index
+                    bucket_values = []
+                bucket_values.append(value)
+            if bucket_values:
+                points.append([origin + bucket * step, _reduce(bucket_values, agg)])
+
+        meta = self.series[key]
+        return {"series": key, "event": meta["event"], "request_type": meta["request_type"], "name": meta["name"],
+                "metric": metric, "step": step, "agg": agg if step is not None else None, "points": points}
+
+
+def _reduce(values: list, agg: str) -> float:
+    if agg == "mean":
+        return sum(values) / len(values)
+    if agg == "min":
+        return min(values)
+    if agg == "max":
+        return max(values)
+    if agg == "sum":
+        return sum(values)
+    if agg == "count":
+        return len(values)
+    return values[-1]
+
+
+class ResultsStoreCache:
+    """Keeps recently queried stores open, reopening one when its file was rebuilt."""
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, test_run_dir: str):
+        """Returns the ResultsStore for a run directory, or None if it was not built yet."""
+        path = os.path.join(test_run_dir, RESULTS_STORE_FILENAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._stores.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._stores.move_to_end(path)
+                return cached[1]
+        store = ResultsStore(path)
+        with self._lock:
+            self._stores[path] = (mtime, store)
+            if len(self._stores) > self.max_size:
+                self._stores.popitem(last=False)
+        return store
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+STARTING = "starting"
+RUNNING = "running"
+STOPPING = "stopping"
+FINISHED = "finished"
+
+# Finished runs kept in the index for status queries before the oldest are forgotten
+MAX_FINISHED_RUNS = 1000
+
+
+class ScheduledRun:
+    """
+    A test run known to this service instance and its place in the run life cycle:
+    queued -> starting -> running -> stopping -> finished.
+
+    Args:
+        test_id (str): Run identifier (also the name of its results directory).
+        test_type (str): Start endpoint the run came from, e.g. "qps".
+        launch (callable): Called with the run once it is admitted; starts its processes and
+                           sets ``process``. Raises if the run could not be started.
+        cpu_cores (float): CPU cores the run's load generators are expected to use.
+        memory_mb (float): Memory the run's processes are expected to use.
+    """
+    def __init__(self, test_id: str, test_type: str, launch, cpu_cores: float, memory_mb: float):
+        self.test_id = test_id
+        self.test_type = test_type
+        self.launch = launch
+        self.cpu_cores = cpu_cores
+        self.memory_mb = memory_mb
+        self.state = QUEUED
+        self.process = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.exit_code = None
+        self.cancelled = False
+        self.error = None
+        self.details = {}  # Launch results worth reporting, e.g. the worker placement
+        self.shared_files = frozenset()  # Run directory files pool agents may download
+
+    @property
+    def active(self) -> bool:
+        return self.state != FINISHED
+
+    def to_dict(self) -> dict:
+        return {
+            "test_id": self.test_id,
+            "test_type": self.test_type,
+            "state": self.state,
+            "cpu_cores": self.cpu_cores,
+            "memory_mb": self.memory_mb,
+            "pid": self.process.pid if self.process is not None else None,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "exit_code": self.exit_code,
+            "cancelled": self.cancelled,
+            "error": self.error,
+            **self.details,
+        }
+
+
+class RunScheduler:
+    """
+    In-memory index of test runs that admits them against a CPU and memory budget.
+
+    Runs are admitted in submission order while their reserved cores and memory fit in what
+    the running ones leave free; the rest wait in the queue and are launched as earlier runs
+    finish. The head of the queue is never overtaken, so large runs cannot starve. A run
+    larger than the whole budget is admitted once nothing else is running.
+
+    Args:
+        cpu_budget (float): CPU cores available to load generators; defaults to all cores.
+        memory_budget_mb (float): Memory available to runs; defaults to 80% of the host's memory.
+    """
+    def __init__(self, cpu_budget: float = None, memory_budget_mb: float = None):
+        self.cpu_budget = cpu_budget or float(psutil.cpu_count() or 1)
+        self.memory_budget_mb = memory_budget_mb or psutil.virtual_memory().total * 0.8 / (1024 * 1024)
+        self._runs = OrderedDict()  # test_id -> ScheduledRun, in submission order
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def get(self, test_id: str):
+        with self._lock:
+            return self._runs.get(test_id)
+
+    def runs(self) -> list:
+        with self._lock:
+            return [self._describe(run) for run in self._runs.values()]
+
+    def describe(self, run: ScheduledRun) -> dict:
+        with self._lock:
+            return self._describe(run)
+
+    def queue_position(self, test_id: str):
+        """1-based position of a queued run, None once it was admitted."""
+        with self._lock:
+            return self._position(test_id)
+
+    def usage(self) -> dict:
+        with self._lock:
+            cpu, memory = self._reserved()
+            return {"cpu_budget": self.cpu_budget, "memory_budget_mb": round(self.memory_budget_mb),
+                    "cpu_reserved": cpu, "memory_reserved_mb": round(memory), "queued": len(self._queue)}
+
+    def submit(self, run: ScheduledRun) -> bool:
+        """
+        Registers a run. Returns True if it was admitted right away, in which case the caller
+        starts it with ``launch``; otherwise it is queued and launched once admitted.
+        """
+        with self._lock:
+            self._runs[run.test_id] = run
+            self._queue.append(run)
+            admitted = self._admit()
+        self._launch_all([other for other in admitted if other is not run])
+        if run in admitted:
+            return True
+        logger.info(f"[{run.test_id}] Queued at position {self.queue_position(run.test_id)} "
+                    f"({run.cpu_cores} cores, {run.memory_mb:.0f} MB requested).")
+        return False
+
+    def launch(self, run: ScheduledRun):
+        """Starts an admitted run. A run that fails to start is finished and the error re-raised."""
+        try:
+            run.launch(run)
+        except Exception as e:
+            run.error = str(e)
+            self.finish(run.test_id)
+            raise
+        with self._lock:
+            if run.state == STARTING:
+                run.state = RUNNING
+
+    def cancel(self, test_id: str) -> bool:
+        """Removes a queued run. Returns False if it is not waiting in the queue."""
+        with self._lock:
+            run = self._runs.get(test_id)
+            if run is None or run not in self._queue:
+                return False
+            self._queue.remove(run)
+            run.cancelled = True
+            self._set_finished(run)
+            admitted = self._admit()  # The cancelled run may have been holding up the queue
+        logger.info(f"[{test_id}] Queued run cancelled.")
+        self._launch_all(admitted)
+        return True
+
+    def stopping(self, test_id: str):
+        """Marks a started run as shutting down (stop requested or its processes exited)."""
+        with self._lock:
+            run = self._runs.get(test_id)
+            if run is not None and run.state in (STARTING, RUNNING):
+                run.state = STOPPING
+
+    def finish(self, test_id: str, exit_code: int = None):
+        """Marks a run finished, releasing its budget and launching queued runs that now fit."""
+        with self._lock:
+            run = self._runs.get(test_id)
+            if run is None or run.state == FINISHED:
+                return
+            if run in self._queue:
+                self._queue.remove(run)
+            run.exit_code = exit_code
+            self._set_finished(run)
+            admitted = self._admit()
+        self._launch_all(admitted)
+
+    def _launch_all(self, runs: list):
+        for run in runs:
+            try:
+                self.launch(run)
+            except Exception as e:
+                logger.error(f"[{run.test_id}] Failed to start queued run: {e}", exc_info=True)
+
+    def _admit(self) -> list:
+        admitted = []
+        while self._queue:
+            run = self._queue[0]
+            cpu, memory = self._reserved()
+            nothing_running = cpu == 0 and memory == 0
+            if not nothing_running and (cpu + run.cpu_cores > self.cpu_budget
+                                        or memory + run.memory_mb > self.memory_budget_mb):
+                break
+            self._queue.pop(0)
+            run.state = STARTING
+            run.started_at = time.time()
+            admitted.append(run)
+        return admitted
+
+    def _reserved(self):
+        active = [run for run in self._runs.values() if run.state in (STARTING, RUNNING, STOPPING)]
+        return sum(run.cpu_cores for run in active), sum(run.memory_mb for run in active)
+
+    def _position(self, test_id: str):
+        for index, run in enumerate(self._queue):
+            if run.test_id == test_id:
+                return index + 1
+        return None
+
+    def _describe(self, run: ScheduledRun) -> dict:
+        return dict(run.to_dict(), queue_position=self._position(run.test_id))
+
+    def _set_finished(self, run: ScheduledRun):
+        run.state = FINISHED
+        run.finished_at = time.time()
+        finished = [test_id for test_id, other in self._runs.items() if other.state == FINISHED]
+        for test_id in finished[:max(0, len(finished) - MAX_FINISHED_RUNS)]:
+            del self._runs[test_id]
@@ -4,7 +4,10 @@ import tempfile
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import json
+import signal
 import subprocess # Added import
+import threading
+import time
 from io import BytesIO # Added for file upload
 
 # Add the backend directory to sys.path to allow direct import of app
@@ -17,6 +20,9 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import app
+from run_scheduler import RunScheduler, ScheduledRun, RUNNING
+from warm_pool import WarmLocustPool
+from worker_pool import WorkerPool, TOKEN_HEADER
 
 class PerfServiceAPITestCase(unittest.TestCase):
     def setUp(self):
@@ -30,6 +36,10 @@ class PerfServiceAPITestCase(unittest.TestCase):
         # For testing, we are directly patching the module-level variable
         import app as main_app_module
         main_app_module.BASE_TEST_RESULTS_DIR = self.test_dir
+        main_app_module.run_scheduler = RunScheduler(cpu_budget=4, memory_budget_mb=4096)
+        # Runs cold-start Locust, which the tests mock
+        main_app_module.warm_pool = WarmLocustPool(size=0)
+        main_app_module.worker_pool = WorkerPool(token="pool-token")
         # Corrected LOCUST_SCRIPT_PATH
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         main_app_module.LOCUST_SCRIPT_PATH = os.path.join(base_dir, "locust_scripts", "locust_generic_test.py")
@@ -43,10 +53,11 @@ class PerfServiceAPITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data.decode(), "Flask app is running!")
 
+    @patch('os.cpu_count', return_value=1) # One core: a single standalone Locust process
     @patch('subprocess.Popen')
     # @patch('os.makedirs') # Removed mock_makedirs
     @patch('uuid.uuid4')
-    def test_start_generic_test_success(self, mock_uuid, mock_popen): # Removed mock_makedirs from args
+    def test_start_generic_test_success(self, mock_uuid, mock_popen, mock_cpu_count): # Removed mock_makedirs from args
         # Mock Popen to simulate successful Locust process start
         mock_process = MagicMock()
         mock_process.pid = 12345
@@ -103,6 +114,171 @@ class PerfServiceAPITestCase(unittest.TestCase):
         self.assertEqual(kwargs['env']['LOCUST_MODE'], 'constant_qps')
         self.assertEqual(kwargs['env']['TARGET_QPS'], '100')
 
+    @patch('subprocess.Popen')
+    @patch('uuid.uuid4')
+    def test_start_distributed_test(self, mock_uuid, mock_popen):
+        mock_process = MagicMock()
+        mock_process.pid = 12345
+        mock_popen.return_value = mock_process
+        mock_uuid.return_value = "test-uuid-workers"
+
+        form_data = {"host": "http://example.com", "load_type": "QPS_TEST", "targetQps": "300", "workers": "3"}
+        response = self.app.post('/perf-service/api/qps/start', data=form_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data.decode())["workers"], 3)
+
+        self.assertEqual(mock_popen.call_count, 4)
+        (master_cmd,), master_kwargs = mock_popen.call_args_list[0]
+        self.assertIn("--master", master_cmd)
+        self.assertEqual(master_cmd[master_cmd.index("--expect-workers") + 1], "3")
+        port = master_cmd[master_cmd.index("--master-bind-port") + 1]
+        # Runs on Python < 3.11 too (no Popen(process_group=...)): the master leads a new group
+        self.assertEqual(master_kwargs["preexec_fn"].func, os.setpgid)
+        self.assertEqual(master_kwargs["preexec_fn"].args, (0, 0))
+        self.assertEqual(master_kwargs["env"]["LOCUST_ROLE"], "master")
+        self.assertEqual(master_kwargs["env"]["TARGET_QPS"], "300")  # Global rate, split by the workers
+
+        for index, ((worker_cmd,), worker_kwargs) in enumerate(mock_popen.call_args_list[1:]):
+            self.assertIn("--worker", worker_cmd)
+            self.assertNotIn("--headless", worker_cmd)
+            self.assertEqual(worker_cmd[worker_cmd.index("--master-port") + 1], port)
+            self.assertEqual(worker_kwargs["preexec_fn"].args, (0, 12345))
+            self.assertEqual(worker_kwargs["env"]["LOCUST_ROLE"], "worker")
+            self.assertEqual(worker_kwargs["env"]["LOCUST_WORKER_INDEX"], str(index))
+            self.assertEqual(worker_kwargs["env"]["LOCUST_WORKER_COUNT"], "3")
+
+    @patch('subprocess.Popen')
+    def test_start_test_invalid_workers(self, mock_popen):
+        for value in ("abc", "0"):
+            with self.subTest(value=value):
+                response = self.app.post('/perf-service/api/generic/start', data={"workers": value})
+                self.assertEqual(response.status_code, 400)
+        mock_popen.assert_not_called()
+
+    @patch('subprocess.Popen')
+    def test_pool_placement_requires_nodes(self, mock_popen):
+        response = self.app.post('/perf-service/api/generic/start', data={"workers": "2", "workerPlacement": "pool"})
+        self.assertEqual(response.status_code, 503)
+        response = self.app.post('/perf-service/api/generic/start', data={"workerPlacement": "cloud"})
+        self.assertEqual(response.status_code, 400)
+        mock_popen.assert_not_called()
+
+        token = {TOKEN_HEADER: "pool-token"}
+        response = self.app.post('/perf-service/api/nodes/register', json={"url": "http://node:5101"}, headers=token)
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/perf-service/api/nodes/unknown-node/heartbeat', json={}, headers=token)
+        self.assertEqual(response.status_code, 404)
+        response = self.app.post('/perf-service/api/nodes/register', json={"node_id": "n", "url": "http://node:5101"})
+        self.assertEqual(response.status_code, 401)
+
+    @patch('app.threading.Thread')
+    @patch('app.os.killpg')
+    def test_stop_test_signals_process_group(self, mock_killpg, mock_thread):
+        import app as main_app_module
+        response = self.app.post('/perf-service/api/test/test-id-stop/stop')
+        self.assertEqual(response.status_code, 404)
+
+        run = ScheduledRun("test-id-stop", "generic", launch=MagicMock(), cpu_cores=1, memory_mb=256)
+        main_app_module.run_scheduler.submit(run)
+        main_app_module.run_scheduler.launch(run)
+        run.process = MagicMock(pid=4321)
+        run.process.poll.return_value = None
+
+        response = self.app.post('/perf-service/api/test/test-id-stop/stop')
+        self.assertEqual(response.status_code, 200)
+        mock_killpg.assert_called_once_with(4321, signal.SIGINT)
+        self.assertEqual(run.state, "stopping")
+        # SIGTERM follow-up in case SIGINT is ignored
+        _, kwargs = mock_thread.call_args
+        self.assertEqual((kwargs["target"], kwargs["args"]), (main_app_module._escalate_stop, ("test-id-stop", 4321)))
+        mock_thread.return_value.start.assert_called_once()
+
+        main_app_module.run_scheduler.finish("test-id-stop", 0)
+        response = self.app.post('/perf-service/api/test/test-id-stop/stop')
+        self.assertEqual(response.status_code, 410)
+
+    @patch('subprocess.Popen')
+    @patch('uuid.uuid4')
+    def test_runs_queue_beyond_budget(self, mock_uuid, mock_popen):
+        import app as main_app_module
+        processes = [MagicMock(pid=100 + index) for index in range(3)]
+        for process in processes:
+            process.done = threading.Event()
+            process.wait.side_effect = process.done.wait
+        mock_popen.side_effect = processes
+        mock_uuid.side_effect = ["run-a", "run-b", "run-c"]
+
+        # Two runs of 3 cores each do not fit in the 4 core budget together
+        responses = [self.app.post('/perf-service/api/generic/start', data={"workers": "1", "cpuCores": "3"})
+                     for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [200, 202, 202])
+        self.assertEqual([response.get_json().get("queue_position") for response in responses], [None, 1, 2])
+        self.assertEqual(mock_popen.call_count, 1)
+
+        status = self.app.get('/perf-service/api/test/run-c/status').get_json()
+        self.assertEqual((status["state"], status["queue_position"]), ("queued", 2))
+        listing = self.app.get('/perf-service/api/tests?state=queued').get_json()
+        self.assertEqual([run["test_id"] for run in listing["runs"]], ["run-b", "run-c"])
+        self.assertEqual(listing["cpu_reserved"], 3)
+
+        # Cancelling a queued run moves the next one up; the first run ending admits it
+        self.assertEqual(self.app.post('/perf-service/api/test/run-b/stop').status_code, 200)
+        self.assertEqual(self.app.get('/perf-service/api/test/run-c/status').get_json()["queue_position"], 1)
+        processes[0].done.set()
+        for _ in range(200):
+            if main_app_module.run_scheduler.get("run-c").state == RUNNING:
+                break
+            time.sleep(0.01)
+        self.assertEqual(main_app_module.run_scheduler.get("run-c").state, RUNNING)
+        self.assertEqual(main_app_module.run_scheduler.get("run-b").cancelled, True)
+        self.assertEqual(mock_popen.call_count, 2)
+        processes[1].done.set()
+
+    @patch('subprocess.Popen')
+    def test_start_test_saturation_options(self, mock_popen):
+        response = self.app.post('/perf-service/api/generic/start', data={"saturationAction": "reboot"})
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/perf-service/api/generic/start', data={"saturationSeconds": "0"})
+        self.assertEqual(response.status_code, 400)
+        mock_popen.assert_not_called()
+
+        mock_popen.return_value.pid = 12345
+        response = self.app.post('/perf-service/api/generic/start', data={
+            "workers": "1", "saturationAction": "add_workers", "saturationSeconds": "15", "maxWorkers": "4"})
+        self.assertEqual(response.status_code, 200)
+        # A master is started so that workers can be added to it
+        self.assertEqual(mock_popen.call_count, 2)
+        (master_cmd,), master_kwargs = mock_popen.call_args_list[0]
+        self.assertIn("--master", master_cmd)
+        self.assertEqual(master_kwargs["env"]["GENERATOR_SATURATION_ACTION"], "add_workers")
+        self.assertEqual(master_kwargs["env"]["GENERATOR_SATURATION_SECONDS"], "15.0")
+        self.assertEqual(master_kwargs["env"]["GENERATOR_MAX_WORKERS"], "4")
+
+    @patch('subprocess.Popen')
+    def test_start_test_connection_options(self, mock_popen):
+        for data in ({"connectionPool": "global"}, {"keepAlive": "sometimes"}, {"connectionsPerUser": "0"},
+                     {"readTimeout": "soon"}):
+            response = self.app.post('/perf-service/api/generic/start', data=data)
+            self.assertEqual(response.status_code, 400, data)
+        mock_popen.assert_not_called()
+
+        mock_popen.return_value.pid = 12345
+        response = self.app.post('/perf-service/api/generic/start', data={
+            "connectionsPerUser": "4", "connectionPool": "Shared", "keepAlive": "false", "connectTimeout": "2.5",
+            "readTimeout": "30", "verifyTls": "true"})
+        self.assertEqual(response.status_code, 200)
+        env = mock_popen.call_args.kwargs["env"]
+        self.assertEqual((env["HTTP_CONNECTIONS_PER_USER"], env["HTTP_CONNECTION_POOL"], env["HTTP_KEEP_ALIVE"]),
+                         ("4", "shared", "false"))
+        self.assertEqual((env["HTTP_CONNECT_TIMEOUT"], env["HTTP_READ_TIMEOUT"], env["HTTP_VERIFY_TLS"]),
+                         ("2.5", "30.0", "true"))
+
+    def test_start_test_invalid_resources(self):
+        response = self.app.post('/perf-service/api/generic/start', data={"cpuCores": "lots"})
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/perf-service/api/generic/start', data={"memoryMb": "-1"})
+        self.assertEqual(response.status_code, 400)
+
     @patch('subprocess.Popen')
     def test_start_test_subprocess_error(self, mock_popen):
         # Simulate a SubprocessError
@@ -123,7 +299,7 @@ class PerfServiceAPITestCase(unittest.TestCase):
         self.assertEqual(json_response["error"], "Test ID not found or results directory does not exist.")
 
     def test_get_live_results_log_file_not_yet_created(self):
-        test_id = "test-id-no-log"
+        test_id = "1f0c6a52-7b3e-4d8a-9c21-0e5f4b6a7d31"
         test_run_dir = os.path.join(self.test_dir, test_id)
         os.makedirs(test_run_dir, exist_ok=True) # Create directory, but no log file
 
@@ -134,7 +310,7 @@ class PerfServiceAPITestCase(unittest.TestCase):
 
     @patch('builtins.open', new_callable=mock_open)
     def test_get_live_results_empty_log_file(self, mock_file_open):
-        test_id = "test-id-empty-log"
+        test_id = "2a9d4e61-3c5b-4f7e-8d10-6b2c9e8f4a52"
         test_run_dir = os.path.join(self.test_dir, test_id)
         os.makedirs(test_run_dir, exist_ok=True)
         # Create the flask_locust_runner.log file, but it's empty
@@ -153,7 +329,7 @@ class PerfServiceAPITestCase(unittest.TestCase):
 
     @patch('builtins.open', new_callable=mock_open)
     def test_get_live_results_success_with_stats(self, mock_file_open):
-        test_id = "test-id-with-stats"
+        test_id = "3b8e5f72-4d6c-4a8f-9e21-7c3d0f9a5b63"
         test_run_dir = os.path.join(self.test_dir, test_id)
         os.makedirs(test_run_dir, exist_ok=True)
         log_path = os.path.join(test_run_dir, "flask_locust_runner.log")
@@ -184,6 +360,141 @@ class PerfServiceAPITestCase(unittest.TestCase):
         self.assertEqual(json_response["user_count"], 50)
         self.assertEqual(json_response["total_requests"], 1000)
 
+    def test_get_live_results_resumes_from_last_event_id(self):
+        test_id = "4c7f6a83-5e7d-4b9a-8f32-8d4e1a0b6c74"
+        test_run_dir = os.path.join(self.test_dir, test_id)
+        os.makedirs(test_run_dir, exist_ok=True)
+        lines = [
+            json.dumps({"event": "summary", "user_count": 1}),
+            json.dumps({"event": "summary", "user_count": 2}),
+            json.dumps({"event": "summary", "state": "stopped"}),
+        ]
+        with open(os.path.join(test_run_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+        response = self.app.get(f'/perf-service/api/results/{test_id}/live')
+        frames = response.data.decode().strip().split("\n\n")
+        self.assertEqual(len(frames), 4)  # Three events plus test_completed
+        first_id = frames[0].split("\n")[0]
+        self.assertEqual(first_id, f"id: {len(lines[0]) + 1}")
+
+        response = self.app.get(f'/perf-service/api/results/{test_id}/live',
+                                headers={"Last-Event-ID": first_id[len("id: "):]})
+        frames = response.data.decode().strip().split("\n\n")
+        self.assertEqual(len(frames), 3)
+        self.assertIn('"user_count": 2', frames[0])
+        self.assertTrue(frames[-1].startswith("event: test_completed"))
+
+    def test_get_live_results_filters_and_projects(self):
+        test_id = "5d6a7b94-6f8e-4cab-9a43-9e5f2b1c7d85"
+        test_run_dir = os.path.join(self.test_dir, test_id)
+        os.makedirs(test_run_dir, exist_ok=True)
+        lines = [
+            json.dumps({"event": "request_stats", "name": "/a", "count": 10}),
+            json.dumps({"event": "summary", "user_count": 3, "rps": 9.5}),
+            json.dumps({"event": "summary", "user_count": 3, "state": "stopped"}),
+        ]
+        with open(os.path.join(test_run_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+        response = self.app.get(f'/perf-service/api/results/{test_id}/live?events=summary&fields=rps&maxFps=2')
+        frames = response.data.decode().strip().split("\n\n")
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(json.loads(frames[0].split("data: ")[1]), {"event": "summary", "rps": 9.5})
+        self.assertTrue(frames[-1].startswith("event: test_completed"))
+
+        response = self.app.get(f'/perf-service/api/results/{test_id}/live?maxFps=fast')
+        self.assertIn("error_invalid_query", response.data.decode())
+
+    def test_get_timeseries(self):
+        test_id = "0b5c3f0e-2d1a-4c4e-9a57-3f6a2f1c9e11"
+        test_run_dir = os.path.join(self.test_dir, test_id)
+        os.makedirs(test_run_dir, exist_ok=True)
+        with open(os.path.join(test_run_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            for i in range(10):
+                f.write(json.dumps({"event": "request_stats", "request_type": "GET", "name": "/items",
+                                    "p99": float(i), "timestamp": 1000.0 + i}) + "\n")
+
+        # The store is built on first query for runs that finished without being finalized
+        response = self.app.get(f'/perf-service/api/results/{test_id}/timeseries?metric=p99&name=/items&from=1002&step=4&agg=max')
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode())
+        self.assertEqual(json_response["test_id"], test_id)
+        self.assertEqual(json_response["points"], [[1002.0, 5.0], [1006.0, 9.0]])
+        self.assertTrue(os.path.exists(os.path.join(test_run_dir, "metrics.colstore")))
+
+        self.assertEqual(self.app.get(f'/perf-service/api/results/{test_id}/timeseries').status_code, 400)
+        self.assertEqual(self.app.get(f'/perf-service/api/results/{test_id}/timeseries?metric=p99&step=x').status_code, 400)
+        self.assertEqual(self.app.get(f'/perf-service/api/results/{test_id}/timeseries?metric=nope').status_code, 404)
+        self.assertEqual(self.app.get('/perf-service/api/results/missing/timeseries?metric=p99').status_code, 404)
+        # Not a run ID: nothing outside the results root is read or written
+        with open(os.path.join(self.test_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            f.write(json.dumps({"event": "summary", "p99": 1.0, "timestamp": 1000.0}) + "\n")
+        for crafted in ("..", "%2E%2E", "."):
+            self.assertEqual(self.app.get(f'/perf-service/api/results/{crafted}/timeseries?metric=p99').status_code, 404)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "metrics.colstore")))
+
+    def test_timeseries_query_waits_for_finalization(self):
+        import app as main_app_module
+        test_id = "6e7f8a90-1b2c-4d3e-8f4a-5b6c7d8e9f01"
+        test_run_dir = os.path.join(self.test_dir, test_id)
+        os.makedirs(test_run_dir)
+        with open(os.path.join(test_run_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            f.write(json.dumps({"event": "summary", "p99": 1.0, "timestamp": 1000.0}) + "\n")
+        building = threading.Event()
+        builds = []
+        build_results_store = main_app_module.build_results_store
+
+        def slow_build(*args):
+            builds.append(args)
+            building.set()
+            time.sleep(0.2)  # The query arrives while the run's finalize thread is still building
+            return build_results_store(*args)
+
+        with patch.object(main_app_module, "build_results_store", side_effect=slow_build):
+            finalize = threading.Thread(target=main_app_module._finalize_test_results, args=(test_id, test_run_dir))
+            finalize.start()
+            building.wait(2)
+            response = self.app.get(f'/perf-service/api/results/{test_id}/timeseries?metric=p99')
+            finalize.join()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(sorted(os.listdir(test_run_dir)), ["flask_locust_runner_metrics.log", "metrics.colstore"])
+
+    def test_get_live_results_rejects_crafted_test_ids(self):
+        with open(os.path.join(self.test_dir, "flask_locust_runner_metrics.log"), 'w') as f:
+            f.write(json.dumps({"event": "summary", "timestamp": 1000.0}) + "\n")
+        for crafted in ("..", "%2E%2E", ".", "not-a-run"):
+            response = self.app.get(f'/perf-service/api/results/{crafted}/live')
+            self.assertEqual(response.status_code, 404, crafted)
+            self.assertEqual(response.mimetype, "application/json")
+
+    def test_get_test_file_serves_only_shared_files(self):
+        import app as main_app_module
+        test_id = "5d2e7a64-8c1b-4f3a-b0e9-6c7d8e9f0a12"
+        test_run_dir = os.path.join(self.test_dir, test_id)
+        os.makedirs(test_run_dir)
+        for name in ("data.csv", "env_vars_upload.json"):
+            with open(os.path.join(test_run_dir, name), 'w') as f:
+                f.write(name)
+        with open(os.path.join(self.test_dir, "outside.txt"), 'w') as f:
+            f.write("outside")
+        run = ScheduledRun(test_id, "generic", launch=MagicMock(), cpu_cores=1, memory_mb=256)
+        run.shared_files = frozenset({"data.csv"})
+        main_app_module.run_scheduler.submit(run)
+
+        # Only agents holding the worker pool's token may download
+        self.assertEqual(self.app.get(f'/perf-service/api/test/{test_id}/files/data.csv').status_code, 401)
+        token = {TOKEN_HEADER: "pool-token"}
+        response = self.app.get(f'/perf-service/api/test/{test_id}/files/data.csv', headers=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"data.csv")
+        response.close()
+        for path in (f"{test_id}/files/env_vars_upload.json", f"{test_id}/files/../outside.txt",
+                     "%2E%2E/files/outside.txt", "unknown-run/files/data.csv"):
+            self.assertEqual(self.app.get(f'/perf-service/api/test/{path}', headers=token).status_code, 404, path)
+        main_app_module.run_scheduler.finish(test_id, 0)
+
     # Test all start endpoints to ensure they call _start_test_run correctly
     @patch('app._start_test_run') # Patch the common function
     def test_all_start_endpoints(self, mock_start_test_run):
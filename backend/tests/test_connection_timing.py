@@ -0,0 +1,120 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import gevent
+from gevent.pywsgi import WSGIServer
+from locust.contrib.fasthttp import insecure_ssl_context_factory
+
+import connection_timing
+from connection_timing import (PHASE_BODY, PHASE_CONNECT, PHASE_DNS, PHASE_POOL, PHASE_TLS, PHASE_TTFB,
+                               TimedHTTPClientPool, begin_request, end_request)
+
+
+SLOW_RESPONSE_SECONDS = 0.2
+
+
+def hello_app(environ, start_response):
+    if environ["PATH_INFO"] == "/slow":
+        gevent.sleep(SLOW_RESPONSE_SECONDS)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"hello"]
+
+
+class TimedHTTPClientPoolTestCase(unittest.TestCase):
+    scheme = "http"
+
+    def setUp(self):
+        self.server = WSGIServer(("127.0.0.1", 0), hello_app, log=None, **self.server_args())
+        self.server.start()
+        self.url = f"{self.scheme}://localhost:{self.server.server_port}/"
+        # Same TLS settings as GenericUser's pools (gevent-aware, no certificate checks)
+        self.pool = TimedHTTPClientPool(concurrency=1, insecure=True, ssl_context_factory=insecure_ssl_context_factory)
+
+    def server_args(self):
+        return {}
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def _timed_get(self, headers=None, path="/"):
+        begin_request()
+        client = self.pool.get_client(self.url)
+        response = client.get(path, headers=headers or {})
+        self.assertEqual(response.read(), b"hello")
+        response.release()
+        return end_request()
+
+    def test_connect_reported_once_per_kept_alive_connection(self):
+        timings = [self._timed_get() for _ in range(3)]
+        self.assertEqual([timing.connections for timing in timings], [1, 0, 0])
+        first = timings[0].phases_ms(total=timings[0].headers + 0.005)
+        for phase in (PHASE_DNS, PHASE_CONNECT, PHASE_TTFB):
+            self.assertGreater(first[phase], 0, phase)
+        self.assertAlmostEqual(first[PHASE_BODY], 5.0)
+        self.assertAlmostEqual(first[PHASE_POOL] + first[PHASE_DNS] + first[PHASE_CONNECT] + first.get(PHASE_TLS, 0)
+                               + first[PHASE_TTFB], timings[0].headers * 1000)
+        self.assertEqual(sorted(timings[1].phases_ms()), [PHASE_POOL, PHASE_TTFB])
+        self.assertIs(self.pool.get_client(self.url), self.pool.get_client(self.url))
+
+    def test_waiting_for_a_pooled_connection_is_not_ttfb(self):
+        self._timed_get()  # Opens the pool's one connection
+        first, second = gevent.joinall([gevent.spawn(self._timed_get, path="/slow") for _ in range(2)])
+        served, waited = sorted((first.value.phases_ms(), second.value.phases_ms()), key=lambda p: p[PHASE_POOL])
+        slow_ms = SLOW_RESPONSE_SECONDS * 1000
+        self.assertLess(served[PHASE_POOL], slow_ms / 4)
+        # The second request queued behind the first one, then was served just as fast
+        self.assertGreater(waited[PHASE_POOL], slow_ms * 0.9)
+        for phases in (waited, served):
+            self.assertGreater(phases[PHASE_TTFB], slow_ms * 0.9)
+            self.assertLess(phases[PHASE_TTFB], slow_ms * 1.5)
+
+    def test_connection_close_connects_every_request(self):
+        timings = [self._timed_get({"Connection": "close"}) for _ in range(3)]
+        self.assertEqual([timing.connections for timing in timings], [1, 1, 1])
+
+    def test_timing_off_without_pool_hooks(self):
+        with patch.object(connection_timing, "TIMING_SUPPORTED", False), \
+                patch.object(connection_timing, "_untimed_warned", False), \
+                self.assertLogs("connection_timing", "WARNING") as logs:
+            timing = self._timed_get()
+            self._timed_get()
+        # Requests still go out, only without phases, and the warning is logged once
+        self.assertEqual(timing.phases_ms(), {})
+        self.assertEqual(len(logs.records), 1)
+
+    def test_untimed_requests_are_not_recorded(self):
+        response = self.pool.get_client(self.url).get("/")
+        response.release()
+        self.assertIsNone(end_request())
+
+
+@unittest.skipUnless(shutil.which("openssl"), "needs the openssl command to create a certificate")
+class TimedHTTPSClientPoolTestCase(TimedHTTPClientPoolTestCase):
+    scheme = "https"
+
+    def server_args(self):
+        self.cert_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cert_dir)
+        keyfile, certfile = os.path.join(self.cert_dir, "key.pem"), os.path.join(self.cert_dir, "cert.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                        "-nodes", "-subj", "/CN=localhost", "-days", "1", "-keyout", keyfile, "-out", certfile],
+                       check=True, capture_output=True)
+        return {"keyfile": keyfile, "certfile": certfile}
+
+    def test_tls_handshake_is_timed(self):
+        timing = self._timed_get()
+        phases = timing.phases_ms()
+        self.assertGreater(phases[PHASE_TLS], 0)
+        self.assertAlmostEqual(phases[PHASE_DNS] + phases[PHASE_CONNECT] + phases[PHASE_TLS], timing.established * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
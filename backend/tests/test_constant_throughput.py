@@ -0,0 +1,65 @@
+import os
+import time
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import gevent
+
+from constant_throughput_plugin import ConstantThroughput
+
+
+class ConstantThroughputTestCase(unittest.TestCase):
+    def _run_users(self, wait_time, num_users, duration, response_time=0.0):
+        permits = []
+        deadline = time.monotonic() + duration
+
+        def user():
+            while time.monotonic() < deadline:
+                self.assertEqual(wait_time(), 0)
+                permits.append(time.monotonic())
+                gevent.sleep(response_time)  # Simulated request
+
+        gevent.joinall([gevent.spawn(user) for _ in range(num_users)])
+        # Users blocked on a permit when the deadline passes still get it afterwards
+        return [permit for permit in permits if permit <= deadline]
+
+    def test_global_rate_independent_of_user_count(self):
+        for num_users in (5, 50):
+            with self.subTest(num_users=num_users):
+                permits = self._run_users(ConstantThroughput(100), num_users, duration=1.0)
+                self.assertAlmostEqual(len(permits), 100, delta=10)
+
+    def test_slow_responses_do_not_reduce_rate(self):
+        # Per-user interval is 0.2s, responses take 0.15s: enough users keep the global rate
+        permits = self._run_users(ConstantThroughput(100), 20, duration=1.0, response_time=0.15)
+        self.assertAlmostEqual(len(permits), 100, delta=10)
+
+    def test_rate_split_across_workers(self):
+        wait_time = ConstantThroughput(200, worker_count=4)
+        self.assertEqual(wait_time.worker_target_qps, 50)
+        permits = self._run_users(wait_time, 10, duration=1.0)
+        self.assertAlmostEqual(len(permits), 50, delta=6)
+
+    def test_snapshot_reports_achieved_rate_and_lag(self):
+        wait_time = ConstantThroughput(100)
+        wait_time.snapshot()
+        self._run_users(wait_time, 10, duration=0.5)
+        stats = wait_time.snapshot()
+        self.assertEqual(stats["target_qps"], 100)
+        self.assertAlmostEqual(stats["achieved_qps"], 100, delta=15)
+        # Half a second's worth, plus the permits the 10 users were waiting for at the deadline
+        self.assertAlmostEqual(stats["permits"], 55, delta=8)
+        self.assertGreaterEqual(stats["schedule_lag_max_ms"], stats["schedule_lag_avg_ms"])
+
+    def test_zero_rate_never_waits(self):
+        wait_time = ConstantThroughput(0)
+        start = time.monotonic()
+        for _ in range(100):
+            wait_time()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from data_feeder import DataFeeder, MappedRowSource, RowShard, shard_rows, should_stream_data_file
+
+
+class DataFeederTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rows = [{"id": str(i)} for i in range(10)]
+
+    def _ids(self, feeder, count, user_index=0):
+        rows = [feeder.next_row(user_index) for _ in range(count)]
+        return [row["id"] if row else None for row in rows]
+
+    def test_sequential_wraps_when_reusing(self):
+        feeder = DataFeeder(self.rows, mode="sequential", reuse=True)
+        self.assertEqual(self._ids(feeder, 12), [str(i) for i in range(10)] + ["0", "1"])
+        # The shared rows are never mutated
+        self.assertEqual(len(self.rows), 10)
+
+    def test_sequential_cursor_is_shared_across_users(self):
+        feeder = DataFeeder(self.rows, mode="sequential")
+        self.assertEqual(feeder.next_row(0)["id"], "0")
+        self.assertEqual(feeder.next_row(1)["id"], "1")
+
+    def test_sequential_without_reuse_exhausts(self):
+        feeder = DataFeeder(self.rows, mode="sequential", reuse=False)
+        self.assertEqual(self._ids(feeder, 11)[-1], None)
+
+    def test_unique_never_reuses(self):
+        feeder = DataFeeder(self.rows, mode="unique", reuse=True)
+        ids = self._ids(feeder, 15)
+        self.assertEqual(ids[:10], [str(i) for i in range(10)])
+        self.assertEqual(ids[10:], [None] * 5)
+
+    def test_partitioned_users_get_disjoint_blocks(self):
+        feeder = DataFeeder(self.rows, mode="partitioned", partitions=3)
+        self.assertEqual(self._ids(feeder, 5, user_index=0), ["0", "1", "2", "3", "0"])
+        self.assertEqual(self._ids(feeder, 4, user_index=1), ["4", "5", "6", "4"])
+        self.assertEqual(self._ids(feeder, 4, user_index=5), ["7", "8", "9", "7"])
+
+    def test_partitioned_without_reuse_exhausts_per_block(self):
+        feeder = DataFeeder(self.rows, mode="partitioned", reuse=False, partitions=2)
+        self.assertEqual(self._ids(feeder, 6, user_index=1), ["5", "6", "7", "8", "9", None])
+        self.assertEqual(feeder.next_row(0)["id"], "0")
+
+    def test_worker_shards_cover_rows_once(self):
+        shards = [shard_rows(self.rows, index, 3) for index in range(3)]
+        self.assertEqual([len(shard) for shard in shards], [4, 3, 3])
+        ids = [self._ids(DataFeeder(shard, mode="unique"), 5) for shard in shards]
+        self.assertEqual(ids, [["0", "1", "2", "3", None], ["4", "5", "6", None, None], ["7", "8", "9", None, None]])
+        self.assertIs(shard_rows(self.rows, 0, 1), self.rows)
+        self.assertEqual(shards[1][-1], {"id": "6"})
+        with self.assertRaises(IndexError):
+            shards[1][3]
+        self.assertEqual(len(RowShard(self.rows, 10, 0)), 0)
+
+    def test_random_stays_in_range(self):
+        feeder = DataFeeder(self.rows, mode="random", reuse=False)
+        ids = set(self._ids(feeder, 200))
+        self.assertTrue(ids <= {str(i) for i in range(10)})
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            DataFeeder(self.rows, mode="round-robin")
+
+    def test_empty_rows(self):
+        self.assertIsNone(DataFeeder([]).next_row())
+
+
+class MappedRowSourceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, filename, content):
+        path = os.path.join(self.test_dir, filename)
+        with open(path, "w", newline="") as f:
+            f.write(content)
+        return path
+
+    def test_csv_rows_decoded_on_demand(self):
+        path = self._write("data.csv", 'id,name\r\n1,alice\r\n\r\n2,"bob, jr"\r\n3,carol')
+        source = MappedRowSource(path)
+        self.assertEqual(len(source), 3)
+        self.assertEqual(source[0], {"id": "1", "name": "alice"})
+        self.assertEqual(source[1], {"id": "2", "name": "bob, jr"})
+        self.assertEqual(source[-1], {"id": "3", "name": "carol"})
+        with self.assertRaises(IndexError):
+            source[3]
+        source.close()
+
+    def test_ndjson_with_feeder_wraps_around(self):
+        path = self._write("data.ndjson", "\n".join(json.dumps({"id": i}) for i in range(3)) + "\n")
+        source = MappedRowSource(path)
+        feeder = DataFeeder(source, mode="sequential", reuse=True)
+        self.assertEqual([feeder.next_row()["id"] for _ in range(5)], [0, 1, 2, 0, 1])
+        source.close()
+
+    def test_line_index_is_cached_in_the_run_dir(self):
+        path = self._write("data.jsonl", '{"id": 1}\n{"id": 2}\n')
+        run_dir = os.path.join(self.test_dir, "run")
+        MappedRowSource(path, index_dir=run_dir).close()
+        self.assertEqual(os.listdir(run_dir), ["data.jsonl.idx"])
+        self.assertFalse(os.path.exists(path + ".idx"))
+        with patch.object(MappedRowSource, "_build_index") as build_index:
+            source = MappedRowSource(path, index_dir=run_dir)
+        build_index.assert_not_called()
+        self.assertEqual(source[1], {"id": 2})
+        source.close()
+
+    def test_index_spans_chunks(self):
+        lines = ['{"id": %d}' % i for i in range(50)]
+        path = self._write("data.ndjson", "\r\n".join(lines[:25]) + "\r\n\r\n\n" + "\n".join(lines[25:]))
+        with patch("data_feeder.INDEX_CHUNK_BYTES", 7):
+            source = MappedRowSource(path)
+        self.assertEqual([source[i]["id"] for i in range(len(source))], list(range(50)))
+        source.close()
+
+    def test_empty_file(self):
+        source = MappedRowSource(self._write("empty.csv", ""))
+        self.assertEqual(len(source), 0)
+        self.assertIsNone(DataFeeder(source).next_row())
+        source.close()
+
+    def test_should_stream_data_file(self):
+        small_csv = self._write("small.csv", "id\n1\n")
+        self.assertTrue(should_stream_data_file("rows.ndjson"))
+        self.assertFalse(should_stream_data_file("rows.json"))
+        self.assertFalse(should_stream_data_file(small_csv))
+        with patch.dict(os.environ, {"DATA_STREAMING": "true"}):
+            self.assertTrue(should_stream_data_file(small_csv))
+        with patch.dict(os.environ, {"DATA_STREAMING_THRESHOLD_BYTES": "1"}):
+            self.assertTrue(should_stream_data_file(small_csv))
+
+
+if __name__ == '__main__':
+    unittest.main()
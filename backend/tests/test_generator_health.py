@@ -0,0 +1,95 @@
+import os
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import gevent
+
+from generator_health import (LoopLagProbe, GeneratorHealthMonitor, SaturationGuard, ACTION_ABORT,
+                              ACTION_ADD_WORKERS, ACTION_NONE)
+
+
+class GeneratorHealthMonitorTestCase(unittest.TestCase):
+    def test_probe_measures_blocked_loop(self):
+        probe = LoopLagProbe(interval=0.01)
+        probe.start()
+        gevent.sleep(0.05)
+        blocked_until = time.perf_counter() + 0.2
+        while time.perf_counter() < blocked_until:  # Blocks the loop, as a CPU-bound greenlet would
+            pass
+        gevent.sleep(0.05)
+        probe.stop()
+        stats = probe.snapshot()
+        self.assertGreaterEqual(stats["loop_lag_max_ms"], 150)
+        self.assertGreater(stats["loop_lag_avg_ms"], 0)
+        self.assertEqual(probe.snapshot(), {"loop_lag_avg_ms": 0.0, "loop_lag_max_ms": 0.0})
+        # The histogram keeps its own window
+        histogram = probe.take_histogram()
+        self.assertGreaterEqual(histogram.max, 150)
+        self.assertEqual(probe.take_histogram().count, 0)
+
+    def test_sample_flags_loop_lag_as_saturation(self):
+        monitor = GeneratorHealthMonitor(cpu_threshold=101, lag_threshold_ms=20)
+        monitor.probe.record(0.001)
+        sample = monitor.sample()
+        self.assertEqual(sample["processes"], 1)
+        self.assertGreater(sample["rss_mb"], 0)
+        self.assertFalse(sample["saturated"])
+        monitor.probe.record(0.1)
+        self.assertTrue(monitor.sample()["saturated"])
+
+
+class SaturationGuardTestCase(unittest.TestCase):
+    def test_marks_run_after_continuous_saturation(self):
+        guard = SaturationGuard(threshold_seconds=10)
+        self.assertIsNone(guard.observe("w1", {"saturated": True}, now=100))
+        sample = {"saturated": True, "cpu_percent": 99.0}
+        self.assertIsNone(guard.observe("w1", sample, now=105))
+        self.assertEqual(sample["saturated_seconds"], 5)
+        # A healthy sample restarts the clock
+        self.assertIsNone(guard.observe("w1", {"saturated": False}, now=106))
+        self.assertIsNone(guard.observe("w1", {"saturated": True}, now=107))
+        self.assertFalse(guard.generator_bound)
+
+        event = guard.observe("w1", {"saturated": True, "cpu_percent": 99.0}, now=117)
+        self.assertEqual((event["process"], event["saturated_seconds"], event["action"]), ("w1", 10, ACTION_NONE))
+        self.assertTrue(guard.generator_bound)
+
+    def test_abort_runs_once(self):
+        on_abort = MagicMock()
+        guard = SaturationGuard(threshold_seconds=1, action=ACTION_ABORT, on_abort=on_abort)
+        for now in range(6):
+            guard.observe("master", {"saturated": True}, now=now)
+        on_abort.assert_called_once_with()
+
+    def test_add_workers_up_to_maximum(self):
+        workers = [2]
+
+        def add_worker():
+            workers[0] += 1
+            return True
+
+        guard = SaturationGuard(threshold_seconds=1, action=ACTION_ADD_WORKERS, add_worker=add_worker,
+                                worker_count=lambda: workers[0], max_workers=3)
+        guard.observe("w1", {"saturated": True}, now=0)
+        self.assertEqual(guard.observe("w1", {"saturated": True}, now=1)["action"], ACTION_ADD_WORKERS)
+        self.assertEqual(workers[0], 3)
+        # Clocks restart after acting, and the maximum is reached
+        self.assertIsNone(guard.observe("w2", {"saturated": True}, now=1.5))
+        event = guard.observe("w2", {"saturated": True}, now=2.5)
+        self.assertEqual(event["action"], ACTION_NONE)
+        self.assertIn("maximum", event["reason"])
+
+        standalone = SaturationGuard(threshold_seconds=0, action=ACTION_ADD_WORKERS)
+        self.assertIn("distributed", standalone.observe("standalone", {"saturated": True}, now=0)["reason"])
+
+    def test_rejects_unknown_action(self):
+        with self.assertRaises(ValueError):
+            SaturationGuard(action="reboot")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+import sys
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'locust_scripts'))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+
+class GenericUserTestCase(unittest.TestCase):
+    """Base class that imports locust_generic_test against a throwaway config and results dir."""
+    env_vars = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls._original_cwd = os.getcwd()
+        # The module creates its metrics logger relative to the cwd at import time
+        os.chdir(cls.test_dir)
+        cls._env_patch = patch.dict(os.environ, {"TEST_ID": "generic-user-test", **cls.prepare_env(cls.test_dir)})
+        cls._env_patch.start()
+
+        import locust_generic_test
+        from locust.env import Environment
+        cls.module = locust_generic_test
+        cls.GenericUser = locust_generic_test.GenericUser
+        # Normally copied from the environment by the runner when it spawns users
+        cls.GenericUser.host = "http://localhost"
+        cls.environment = Environment(user_classes=[cls.GenericUser], host="http://localhost")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._env_patch.stop()
+        os.chdir(cls._original_cwd)
+        shutil.rmtree(cls.test_dir)
+
+    @classmethod
+    def prepare_env(cls, test_dir):
+        return dict(cls.env_vars)
+
+    def setUp(self):
+        self.GenericUser._config_loaded = False
+        self.GenericUser.data_feeder = None
+        self.GenericUser.data_rows = []
+
+    def init_environment(self):
+        self.environment.events.init.fire(environment=self.environment, runner=None, web_ui=None)
+
+    def serve(self, app):
+        """Serves a WSGI app on localhost for the rest of the test and points GenericUser at it."""
+        from gevent.pywsgi import WSGIServer
+        server = WSGIServer(("127.0.0.1", 0), app, log=None)
+        server.start()
+        self.addCleanup(server.stop)
+        self.addCleanup(setattr, self.GenericUser, "host", self.GenericUser.host)
+        self.GenericUser.host = f"http://127.0.0.1:{server.server_port}"
+        return self.GenericUser.host
+
+
+class GenericUserConfigLoadingTestCase(GenericUserTestCase):
+    NUM_ROWS = 20_000
+
+    @classmethod
+    def prepare_env(cls, test_dir):
+        data_file = os.path.join(test_dir, "data.csv")
+        with open(data_file, "w") as f:
+            f.write("id,name,email\n")
+            for i in range(cls.NUM_ROWS):
+                f.write(f"{i},user-{i},user-{i}@example.com\n")
+        payload_file = os.path.join(test_dir, "payload.json")
+        with open(payload_file, "w") as f:
+            f.write('{"id": "${id}", "name": "${name}"}')
+        return {"DATA_FILE": data_file, "PAYLOAD_TEMPLATE": payload_file, "METHOD": "POST"}
+
+    def test_data_loaded_once_per_process(self):
+        with patch.object(self.GenericUser, "_load_test_config", wraps=self.GenericUser._load_test_config) as load:
+            self.init_environment()
+            users = [self.GenericUser(self.environment) for _ in range(50)]
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(len(self.GenericUser.data_rows), self.NUM_ROWS)
+        self.assertTrue(all(user.data_feeder is self.GenericUser.data_feeder for user in users))
+
+    def test_memory_flat_as_user_count_grows(self):
+        self.init_environment()
+        tracemalloc.start()
+        try:
+            self.GenericUser(self.environment)
+            baseline, _ = tracemalloc.get_traced_memory()
+            users = [self.GenericUser(self.environment) for _ in range(200)]
+            grown, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Parsing the data file once costs several MB; 200 users must not add even one copy of it
+        tracemalloc.start()
+        try:
+            self.GenericUser._load_test_config(self.environment)
+            data_size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(users), 200)
+        self.assertLess(grown - baseline, data_size)
+
+
+class GenericUserConnectionSettingsTestCase(GenericUserTestCase):
+    env_vars = {"HTTP_CONNECTIONS_PER_USER": "3", "HTTP_KEEP_ALIVE": "false", "HTTP_READ_TIMEOUT": "5"}
+    SETTINGS = ("headers", "concurrency", "network_timeout", "client_pool", "connection_pool_mode", "keep_alive")
+
+    def setUp(self):
+        super().setUp()
+        self._saved = {name: getattr(self.GenericUser, name) for name in self.SETTINGS}
+
+    def tearDown(self):
+        for name, value in self._saved.items():
+            setattr(self.GenericUser, name, value)
+
+    def test_per_user_pools(self):
+        self.init_environment()
+        users = [self.GenericUser(self.environment) for _ in range(2)]
+        self.assertEqual((self.GenericUser.concurrency, self.GenericUser.network_timeout), (3, 5.0))
+        self.assertEqual(self.GenericUser.headers["Connection"], "close")
+        pools = [user.client.client.clientpool for user in users]
+        self.assertIsNot(pools[0], pools[1])
+        self.assertEqual(pools[0].client_args["concurrency"], 3)
+
+    def test_shared_pool(self):
+        with patch.dict(os.environ, {"HTTP_CONNECTION_POOL": "shared"}):
+            self.init_environment()
+            users = [self.GenericUser(self.environment) for _ in range(2)]
+        self.assertIs(users[0].client.client.clientpool, users[1].client.client.clientpool)
+        self.assertIs(users[0].client.client.clientpool, self.GenericUser.client_pool)
+
+
+class GenericUserDataShardingTestCase(GenericUserTestCase):
+    @classmethod
+    def prepare_env(cls, test_dir):
+        data_file = os.path.join(test_dir, "data.csv")
+        with open(data_file, "w") as f:
+            f.write("id\n" + "".join(f"{i}\n" for i in range(10)))
+        return {"DATA_FILE": data_file, "DATA_FEED_MODE": "unique", "LOCUST_ROLE": "worker",
+                "LOCUST_WORKER_COUNT": "2"}
+
+    def _worker_ids(self, index):
+        with patch.dict(os.environ, {"LOCUST_WORKER_INDEX": str(index)}):
+            self.GenericUser._config_loaded = False
+            self.GenericUser._load_test_config(None)
+        feeder = self.GenericUser.data_feeder
+        return [row["id"] for row in iter(lambda: feeder.next_row(0), None)]
+
+    def test_workers_feed_disjoint_rows(self):
+        self.assertEqual(self._worker_ids(0), ["0", "1", "2", "3", "4"])
+        self.assertEqual(self._worker_ids(1), ["5", "6", "7", "8", "9"])
+        # Added later (saturation guard): every unique row already belongs to another worker
+        self.assertEqual(self._worker_ids(2), [])
+
+
+class GenericUserThroughputTestCase(GenericUserTestCase):
+    env_vars = {"METHOD": "GET"}
+
+    def setUp(self):
+        super().setUp()
+        self.received = []
+        for name, value in (("GLOBAL_TARGET_QPS", 20), ("OPEN_WORKLOAD", False)):
+            patcher = patch.object(self.module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, self.GenericUser, "wait_time", self.GenericUser.wait_time)
+        self.GenericUser.wait_time = None
+
+    def _app(self, environ, start_response):
+        self.received.append(time.monotonic())
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    def test_spawned_users_take_a_permit_before_their_first_request(self):
+        import gevent
+        from locust.env import Environment
+        host = self.serve(self._app)
+        runner = Environment(user_classes=[self.GenericUser], host=host).create_local_runner()
+        start = time.monotonic()
+        # 50 users spawned at once against 20 QPS: without a permit up front, 50 requests go out at once
+        runner.start(50, spawn_rate=1000)
+        gevent.sleep(1.0)
+        runner.quit()
+        self.assertAlmostEqual(len([sent for sent in self.received if sent - start < 1.0]), 20, delta=3)
+
+
+class GenericUserResponseLengthTestCase(GenericUserTestCase):
+    env_vars = {"METHOD": "GET"}
+    BODY = json.dumps({"ok": True, "padding": "x" * 5000}).encode()
+
+    def setUp(self):
+        super().setUp()
+        for name in ("json_path_plan", "response_plan"):
+            self.addCleanup(setattr, self.GenericUser, name, getattr(self.GenericUser, name))
+        # Loaded before the test replaces the plans, so creating a user does not reset them
+        self.GenericUser._load_test_config(None)
+
+        def app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "application/json"), ("Content-Encoding", "gzip")])
+            return [gzip.compress(self.BODY)]
+
+        self.serve(app)
+        self.lengths = []
+        self.environment.events.request.add_listener(
+            lambda request_type, response_length, exception=None, **kwargs: self.lengths.append(
+                (request_type, response_length, exception)))
+
+    def test_compressed_body_counted_decoded_on_both_paths(self):
+        from response_plan import JsonPathPlan, ResponsePlan
+        self.assertLess(len(gzip.compress(self.BODY)), 1000)
+        for json_path_plan, max_bytes in ((JsonPathPlan({"$.ok": True}), None), (JsonPathPlan(), None),
+                                          (JsonPathPlan({"$.ok": True}), 1000), (JsonPathPlan(), 1000)):
+            with self.subTest(decode=bool(json_path_plan), max_bytes=max_bytes):
+                self.GenericUser.json_path_plan = json_path_plan
+                self.GenericUser.response_plan = ResponsePlan(json_path_plan, max_bytes=max_bytes)
+                self.lengths.clear()
+                self.GenericUser(self.environment)._send_request()
+                self.assertEqual(len(self.lengths), 1)
+                _, length, exception = self.lengths[0]
+                if max_bytes is None:
+                    self.assertEqual(length, len(self.BODY))
+                    self.assertIsNone(exception)
+                else:
+                    # Under the limit as sent, over it decoded: fails on both paths alike
+                    self.assertGreater(length, max_bytes)
+                    self.assertIsNotNone(exception)
+
+
+class WorkerSummaryCombineTestCase(GenericUserTestCase):
+    def test_combines_hot_path_and_loop_lag(self):
+        from metrics_aggregator import LatencyHistogram
+        from hot_path import loop_lag_stats
+
+        snapshots = []
+        for lags, own_avg in (([0.1] * 99 + [5.0], 0.2), ([50.0] * 100, 0.6)):
+            histogram = LatencyHistogram()
+            for lag in lags:
+                histogram.record(lag)
+            snapshot = {"hot_path_requests": 100, "hot_path_own_ms": own_avg * 100, "hot_path_own_avg_ms": own_avg,
+                        "schedule_lag_avg_ms": 1.0, "user_greenlets": 3}
+            snapshot.update(loop_lag_stats(histogram))
+            snapshots.append(snapshot)
+
+        combined = self.module._combine_worker_snapshots(snapshots)
+        self.assertEqual((combined["hot_path_requests"], combined["user_greenlets"]), (200, 6))
+        self.assertAlmostEqual(combined["hot_path_own_ms"], 80)
+        self.assertAlmostEqual(combined["hot_path_own_avg_ms"], 0.4)
+        self.assertAlmostEqual(combined["schedule_lag_avg_ms"], 1.0)
+        # Percentiles of the merged histogram, not sums of the workers' percentiles
+        self.assertEqual(combined["loop_lag_samples"], 200)
+        self.assertAlmostEqual(combined["loop_lag_p50_ms"], 5.0, delta=0.1)
+        self.assertAlmostEqual(combined["loop_lag_p99_ms"], 50.0, delta=0.5)
+
+    def test_averages_weighted_by_each_workers_count(self):
+        combined = self.module._combine_worker_snapshots([
+            {"hot_path_requests": 10_000, "hot_path_own_avg_ms": 1.0, "permits": 10_000, "schedule_lag_avg_ms": 2.0},
+            {"hot_path_requests": 10, "hot_path_own_avg_ms": 100.0, "permits": 10, "schedule_lag_avg_ms": 500.0},
+            # No scheduler fields (e.g. a worker added by the saturation guard before its first permit)
+            {"hot_path_requests": 0, "hot_path_own_avg_ms": 0.0},
+        ])
+        self.assertAlmostEqual(combined["hot_path_own_avg_ms"], (10_000 * 1.0 + 10 * 100.0) / 10_010)
+        self.assertAlmostEqual(combined["schedule_lag_avg_ms"], (10_000 * 2.0 + 10 * 500.0) / 10_010)
+        self.assertEqual((combined["hot_path_requests"], combined["permits"]), (10_010, 10_010))
+
+
+if __name__ == '__main__':
+    unittest.main()
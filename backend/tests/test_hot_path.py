@@ -0,0 +1,62 @@
+import os
+import time
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from hot_path import HotPathTimer, loop_lag_stats, greenlet_counts, PHASE_NETWORK, PHASE_RESPONSE, PHASE_LOGGING
+from metrics_aggregator import LatencyHistogram
+
+
+def _busy(seconds):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+class HotPathTimerTestCase(unittest.TestCase):
+    def test_nested_phases_are_counted_once(self):
+        timer = HotPathTimer()
+        timer.add(PHASE_NETWORK, 0.040)
+        mark = timer.mark()
+        _busy(0.02)
+        # e.g. the request event fired for a JSONPath metric during response handling
+        inner = timer.mark()
+        _busy(0.02)
+        timer.add_since(PHASE_LOGGING, inner)
+        timer.add_since(PHASE_RESPONSE, mark)
+        timer.record_request()
+        timer.record_request()
+
+        stats = timer.snapshot()
+        self.assertEqual(stats["hot_path_requests"], 2)
+        self.assertAlmostEqual(stats["hot_path_response_ms"], 20, delta=8)
+        self.assertAlmostEqual(stats["hot_path_logging_ms"], 20, delta=8)
+        self.assertAlmostEqual(stats["hot_path_own_ms"], stats["hot_path_response_ms"] + stats["hot_path_logging_ms"])
+        self.assertAlmostEqual(stats["hot_path_network_avg_ms"], 20)
+        self.assertAlmostEqual(stats["hot_path_own_avg_ms"], stats["hot_path_own_ms"] / 2)
+
+        stats = timer.snapshot()
+        self.assertEqual((stats["hot_path_requests"], stats["hot_path_own_ms"], stats["hot_path_own_avg_ms"]), (0, 0, 0))
+
+    def test_loop_lag_stats(self):
+        self.assertEqual(loop_lag_stats(LatencyHistogram())["loop_lag_p99_ms"], 0.0)
+        histogram = LatencyHistogram()
+        for lag in [0.1] * 98 + [40.0, 80.0]:
+            histogram.record(lag)
+        stats = loop_lag_stats(histogram)
+        self.assertEqual(stats["loop_lag_samples"], 100)
+        self.assertAlmostEqual(stats["loop_lag_p50_ms"], 0.1, delta=0.01)
+        self.assertAlmostEqual(stats["loop_lag_p99_ms"], 40.0, delta=0.5)
+        self.assertEqual(stats["loop_lag_max_ms"], 80.0)
+        self.assertEqual(LatencyHistogram.from_dict(stats["loop_lag_histogram"]).count, 100)
+
+    def test_greenlet_counts_without_runner(self):
+        counts = greenlet_counts(None)
+        self.assertEqual(counts["user_greenlets"], 0)
+        self.assertGreaterEqual(counts["hub_active_watchers"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+LOCUST_SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts'))
+
+# Import time of locust_generic_test.py on top of Locust itself (~8% of Locust's own import time when
+# measured); every load-generator process pays it before its first request. The budget is relative to
+# importing Locust in the same process, so a slow or loaded CI machine slows both alike.
+IMPORT_BUDGET_RELATIVE_TO_LOCUST = 0.5
+# Optional absolute budget in ms (e.g. IMPORT_BUDGET_MS=300 on a quiet machine), checked as well
+IMPORT_BUDGET_MS = os.getenv("IMPORT_BUDGET_MS")
+# Must not be imported by a load generator: the service, or jsonpath_ng without JSONPath settings
+FORBIDDEN_MODULES = ("app", "backend.app", "warm_pool", "run_scheduler", "jsonpath_ng")
+
+
+class LocustScriptImportTimeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _import_times(self):
+        """
+        Cumulative microseconds per module imported by the script, and for ``locust`` itself,
+        via ``python -X importtime``.
+        """
+        env = dict(os.environ, PYTHONPATH=LOCUST_SCRIPTS_DIR, TEST_ID="import-time",
+                   TEST_RESULTS_DIR=self.test_dir)
+        env.pop("EXPECTED_JSON_PATH_VALUE", None)
+        env.pop("CUSTOM_METRICS_JSON_PATH", None)
+        # Locust is imported first, so only the script's own imports are timed
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import locust; import locust_generic_test"],
+                                cwd=self.test_dir, env=env, capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        times = {}
+        after_locust = False
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if after_locust or name.strip() == "locust":
+                times[name.strip()] = int(cumulative)
+            after_locust = after_locust or name.strip() == "locust"
+        return times
+
+    def test_script_skips_service_modules(self):
+        times = self._import_times()
+        self.assertIn("locust_generic_test", times)
+        for module in FORBIDDEN_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_script_imports_within_budget(self):
+        times = self._import_times()
+        script_ms, locust_ms = times["locust_generic_test"] / 1000, times["locust"] / 1000
+        self.assertLess(script_ms, locust_ms * IMPORT_BUDGET_RELATIVE_TO_LOCUST,
+                        f"locust_generic_test took {script_ms:.0f} ms to import, Locust {locust_ms:.0f} ms")
+        if IMPORT_BUDGET_MS:
+            self.assertLess(script_ms, float(IMPORT_BUDGET_MS))
+
+
+if __name__ == '__main__':
+    unittest.main()
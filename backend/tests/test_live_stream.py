@@ -0,0 +1,246 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import live_stream
+from live_stream import LiveEvent, LiveStreamRegistry, LiveStreamView, parse_last_event_id
+from locust_scripts.segmented_log import SegmentedLogWriter
+
+
+class LiveStreamRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.test_dir, "flask_locust_runner_metrics.log")
+        self.registry = LiveStreamRegistry()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _append(self, *events):
+        with open(self.log_path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+
+    def _collect(self, subscription, count, timeout=2.0):
+        """Reads events from a subscription on a helper thread until ``count`` arrived."""
+        received = []
+        done = threading.Event()
+
+        def reader():
+            for batch in subscription:
+                received.extend(batch)
+                if len(received) >= count:
+                    break
+            done.set()
+
+        threading.Thread(target=reader, daemon=True).start()
+        done.wait(timeout)
+        return received
+
+    def test_new_events_delivered_to_all_subscribers_quickly(self):
+        self._append({"event": "summary", "n": 0})
+        subscriptions = [self.registry.subscribe("t1", self.log_path, heartbeat_interval=0.05) for _ in range(3)]
+        hub = self.registry.hub("t1")
+        self.assertTrue(all(s.hub is hub for s in subscriptions))
+
+        time.sleep(0.2)  # Let the tailer reach the end of the existing content
+        results = []
+        readers = [threading.Thread(target=lambda s=s: results.append(self._collect(s, 2))) for s in subscriptions]
+        for thread in readers:
+            thread.start()
+        written_at = time.monotonic()
+        self._append({"event": "summary", "n": 1})
+        for thread in readers:
+            thread.join()
+        self.assertLess(time.monotonic() - written_at, 0.5)
+
+        for received in results:
+            self.assertEqual([live_event.data["n"] for live_event in received], [0, 1])
+
+        for subscription in subscriptions:
+            self.registry.unsubscribe("t1", subscription)
+        self.assertIsNone(self.registry.hub("t1"))
+        self.assertTrue(hub.stopped)
+
+    def test_lines_parsed_once_and_frames_shared(self):
+        self._append({"event": "summary", "n": 0}, {"no_event": True})
+        subscriptions = [self.registry.subscribe("t2", self.log_path) for _ in range(5)]
+        results = [self._collect(s, 1) for s in subscriptions]
+        with patch.object(live_stream.json, "loads", wraps=json.loads) as mock_loads:
+            self._append({"event": "summary", "state": "stopped"})
+            results = [r + self._collect(s, 1) for r, s in zip(results, subscriptions)]
+        self.assertEqual(mock_loads.call_count, 1)  # Only the new line, once for all subscribers
+
+        first = results[0]
+        self.assertEqual(len(first), 2)
+        self.assertTrue(all(r[1] is first[1] for r in results))
+        self.assertEqual(first[1].frame,
+                         f"id: {first[1].event_id}\nevent: summary\ndata: " + json.dumps({"event": "summary", "state": "stopped"}) + "\n\n")
+        self.assertIn('"state": "stopped"', first[1].completed_frame)
+        self.assertIsNone(first[0].completed_frame)
+        for subscription in subscriptions:
+            self.registry.unsubscribe("t2", subscription)
+
+    def test_late_joiner_gets_ring_and_old_resume_reads_file(self):
+        registry = LiveStreamRegistry(ring_size=3)
+        self._append(*({"event": "summary", "n": n} for n in range(10)))
+        first = registry.subscribe("t3", self.log_path)
+        received = self._collect(first, 10)
+        self.assertEqual(len(received), 10)
+
+        late = registry.subscribe("t3", self.log_path)
+        self.assertEqual([e.data["n"] for e in self._collect(late, 3)], [7, 8, 9])
+
+        # Resuming from before the ring reads the gap back from the file
+        resumed = registry.subscribe("t3", self.log_path, last_event_id=received[1].event_id)
+        self.assertEqual([e.data["n"] for e in self._collect(resumed, 8)], list(range(2, 10)))
+
+        # Resuming inside the ring does not
+        resumed = registry.subscribe("t3", self.log_path, last_event_id=received[8].event_id)
+        with patch.object(live_stream.os, "pread") as mock_pread:
+            self.assertEqual([e.data["n"] for e in self._collect(resumed, 1)], [9])
+        mock_pread.assert_not_called()
+        for subscription in registry.hub("t3")._subscribers.copy():
+            registry.unsubscribe("t3", subscription)
+        self.assertIsNone(registry.hub("t3"))
+
+    def test_resume_on_new_hub(self):
+        self._append({"event": "a"}, {"event": "b"}, {"event": "c"})
+        first = self.registry.subscribe("t4", self.log_path)
+        received = self._collect(first, 3)
+        self.registry.unsubscribe("t4", first)
+
+        # Reconnect after the second event once the hub is gone: only the third is replayed
+        resumed = self.registry.subscribe("t4", self.log_path, last_event_id=received[1].event_id)
+        replay = self._collect(resumed, 1)
+        self.assertEqual([e.event_id for e in replay], [received[2].event_id])
+        self.registry.unsubscribe("t4", resumed)
+
+    def test_waits_for_log_creation_and_follows_truncation(self):
+        subscription = self.registry.subscribe("t5", self.log_path, heartbeat_interval=0.05)
+        self._append({"event": "before"})
+        self.assertEqual([e.event_type for e in self._collect(subscription, 1)], ["before"])
+
+        with open(self.log_path, "w") as f:
+            f.write('{"event": "after"}\n')
+        received = self._collect(subscription, 1)
+        self.assertEqual([(e.event_id, e.event_type) for e in received], [(len('{"event": "after"}\n'), "after")])
+        self.registry.unsubscribe("t5", subscription)
+
+    def test_follows_rotation_and_resumes_from_compressed_segments(self):
+        writer = SegmentedLogWriter(self.test_dir, segment_bytes=128, segment_seconds=0)
+        registry = LiveStreamRegistry(ring_size=5)
+        subscription = registry.subscribe("t6", self.log_path, heartbeat_interval=0.05)
+        for n in range(40):
+            writer.write(json.dumps({"event": "summary", "n": n}) + "\n")
+            if n % 10 == 9:
+                writer.compress_pending()
+                time.sleep(0.02)
+        writer.close()
+        received = self._collect(subscription, 40)
+        self.assertEqual([e.data["n"] for e in received], list(range(40)))
+        self.assertGreater(len(writer.index["segments"]), 5)
+        self.assertEqual(received[-1].event_id, writer.index["active_start"])
+        registry.unsubscribe("t6", subscription)
+
+        # A new hub starts at the last segment; older events are read back from compressed segments
+        resumed = registry.subscribe("t6", self.log_path, last_event_id=received[2].event_id)
+        self.assertEqual([e.data["n"] for e in self._collect(resumed, 37)], list(range(3, 40)))
+        registry.unsubscribe("t6", resumed)
+
+    def test_parse_last_event_id(self):
+        self.assertEqual(parse_last_event_id("42"), 42)
+        self.assertIsNone(parse_last_event_id(None))
+        self.assertIsNone(parse_last_event_id(""))
+        self.assertIsNone(parse_last_event_id("abc"))
+
+
+
+class _FakeSubscription:
+    """Feeds scripted batches to a LiveStreamView: (delay_seconds, [events]) pairs."""
+    heartbeat_interval = 0.05
+
+    def __init__(self, script):
+        self.script = list(script)
+
+    def get(self, timeout):
+        if not self.script:
+            time.sleep(timeout)
+            return None
+        delay, batch = self.script[0]
+        if delay > timeout:
+            self.script[0] = (delay - timeout, batch)
+            time.sleep(timeout)
+            return None
+        self.script.pop(0)
+        time.sleep(delay)
+        return batch
+
+
+def _event(event_id, **data):
+    data.setdefault("event", "summary")
+    return LiveEvent(event_id, data, json.dumps(data), "t")
+
+
+class LiveStreamViewTestCase(unittest.TestCase):
+    def _frames(self, view, script, limit=20):
+        """Collects (frames, idle) per yield until the stream completes or ``limit`` yields."""
+        collected = []
+        for frames in view.iter_frames(_FakeSubscription(script)):
+            collected.append(frames)
+            if len(collected) >= limit or (frames and "test_completed" in frames[-1]):
+                break
+        return collected
+
+    def test_event_filter_and_projection(self):
+        view = LiveStreamView.from_args({"events": "summary", "fields": "user_count,rps,user_count"})
+        summary = _event(1, user_count=5, rps=10.0, p95=120)
+        script = [(0, [_event(0, event="request", name="/a"), summary])]
+        frames = self._frames(view, script, limit=1)[0]
+        self.assertEqual(frames, [summary.projected_frame(("user_count", "rps"))])
+        self.assertEqual(json.loads(frames[0].split("data: ")[1]), {"event": "summary", "user_count": 5, "rps": 10.0})
+        # Same projection from another subscriber reuses the serialized frame
+        self.assertIs(summary.projected_frame(("user_count", "rps")), frames[0])
+
+    def test_max_fps_coalesces_to_latest_per_stream(self):
+        view = LiveStreamView(max_fps=5)  # At most one update per stream every 0.2 s
+        script = [(0.01, [_event(i, event="request_stats", name=name, n=i)]) for i in range(40)
+                  for name in ("/a", "/b")]
+        collected = self._frames(view, script, limit=10)
+        sent = [json.loads(frame.split("data: ")[1]) for frames in collected for frame in frames]
+        per_name = {name: [d["n"] for d in sent if d["name"] == name] for name in ("/a", "/b")}
+        # ~0.8 s of input (80 events) reduced to a handful of frames, always ending on the newest
+        self.assertLess(len(sent), 16)
+        self.assertEqual(per_name["/a"][0], 0)
+        self.assertEqual(per_name["/a"][-1], 39)
+        self.assertEqual(per_name["/b"][-1], 39)
+
+    def test_completion_flushes_pending_even_when_filtered(self):
+        view = LiveStreamView(event_types=["summary"], max_fps=1)
+        script = [(0, [_event(1, n=1)]), (0.01, [_event(2, n=2), _event(3, event="request_stats", state="stopped")])]
+        collected = self._frames(view, script)
+        frames = [frame for batch in collected for frame in batch]
+        self.assertEqual(len(frames), 3)
+        self.assertIn('"n": 2', frames[1])
+        self.assertTrue(frames[2].startswith("event: test_completed"))
+
+    def test_idle_yields_empty_list(self):
+        self.assertEqual(self._frames(LiveStreamView(), [], limit=2), [[], []])
+
+    def test_invalid_max_fps(self):
+        for value in ("abc", "0", "-1"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    LiveStreamView.from_args({"maxFps": value})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import json
+
+import sys
+from unittest.mock import MagicMock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import gevent
+
+from locust_logger import LocustStatsLogger, WorkerEventForwarder, METRICS_EVENTS_MESSAGE
+from segmented_log import SegmentedLogReader
+
+
+class LocustStatsLoggerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _read_lines(self, stats_logger):
+        with open(stats_logger.log_file_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_unbatched_writes_immediately(self):
+        stats_logger = LocustStatsLogger("run-1", base_dir=self.test_dir)
+        stats_logger.log_event("request", {"name": "/a"})
+        self.assertEqual(len(self._read_lines(stats_logger)), 1)
+        stats_logger.close()
+
+    def test_batched_buffers_until_flush_interval(self):
+        stats_logger = LocustStatsLogger("run-2", base_dir=self.test_dir, batched=True, flush_interval=0.05)
+        for i in range(10):
+            stats_logger.log_event("request", {"name": "/a", "i": i})
+        self.assertEqual(self._read_lines(stats_logger), [])
+
+        gevent.sleep(0.1)  # Let the background flusher run
+        lines = self._read_lines(stats_logger)
+        self.assertEqual([line["i"] for line in lines], list(range(10)))
+        stats_logger.close()
+
+    def test_batched_flushes_on_size_threshold(self):
+        stats_logger = LocustStatsLogger("run-3", base_dir=self.test_dir, batched=True,
+                                         flush_interval=60, flush_bytes=200)
+        for i in range(20):
+            stats_logger.log_event("request", {"name": "/a", "i": i})
+        self.assertGreater(len(self._read_lines(stats_logger)), 0)
+        stats_logger.close()
+        self.assertEqual(len(self._read_lines(stats_logger)), 20)
+
+    def test_close_drains_buffer(self):
+        stats_logger = LocustStatsLogger("run-4", base_dir=self.test_dir, batched=True, flush_interval=60)
+        stats_logger.log_event("summary", {"rps": 1.0})
+        stats_logger.close()
+        lines = self._read_lines(stats_logger)
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["event"], "summary")
+
+    def test_segmented_rotates_and_compresses_in_background(self):
+        stats_logger = LocustStatsLogger("run-5", base_dir=self.test_dir, segment_bytes=512)
+        for i in range(50):
+            stats_logger.log_event("request", {"name": "/a", "i": i})
+        gevent.sleep(0.1)  # Let the compression greenlet run
+        index = stats_logger._segments.index
+        self.assertGreater(len(index["segments"]), 1)
+        self.assertTrue(index["segments"][0]["compressed"])
+
+        stats_logger.close()
+        self.assertTrue(all(segment["compressed"] for segment in index["segments"]))
+        lines = [json.loads(line) for line in SegmentedLogReader(stats_logger.log_dir).iter_lines()]
+        self.assertEqual([line["i"] for line in lines], list(range(50)))
+
+    def test_worker_forwarder_batches_to_master(self):
+        forwarder = WorkerEventForwarder(flush_interval=0.05)
+        forwarder.log_event("error", {"message": "before attach"})
+        runner = MagicMock()
+        forwarder.attach(runner)
+        forwarder.log_event("worker_summary", {"rps": 1.0})
+        gevent.sleep(0.1)
+        runner.send_message.assert_called_once()
+        message_type, events = runner.send_message.call_args.args
+        self.assertEqual(message_type, METRICS_EVENTS_MESSAGE)
+        self.assertEqual([event["event"] for event in events], ["error", "worker_summary"])
+        forwarder.close()
+        self.assertEqual(os.listdir(self.test_dir), [])  # Workers never write the log
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import random
+import unittest
+from unittest.mock import MagicMock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from metrics_aggregator import LatencyHistogram, RequestMetricsAggregator, HISTOGRAM_PRECISION
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+    def test_percentiles_within_precision(self):
+        rng = random.Random(42)
+        values = [rng.lognormvariate(3, 1) for _ in range(50_000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        for fraction in (0.5, 0.9, 0.95, 0.99):
+            exact = values[int(len(values) * fraction) - 1]
+            self.assertAlmostEqual(histogram.percentile(fraction) / exact, 1.0, delta=HISTOGRAM_PRECISION * 1.5)
+
+    def test_round_trip_and_merge(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        for value in (1, 2, 3):
+            first.record(value)
+        for value in (100, 200):
+            second.record(value)
+
+        restored = LatencyHistogram.from_dict(first.to_dict())
+        self.assertEqual(restored.buckets, first.buckets)
+
+        restored.merge(second)
+        self.assertEqual(restored.count, 5)
+        self.assertAlmostEqual(restored.percentile(1.0), 200, delta=200 * HISTOGRAM_PRECISION)
+
+    def test_empty_histogram(self):
+        self.assertIsNone(LatencyHistogram().percentile(0.99))
+
+
+class RequestMetricsAggregatorTestCase(unittest.TestCase):
+    def test_one_record_per_name_per_interval(self):
+        stats_logger = MagicMock()
+        aggregator = RequestMetricsAggregator(stats_logger)
+        for i in range(1000):
+            aggregator.record("GET", "/a", 10 + i % 5, 100, success=i % 10 != 0)
+        aggregator.record("POST", "/b", 50, 20, success=True)
+        aggregator.flush()
+
+        self.assertEqual(stats_logger.log_event.call_count, 2)
+        records = {call.args[1]["name"]: call.args[1] for call in stats_logger.log_event.call_args_list}
+        self.assertEqual(stats_logger.log_event.call_args_list[0].args[0], "request_stats")
+        self.assertEqual(records["/a"]["count"], 1000)
+        self.assertEqual(records["/a"]["failures"], 100)
+        self.assertEqual(records["/a"]["bytes"], 100_000)
+        self.assertEqual(records["/a"]["min"], 10)
+        self.assertEqual(records["/a"]["max"], 14)
+        self.assertEqual(records["/b"]["count"], 1)
+
+        # Nothing recorded since the last flush -> nothing emitted
+        aggregator.flush()
+        self.assertEqual(stats_logger.log_event.call_count, 2)
+
+    def test_workers_forward_and_master_merges(self):
+        master_logger = MagicMock()
+        master = RequestMetricsAggregator(master_logger)
+        forwarded = []
+        workers = [RequestMetricsAggregator(MagicMock(), forward=forwarded.append) for _ in range(2)]
+        for i in range(100):
+            workers[0].record("GET", "/a", 10, 100, success=True)
+            workers[1].record("GET", "/a", 1000, 50, success=i % 2 == 0)
+        for worker in workers:
+            worker.flush()
+            worker.stats_logger.log_event.assert_not_called()
+        self.assertEqual(len(forwarded), 2)
+
+        for messages in forwarded:
+            master.merge(messages)
+        master.flush()
+        record = master_logger.log_event.call_args.args[1]
+        self.assertEqual(record["count"], 200)
+        self.assertEqual(record["failures"], 50)
+        self.assertEqual(record["bytes"], 15_000)
+        self.assertEqual((record["min"], record["max"], record["mean"]), (10, 1000, 505))
+        self.assertAlmostEqual(record["p50"], 10, delta=10 * HISTOGRAM_PRECISION)
+        self.assertAlmostEqual(record["p99"], 1000, delta=1000 * HISTOGRAM_PRECISION)
+
+    def test_phases_are_merged_per_name(self):
+        master_logger = MagicMock()
+        master = RequestMetricsAggregator(master_logger)
+        forwarded = []
+        worker = RequestMetricsAggregator(MagicMock(), forward=forwarded.append)
+        for i in range(100):
+            # Every tenth request opens a new connection
+            phases = {"ttfb": 20} if i % 10 else {"connect": 40, "ttfb": 20}
+            for aggregator in (master, worker):
+                aggregator.record("GET", "/a", 60 if i % 10 == 0 else 20, 0, success=True)
+                aggregator.record_phases("GET", "/a", phases, connections=0 if i % 10 else 1)
+        master.record("GET", "/b", 5, 0, success=True)
+        worker.flush()
+        master.merge(forwarded[0])
+        master.flush()
+
+        records = {call.args[1]["name"]: call.args[1] for call in master_logger.log_event.call_args_list}
+        record = records["/a"]
+        self.assertEqual((record["count"], record["connections"]), (200, 20))
+        self.assertEqual((record["connect_count"], record["ttfb_count"]), (20, 200))
+        self.assertEqual((record["connect_mean"], record["ttfb_mean"], record["connect_max"]), (40, 20, 40))
+        self.assertAlmostEqual(record["ttfb_p99"], 20, delta=20 * HISTOGRAM_PRECISION)
+        # Names without phases keep the plain record
+        self.assertNotIn("connections", records["/b"])
+
+        # Phases of a request whose record call is still to come wait for it in the next interval
+        master.record_phases("GET", "/c", {"ttfb": 1.0})
+        master.flush()
+        self.assertEqual(master_logger.log_event.call_count, 2)
+        master.record("GET", "/c", 1.0, 0, success=True)
+        master.flush()
+        self.assertEqual(master_logger.log_event.call_args.args[1]["ttfb_count"], 1)
+
+    def test_run_wide_phases(self):
+        stats_logger = MagicMock()
+        aggregator = RequestMetricsAggregator(stats_logger)
+        for interval in range(3):
+            for name, ttfb in (("/a", 10), ("/b", 1000)):
+                aggregator.record("GET", name, ttfb + 5, 0, success=True)
+                aggregator.record_phases("GET", name, {"ttfb": ttfb, "body": 5})
+            aggregator.flush()
+
+        summary = aggregator.phase_summary()
+        self.assertEqual((summary["ttfb_count"], summary["body_count"]), (6, 6))
+        self.assertEqual((summary["ttfb_mean"], summary["ttfb_max"]), (505, 1000))
+        self.assertNotIn("dns_count", summary)
+
+        stats_logger.reset_mock()
+        aggregator.stop()
+        breakdown = {call.args[1]["name"]: call.args[1] for call in stats_logger.log_event.call_args_list
+                     if call.args[0] == "phase_breakdown"}
+        self.assertEqual(sorted(breakdown), ["/a", "/b"])
+        self.assertEqual((breakdown["/a"]["ttfb_count"], breakdown["/a"]["ttfb_max"]), (3, 10))
+        self.assertAlmostEqual(breakdown["/b"]["ttfb_p99"], 1000, delta=1000 * HISTOGRAM_PRECISION)
+
+
+if __name__ == '__main__':
+    unittest.main()
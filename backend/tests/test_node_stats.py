@@ -0,0 +1,41 @@
+import os
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from locust_scripts.node_stats import WorkerLoadSampler, combine_node_stats
+
+
+class NodeStatsTestCase(unittest.TestCase):
+    def test_sampler_reports_rate_since_previous_sample(self):
+        sampler = WorkerLoadSampler("node-a")
+        for _ in range(10):
+            sampler.record_request()
+        sample = sampler.sample()
+        self.assertEqual(sample["node"], "node-a")
+        self.assertGreater(sample["rps"], 0)
+        self.assertEqual(sampler.sample()["rps"], 0)
+
+    def test_combine_groups_workers_by_node(self):
+        samples = [
+            ({"node": "b", "rps": 50.0, "cpu_percent": 95.0, "host_cpu_percent": 70.0}, 100.0),
+            ({"node": "a", "rps": 40.0, "cpu_percent": 30.0, "host_cpu_percent": 20.0}, 100.0),
+            ({"node": "a", "rps": 60.0, "cpu_percent": 50.0, "host_cpu_percent": 25.0}, 100.0),
+            ({"node": "b", "rps": 10.0, "cpu_percent": 10.0, "host_cpu_percent": 10.0}, 80.0),  # Stale
+        ]
+        node_a, node_b = combine_node_stats(samples, stale_after=15, now=101.0)
+
+        self.assertEqual((node_a["node"], node_a["workers"], node_a["healthy_workers"]), ("a", 2, 2))
+        self.assertEqual((node_a["rps"], node_a["cpu_percent"], node_a["cpu_percent_max"]), (100.0, 40.0, 50.0))
+        self.assertEqual(node_a["host_cpu_percent"], 25.0)
+        self.assertTrue(node_a["healthy"])
+        self.assertFalse(node_a["saturated"])
+
+        self.assertEqual((node_b["workers"], node_b["healthy_workers"], node_b["rps"]), (2, 1, 50.0))
+        self.assertFalse(node_b["healthy"])
+        self.assertTrue(node_b["saturated"])
+
+
+if __name__ == '__main__':
+    unittest.main()
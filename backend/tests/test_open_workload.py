@@ -0,0 +1,55 @@
+import os
+import time
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import gevent
+
+from open_workload import OpenWorkloadExecutor
+
+
+class OpenWorkloadExecutorTestCase(unittest.TestCase):
+    def _run(self, executor, duration, response_time):
+        latencies = []
+
+        def send(intended_start):
+            gevent.sleep(response_time)  # Simulated request
+            latencies.append(time.perf_counter() - intended_start)
+
+        runner = gevent.spawn(executor.run, send)
+        gevent.sleep(duration)
+        stats = executor.snapshot()
+        runner.kill()
+        return stats, latencies
+
+    def test_arrival_rate_independent_of_response_time(self):
+        executor = OpenWorkloadExecutor(100, max_concurrency=100)
+        # Each request takes 0.3s, a closed-loop user would only manage ~3 QPS
+        stats, latencies = self._run(executor, duration=1.0, response_time=0.3)
+        self.assertAlmostEqual(stats["arrival_qps"], 100, delta=15)
+        self.assertEqual(stats["arrivals_dropped"], 0)
+        self.assertGreater(stats["max_in_flight"], 20)
+        self.assertTrue(all(latency >= 0.3 for latency in latencies))
+        self.assertFalse(executor.running)
+
+    def test_arrivals_dropped_when_pool_is_full(self):
+        executor = OpenWorkloadExecutor(100, max_concurrency=5)
+        stats, _ = self._run(executor, duration=0.5, response_time=1.0)
+        self.assertLessEqual(stats["max_in_flight"], 5)
+        self.assertGreater(stats["arrivals_dropped"], 30)
+
+    def test_poisson_arrivals_and_worker_split(self):
+        executor = OpenWorkloadExecutor(400, distribution="poisson", worker_count=2)
+        self.assertEqual(executor.worker_target_qps, 200)
+        stats, _ = self._run(executor, duration=1.0, response_time=0.0)
+        self.assertAlmostEqual(stats["arrival_qps"], 200, delta=50)
+
+    def test_unknown_distribution_rejected(self):
+        with self.assertRaises(ValueError):
+            OpenWorkloadExecutor(10, distribution="burst")
+
+
+if __name__ == '__main__':
+    unittest.main()
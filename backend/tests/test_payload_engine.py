@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from string import Template
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+from gevent.pywsgi import WSGIServer
+from locust.contrib.fasthttp import FastHttpSession
+from locust.event import EventHook
+
+from payload_engine import PayloadRenderer, BinaryPayloadSource, MappedPayload, template_identifiers
+
+
+class PayloadRendererTestCase(unittest.TestCase):
+    def test_template_identifiers(self):
+        template = Template('{"id": ${id}, "name": "$name", "again": "${id}", "cost": "$$5"}')
+        self.assertEqual(template_identifiers(template), ("id", "name"))
+
+    def test_renders_json_bytes_without_round_trip(self):
+        renderer = PayloadRenderer(Template('{"id": ${id}, "name": "${name}"}'), "json", {"X-Trace": "1"})
+        body = renderer.render({"id": "7", "name": "alice"})
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body), {"id": 7, "name": "alice"})
+        self.assertEqual(renderer.headers, {"X-Trace": "1", "Content-Type": "application/json",
+                                            "Accept": "application/json"})
+
+    def test_static_template_rendered_once(self):
+        renderer = PayloadRenderer(Template('{"cost": "$$5"}'), "json")
+        self.assertIs(renderer.render({"id": 1}), renderer.render({"id": 2}))
+        self.assertEqual(renderer.render(), b'{"cost": "$5"}')
+
+    def test_cache_is_lru_bounded(self):
+        renderer = PayloadRenderer(Template("id=${id}"), "form", cache_size=2)
+        first = renderer.render({"id": "1", "unused": "x"})
+        self.assertIs(renderer.render({"id": "1", "unused": "y"}), first)
+        renderer.render({"id": "2"})
+        renderer.render({"id": "3"})
+        self.assertEqual(len(renderer._cache), 2)
+        self.assertEqual(renderer.render({"id": "1"}), b"id=1")
+        self.assertEqual(renderer.headers["Content-Type"], "application/x-www-form-urlencoded")
+
+    def test_missing_and_null_values_are_distinct(self):
+        renderer = PayloadRenderer(Template("${id}"), "text")
+        self.assertEqual(renderer.render({}), b"${id}")
+        self.assertEqual(renderer.render({"id": None}), b"None")
+
+    def test_unhashable_row_values(self):
+        renderer = PayloadRenderer(Template("${tags}"), "text")
+        self.assertEqual(renderer.render({"tags": ["a", "b"]}), b"['a', 'b']")
+
+    def test_unknown_payload_type_has_no_content_type(self):
+        renderer = PayloadRenderer(Template("raw"), "xml", {"A": "b"})
+        self.assertEqual(renderer.headers, {"A": "b"})
+
+
+class BinaryPayloadSourceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.payload_dir = os.path.join(self.test_dir, "payloads")
+        os.makedirs(self.payload_dir)
+        for name, content in (("a.png", b"PNG"), ("b.pdf", b"PDF"), (".hidden", b"x")):
+            with open(os.path.join(self.payload_dir, name), "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_single_file_read_once(self):
+        path = os.path.join(self.payload_dir, "a.png")
+        source = BinaryPayloadSource(path, {"X-Trace": "1"})
+        body, headers = source.next_payload()
+        os.remove(path)  # Subsequent requests must not touch the disk
+        self.assertIs(source.next_payload()[0], body)
+        self.assertEqual(body, b"PNG")
+        self.assertEqual(headers, {"X-Trace": "1", "Content-Type": "application/octet-stream"})
+
+    def test_large_file_is_memory_mapped_and_sent(self):
+        path = os.path.join(self.test_dir, "large.bin")
+        content = os.urandom(200_000)
+        with open(path, "wb") as f:
+            f.write(content)
+        received = []
+
+        def echo_length(environ, start_response):
+            received.append(environ["wsgi.input"].read())
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+
+        server = WSGIServer(("127.0.0.1", 0), echo_length, log=None)
+        server.start()
+        self.addCleanup(server.stop)
+        session = FastHttpSession(f"http://127.0.0.1:{server.server_port}", EventHook(), None)
+        source = BinaryPayloadSource(path, mmap_threshold=1)
+        for _ in range(2):
+            body, headers = source.next_payload()
+            self.assertIsInstance(body, MappedPayload)
+            response = session.post("/", data=body, headers=headers)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(body) for body in received], [len(content)] * 2)
+        self.assertEqual(received[1], content)
+        source.close()
+
+    def test_directory_rotation_with_auto_content_type(self):
+        source = BinaryPayloadSource(self.payload_dir, content_type="auto")
+        payloads = [source.next_payload() for _ in range(3)]
+        self.assertEqual([body for body, _ in payloads], [b"PNG", b"PDF", b"PNG"])
+        self.assertEqual([headers["Content-Type"] for _, headers in payloads],
+                         ["image/png", "application/pdf", "image/png"])
+
+    def test_archive_rotation(self):
+        zip_path = os.path.join(self.test_dir, "payloads.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("one.bin", b"1")
+            archive.writestr("two.bin", b"2")
+        source = BinaryPayloadSource(zip_path, rotate=True)
+        self.assertEqual([source.next_payload()[0] for _ in range(3)], [b"1", b"2", b"1"])
+        source.close()
+
+        tar_path = os.path.join(self.test_dir, "payloads.tar")
+        with tarfile.open(tar_path, "w") as archive:
+            archive.add(os.path.join(self.payload_dir, "a.png"), arcname="a.png")
+        source = BinaryPayloadSource(tar_path, rotate=True)
+        self.assertEqual(source.next_payload()[0], b"PNG")
+        source.close()
+
+        # Without rotate, an archive is just one binary payload
+        self.assertEqual(len(BinaryPayloadSource(zip_path)), 1)
+
+    def test_empty_directory_rejected(self):
+        with self.assertRaises(ValueError):
+            BinaryPayloadSource(tempfile.mkdtemp(dir=self.test_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import gzip
+import io
+import os
+import unittest
+import zlib
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'locust_scripts')))
+
+import response_plan
+from response_plan import (JsonPathPlan, ResponsePlan, body_preview, BODY_DECODE, BODY_DRAIN, BODY_LENGTH, KIND_BINARY,
+                           KIND_ERROR, KIND_JSON, KIND_NO_CONTENT, KIND_TEXT, KIND_UNKNOWN)
+
+
+class JsonPathPlanTestCase(unittest.TestCase):
+    response_json = {"status": "ok", "data": {"items": [{"price": 3}, {"price": 5}]}}
+
+    def test_expressions_compiled_once(self):
+        with patch.object(response_plan, "parse", wraps=response_plan.parse) as parse:
+            plan = JsonPathPlan({"$.status": "ok"}, ["$.data.items[*].price"])
+            for _ in range(10):
+                plan.check(self.response_json)
+                plan.extract_metrics(self.response_json)
+        self.assertEqual(parse.call_count, 2)
+
+    def test_check_reports_first_failure(self):
+        plan = JsonPathPlan({"$.status": "ok", "$.missing": 1, "$.data": 2})
+        self.assertEqual(plan.check(self.response_json), ["JSONPath '$.missing' found no matches."])
+        self.assertEqual(JsonPathPlan({"$.status": "ok"}).check(self.response_json), [])
+        self.assertEqual(JsonPathPlan({"$.status": "error"}).check(self.response_json),
+                         ["JSONPath '$.status': Expected 'error', got 'ok'."])
+
+    def test_extract_metrics(self):
+        plan = JsonPathPlan(metric_paths=["$.data.items[*].price"])
+        self.assertEqual(plan.extract_metrics(self.response_json),
+                         [("jsonpath.data_items_*_price", 3), ("jsonpath.data_items_*_price", 5)])
+
+    def test_invalid_path_fails_fast(self):
+        with self.assertRaises(ValueError):
+            JsonPathPlan({"$.[[": 1})
+        with self.assertRaises(ValueError):
+            JsonPathPlan(["$.status"])
+
+    def test_empty_plan_is_falsy(self):
+        self.assertFalse(JsonPathPlan())
+        self.assertTrue(JsonPathPlan(metric_paths=["$.status"]))
+
+
+class StreamedResponse:
+    """Stands in for a streamed FastResponse: read() in chunks, then release()."""
+    def __init__(self, body: bytes, headers: dict = None):
+        self.headers = headers or {}
+        self._body = io.BytesIO(body)
+        self.reads = 0
+        self.released = False
+
+    def read(self, size):
+        self.reads += 1
+        return self._body.read(size)
+
+    def release(self):
+        self.released = True
+
+
+class ResponsePlanTestCase(unittest.TestCase):
+    def test_routes(self):
+        plan = ResponsePlan()
+        self.assertEqual(plan.route(200, "application/json; charset=utf-8"), (KIND_JSON, BODY_DRAIN))
+        self.assertEqual(plan.route(200, "text/html"), (KIND_TEXT, BODY_LENGTH))
+        self.assertEqual(plan.route(200, "application/pdf"), (KIND_BINARY, BODY_LENGTH))
+        self.assertEqual(plan.route(200, "application/x-custom"), (KIND_UNKNOWN, BODY_DRAIN))
+        self.assertEqual(plan.route(204, ""), (KIND_NO_CONTENT, BODY_LENGTH))
+        self.assertEqual(plan.route(500, "application/json"), (KIND_ERROR, BODY_DRAIN))
+
+    def test_json_decoded_only_for_jsonpath(self):
+        plan = ResponsePlan(JsonPathPlan({"$.status": "ok"}))
+        self.assertEqual(plan.route(201, "application/json"), (KIND_JSON, BODY_DECODE))
+        self.assertEqual(ResponsePlan(JsonPathPlan()).route(201, "application/json"), (KIND_JSON, BODY_DRAIN))
+
+    def test_routes_cached_per_content_type(self):
+        plan = ResponsePlan()
+        with patch.object(plan, "_route_content_type", wraps=plan._route_content_type) as route_content_type:
+            for _ in range(5):
+                plan.route(200, "text/plain")
+                plan.route(204, "")
+        self.assertEqual(route_content_type.call_count, 2)
+
+    def test_drain_counts_without_keeping_body(self):
+        plan = ResponsePlan(chunk_size=4)
+        response = StreamedResponse(b"0123456789")
+        self.assertEqual(plan.drain(response), (10, b"", None))
+        self.assertEqual(plan.drain(StreamedResponse(b"0123456789"), keep=6), (10, b"012345", None))
+        self.assertEqual(response.reads, 4)  # Three chunks and the empty read at the end
+        self.assertTrue(response.released)
+
+    def test_drain_stops_over_max_bytes(self):
+        plan = ResponsePlan(max_bytes=5, chunk_size=4)
+        response = StreamedResponse(b"x" * 100)
+        length, _, failure = plan.drain(response)
+        self.assertEqual(length, 8)
+        self.assertEqual(failure, "Response body of 8 bytes exceeds the 5 byte limit.")
+        self.assertTrue(response.released)
+
+        declared = StreamedResponse(b"x" * 100, {"Content-Length": "100"})
+        self.assertEqual(plan.drain(declared), (0, b"", "Response body of 100 bytes exceeds the 5 byte limit."))
+        self.assertEqual(declared.reads, 0)
+        with self.assertRaises(ValueError):
+            ResponsePlan(max_bytes=0)
+
+    def test_drain_counts_decoded_bytes(self):
+        body = b'{"items": [' + b'{"id": 1}, ' * 500 + b'{}]}'
+        raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        import brotli
+        for encoding, sent in (("gzip", gzip.compress(body)), ("deflate", zlib.compress(body)),
+                               ("deflate", raw_deflate.compress(body) + raw_deflate.flush()),
+                               ("br", brotli.compress(body))):
+            with self.subTest(encoding=encoding):
+                response = StreamedResponse(sent, {"Content-Encoding": encoding, "Content-Length": str(len(sent))})
+                self.assertEqual(ResponsePlan(chunk_size=64).drain(response, keep=10), (len(body), body[:10], None))
+
+        # The limit applies to the decoded body, however small it is on the wire
+        bomb = gzip.compress(b"\0" * 10_000_000)
+        response = StreamedResponse(bomb, {"Content-Encoding": "gzip", "Content-Length": str(len(bomb))})
+        length, _, failure = ResponsePlan(max_bytes=100_000, chunk_size=1024).drain(response)
+        self.assertEqual(failure, f"Response body of {length} bytes exceeds the 100000 byte limit.")
+        self.assertEqual(response.reads, 1)
+
+    def test_drain_read_error(self):
+        response = StreamedResponse(b"")
+        response.read = lambda size: (_ for _ in ()).throw(ConnectionResetError("reset"))
+        self.assertEqual(ResponsePlan().drain(response), (0, b"", "Error reading response body: reset"))
+        self.assertTrue(response.released)
+
+    def test_body_preview(self):
+        self.assertEqual(body_preview(b"not found"), "not found")
+        self.assertEqual(body_preview(b"bad \xff"), "bad \ufffd")
+        self.assertEqual(len(body_preview(b"x" * 1000)), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from results_store import RESULTS_STORE_FILENAME, ResultsStore, ResultsStoreCache, build_results_store
+from locust_scripts.segmented_log import METRICS_LOG_FILENAME, SegmentedLogWriter
+
+T0 = 1_700_000_000.0
+
+
+def write_metrics_log(test_run_dir, seconds=120):
+    with open(os.path.join(test_run_dir, METRICS_LOG_FILENAME), "w") as f:
+        f.write("not json\n")
+        for i in range(seconds):
+            for name in ("/a", "/b"):
+                f.write(json.dumps({"event": "request_stats", "request_type": "GET", "name": name,
+                                    "count": 10, "p99": i + (100 if name == "/b" else 0),
+                                    "hist": {"1": 10}, "timestamp": T0 + i}) + "\n")
+            summary = {"event": "summary", "user_count": 5, "p99": i * 2, "timestamp": T0 + i + 0.5}
+            if i >= 60:
+                summary["rps"] = 50.0  # Column that only appears half way through
+            f.write(json.dumps(summary) + "\n")
+
+
+class ResultsStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        write_metrics_log(self.test_dir)
+        self.store_path = build_results_store(self.test_dir, "t1")
+        self.store = ResultsStore(self.store_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_series_and_columns(self):
+        self.assertEqual(self.store_path, os.path.join(self.test_dir, RESULTS_STORE_FILENAME))
+        self.assertEqual(self.store.test_id, "t1")
+        self.assertEqual(sorted(self.store.series), ["request_stats:GET:/a", "request_stats:GET:/b", "summary"])
+        summary = self.store.series["summary"]
+        self.assertEqual(summary["rows"], 120)
+        self.assertEqual(summary["t_min"], T0 + 0.5)
+        self.assertNotIn("hist", self.store.series["request_stats:GET:/a"]["columns"])
+
+        rps = self.store.column("summary", "rps")
+        self.assertTrue(math.isnan(rps[0]))
+        self.assertEqual(rps[60], 50.0)
+
+    def test_raw_query_picks_series(self):
+        result = self.store.query("p99")
+        self.assertEqual(result["series"], "summary")
+        self.assertEqual(result["points"][:2], [[T0 + 0.5, 0.0], [T0 + 1.5, 2.0]])
+
+        result = self.store.query("p99", name="/b", start=T0 + 10, end=T0 + 12)
+        self.assertEqual(result["series"], "request_stats:GET:/b")
+        self.assertEqual(result["points"], [[T0 + 10, 110.0], [T0 + 11, 111.0], [T0 + 12, 112.0]])
+
+        # Rows without the metric are skipped
+        self.assertEqual(len(self.store.query("rps")["points"]), 60)
+
+    def test_bucketed_query(self):
+        result = self.store.query("p99", name="/a", start=T0, step=30, agg="max")
+        self.assertEqual(result["points"], [[T0, 29.0], [T0 + 30, 59.0], [T0 + 60, 89.0], [T0 + 90, 119.0]])
+        result = self.store.query("p99", name="/a", start=T0, end=T0 + 9, step=5, agg="mean")
+        self.assertEqual(result["points"], [[T0, 2.0], [T0 + 5, 7.0]])
+        result = self.store.query("count", name="/a", start=T0, step=60, agg="sum")
+        self.assertEqual([value for _, value in result["points"]], [600.0, 600.0])
+
+    def test_invalid_queries(self):
+        with self.assertRaises(KeyError):
+            self.store.query("p99", name="/missing")
+        with self.assertRaises(ValueError):
+            self.store.query("p99", step=10, agg="median")
+        with self.assertRaises(ValueError):
+            self.store.query("p99", step=0)
+
+    def test_unsorted_timestamps_are_ordered(self):
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "w") as f:
+            for ts in (T0 + 2, T0, T0 + 1):
+                f.write(json.dumps({"event": "summary", "p99": ts - T0, "timestamp": ts}) + "\n")
+        store = ResultsStore(build_results_store(self.test_dir))
+        self.assertEqual(store.query("p99")["points"], [[T0, 0.0], [T0 + 1, 1.0], [T0 + 2, 2.0]])
+
+    def test_segmented_log_builds_same_store(self):
+        segmented_dir = tempfile.mkdtemp(dir=self.test_dir)
+        writer = SegmentedLogWriter(segmented_dir, segment_bytes=4096, segment_seconds=0)
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME)) as f:
+            for line in f:
+                writer.write(line)
+        writer.close()
+        self.assertGreater(len(writer.index["segments"]), 1)
+        store = ResultsStore(build_results_store(segmented_dir))
+        self.assertEqual(store.series, self.store.series)
+        self.assertEqual(store.query("p99", name="/b")["points"], self.store.query("p99", name="/b")["points"])
+
+    def test_generator_bound_run_is_flagged(self):
+        self.assertIsNone(self.store.generator_bound)
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "a") as f:
+            for i in range(2):
+                f.write(json.dumps({"event": "generator_bound", "process": f"worker-{i}", "saturated_seconds": 30,
+                                    "action": "none", "timestamp": T0 + 200 + i}) + "\n")
+        store = ResultsStore(build_results_store(self.test_dir))
+        self.assertEqual(store.generator_bound["process"], "worker-0")
+
+    def test_earliest_first_request_is_kept(self):
+        self.assertIsNone(self.store.first_request)
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "a") as f:
+            # Forwarded worker events are not in time order
+            for latency in (900.0, 250.0, 600.0):
+                f.write(json.dumps({"event": "first_request", "start_latency_ms": latency, "warm_start": True,
+                                    "timestamp": T0 + latency / 1000}) + "\n")
+        store = ResultsStore(build_results_store(self.test_dir))
+        self.assertEqual(store.first_request["start_latency_ms"], 250.0)
+
+    def test_latest_phase_breakdown_per_name(self):
+        self.assertEqual(self.store.phase_breakdown, [])
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "a") as f:
+            for i, name in enumerate(("/a", "/b", "/a")):
+                f.write(json.dumps({"event": "phase_breakdown", "request_type": "GET", "name": name,
+                                    "ttfb_p99": 10.0 * (i + 1), "timestamp": T0 + 200 + i}) + "\n")
+        store = ResultsStore(build_results_store(self.test_dir))
+        self.assertEqual({entry["name"]: entry["ttfb_p99"] for entry in store.phase_breakdown}, {"/a": 30.0, "/b": 20.0})
+        self.assertEqual(store.query("ttfb_p99", name="/b", event="phase_breakdown")["points"], [[T0 + 201, 20.0]])
+
+    def test_no_events_builds_nothing(self):
+        empty_dir = tempfile.mkdtemp(dir=self.test_dir)
+        self.assertIsNone(build_results_store(empty_dir))
+
+    def test_cache_reopens_rebuilt_store(self):
+        cache = ResultsStoreCache()
+        store = cache.get(self.test_dir)
+        self.assertIs(cache.get(self.test_dir), store)
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "a") as f:
+            f.write(json.dumps({"event": "summary", "p99": 1.0, "timestamp": T0 + 500}) + "\n")
+        build_results_store(self.test_dir)
+        os.utime(self.store_path, ns=(0, os.stat(self.store_path).st_mtime_ns + 1))
+        self.assertEqual(cache.get(self.test_dir).series["summary"]["rows"], 121)
+        self.assertIsNone(cache.get(tempfile.mkdtemp(dir=self.test_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
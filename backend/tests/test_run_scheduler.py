@@ -0,0 +1,70 @@
+import os
+import unittest
+from unittest.mock import MagicMock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from run_scheduler import RunScheduler, ScheduledRun, QUEUED, STARTING, RUNNING, STOPPING, FINISHED
+
+
+def _run(test_id, cpu_cores=1, memory_mb=100, launch=None):
+    return ScheduledRun(test_id, "generic", launch or MagicMock(), cpu_cores=cpu_cores, memory_mb=memory_mb)
+
+
+class RunSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RunScheduler(cpu_budget=4, memory_budget_mb=1000)
+
+    def test_admits_in_order_within_budget(self):
+        big, small, memory_heavy = _run("big", cpu_cores=3), _run("small", cpu_cores=2), _run("mem", memory_mb=950)
+        self.assertTrue(self.scheduler.submit(big))
+        self.assertEqual(big.state, STARTING)
+        self.scheduler.launch(big)
+        self.assertEqual(big.state, RUNNING)
+        big.launch.assert_called_once_with(big)
+
+        self.assertFalse(self.scheduler.submit(small))
+        # Fits the budget, but does not overtake the queued run
+        self.assertFalse(self.scheduler.submit(_run("tiny", cpu_cores=0.5)))
+        self.assertFalse(self.scheduler.submit(memory_heavy))
+        self.assertEqual([self.scheduler.queue_position(test_id) for test_id in ("small", "tiny", "mem")], [1, 2, 3])
+        self.assertEqual(self.scheduler.usage()["cpu_reserved"], 3)
+
+        self.scheduler.stopping("big")
+        self.assertEqual(big.state, STOPPING)
+        self.scheduler.finish("big", exit_code=0)
+        self.assertEqual((big.state, big.exit_code), (FINISHED, 0))
+        # small and tiny fit together; mem waits for memory
+        self.assertEqual([self.scheduler.get(test_id).state for test_id in ("small", "tiny", "mem")],
+                         [RUNNING, RUNNING, QUEUED])
+        self.assertEqual(self.scheduler.queue_position("mem"), 1)
+
+    def test_oversized_run_runs_alone(self):
+        self.assertTrue(self.scheduler.submit(_run("huge", cpu_cores=16)))
+        self.assertFalse(self.scheduler.submit(_run("next")))
+        self.scheduler.finish("huge")
+        self.assertEqual(self.scheduler.get("next").state, RUNNING)
+
+    def test_failed_launch_releases_budget(self):
+        failing = _run("failing", cpu_cores=4, launch=MagicMock(side_effect=OSError("locust not found")))
+        waiting = _run("waiting", cpu_cores=4)
+        self.assertTrue(self.scheduler.submit(failing))
+        self.assertFalse(self.scheduler.submit(waiting))
+        with self.assertRaises(OSError):
+            self.scheduler.launch(failing)
+        self.assertEqual((failing.state, failing.error), (FINISHED, "locust not found"))
+        self.assertEqual(waiting.state, RUNNING)
+
+    def test_cancel_only_applies_to_queued_runs(self):
+        self.scheduler.submit(_run("first", cpu_cores=4))
+        self.scheduler.submit(_run("second"))
+        self.assertFalse(self.scheduler.cancel("first"))
+        self.assertTrue(self.scheduler.cancel("second"))
+        second = self.scheduler.describe(self.scheduler.get("second"))
+        self.assertEqual((second["state"], second["cancelled"], second["queue_position"]), (FINISHED, True, None))
+        self.assertEqual([run["test_id"] for run in self.scheduler.runs()], ["first", "second"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from locust_scripts.segmented_log import (METRICS_LOG_FILENAME, SEGMENTS_DIRNAME, INDEX_FILENAME,
+                                          DICTIONARY_FILENAME, SegmentedLogWriter, SegmentedLogReader)
+
+
+def _line(i):
+    return json.dumps({"event": "request_stats", "request_type": "GET", "name": f"/endpoint/{i % 5}",
+                       "count": 100 + i % 13, "failures": 0, "p50": 11.0, "p95": 25.0, "p99": 40.0 + i % 7,
+                       "timestamp": 1_700_000_000 + i}) + "\n"
+
+
+class SegmentedLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.segments_dir = os.path.join(self.test_dir, SEGMENTS_DIRNAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, writer, count):
+        lines = [_line(i) for i in range(count)]
+        for line in lines:
+            writer.write(line)
+        return "".join(lines).encode()
+
+    def _index(self):
+        with open(os.path.join(self.segments_dir, INDEX_FILENAME)) as f:
+            return json.load(f)
+
+    def test_rotates_by_size_and_compresses_with_dictionary(self):
+        writer = SegmentedLogWriter(self.test_dir, segment_bytes=64 * 1024, segment_seconds=0)
+        expected = self._write(writer, 3000)
+        index = self._index()
+        self.assertGreater(len(index["segments"]), 3)
+        self.assertFalse(any(segment["compressed"] for segment in index["segments"]))
+        self.assertEqual(index["active_start"], sum(segment["length"] for segment in index["segments"]))
+
+        writer.close()
+        index = self._index()
+        self.assertTrue(index["closed"])
+        self.assertEqual(index["dictionary"], DICTIONARY_FILENAME)
+        self.assertTrue(all(segment["compressed"] and segment["dictionary"] for segment in index["segments"]))
+        self.assertEqual(index["active_start"], len(expected))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, METRICS_LOG_FILENAME)))
+        files = os.listdir(self.segments_dir)
+        self.assertFalse([name for name in files if name.endswith(".log")])
+
+        compressed = sum(os.path.getsize(os.path.join(self.segments_dir, name)) for name in files)
+        self.assertLess(compressed * 10, len(expected))
+
+        reader = SegmentedLogReader(self.test_dir)
+        self.assertEqual(reader.size(), len(expected))
+        self.assertEqual(b"".join(line + b"\n" for line in reader.iter_lines()), expected)
+
+    def test_read_range_spans_segments_and_active_file(self):
+        writer = SegmentedLogWriter(self.test_dir, segment_bytes=16 * 1024, segment_seconds=0)
+        expected = self._write(writer, 400)
+        writer.compress_pending()
+        reader = SegmentedLogReader(self.test_dir)
+        self.assertGreater(reader.active_start, 0)
+        self.assertEqual(reader.size(), len(expected))
+
+        for start, end in ((0, len(expected)), (100, 40_000), (reader.active_start - 10, reader.active_start + 10),
+                           (len(expected) - 5, len(expected) + 100)):
+            with self.subTest(start=start, end=end):
+                self.assertEqual(reader.read_range(start, end), expected[start:end])
+
+        # The reader follows later rotations through the index
+        more = self._write(writer, 200)
+        writer.close()
+        self.assertEqual(reader.read_range(len(expected), len(expected) + len(more)), more)
+
+    def test_unsegmented_log_reads_as_plain_file(self):
+        with open(os.path.join(self.test_dir, METRICS_LOG_FILENAME), "w") as f:
+            f.write("a\nb\npartial")
+        reader = SegmentedLogReader(self.test_dir)
+        self.assertEqual(reader.active_start, 0)
+        self.assertEqual(reader.read_range(2, 6), b"b\npa")
+        self.assertEqual(list(reader.iter_lines()), [b"a", b"b"])
+
+    def test_reopen_continues_index(self):
+        writer = SegmentedLogWriter(self.test_dir, segment_bytes=1024, segment_seconds=0)
+        first = self._write(writer, 20)
+        writer.close()
+        writer = SegmentedLogWriter(self.test_dir, segment_bytes=1024, segment_seconds=0)
+        second = self._write(writer, 20)
+        self.assertFalse(self._index()["closed"])
+        writer.close()
+        self.assertEqual(SegmentedLogReader(self.test_dir).read_range(0, 10**6), first + second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import locust
+
+from warm_pool import WarmLocustPool
+
+
+class WarmLocustPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.pool = WarmLocustPool(size=1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        shutil.rmtree(self.test_dir)
+
+    def test_runs_locust_in_a_warm_process(self):
+        self.pool.fill()
+        self.assertEqual(self.pool.idle_count(), 1)
+        log_path = os.path.join(self.test_dir, "runner.log")
+        process = self.pool.launch(["locust", "--version"], dict(os.environ), log_path)
+        self.assertIsNotNone(process)
+        self.assertEqual(process.wait(timeout=60), 0)
+        with open(log_path) as f:
+            self.assertIn(locust.__version__, f.read())
+        # The pool was refilled for the next run
+        self.assertEqual(self.pool.idle_count(), 1)
+
+    def test_falls_back_to_cold_start(self):
+        self.assertIsNone(WarmLocustPool(size=0).launch(["locust", "--version"], {}, os.devnull))
+        self.pool.fill()
+        self.assertIsNone(self.pool.launch(["python", "-V"], {}, os.devnull))
+        # An idle process that died is skipped
+        self.pool._idle[0].kill()
+        self.pool._idle[0].wait()
+        self.assertIsNone(self.pool.launch(["locust", "--version"], {}, os.devnull))
+
+    def test_shutdown_stops_idle_processes(self):
+        self.pool.fill()
+        process = self.pool._idle[0]
+        started = time.monotonic()
+        self.pool.shutdown()
+        self.assertEqual(process.poll(), 0)
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertEqual(self.pool.idle_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
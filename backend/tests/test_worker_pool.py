@@ -0,0 +1,273 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from unittest.mock import patch, MagicMock
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.serving import make_server
+
+import app as main_app_module
+import worker_pool as worker_pool_module
+from worker_agent import WorkerAgent, create_agent_app
+from worker_pool import WorkerPool, TOKEN_HEADER
+from run_scheduler import RunScheduler
+from warm_pool import WarmLocustPool
+
+
+POOL_TOKEN = "test-pool-token"
+RUN_ID = "0b8d2c4e-6f1a-4e3b-9c5d-7a2f1e0d3b6c"
+
+
+def _serve(flask_app):
+    """Runs a Flask app on an ephemeral localhost port in a background thread."""
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool()
+        self.pool.register("a", "http://a:5101", cpu_count=4)
+        self.pool.register("b", "http://b:5101/", cpu_count=8, max_workers=2)
+
+    def test_placement_spreads_over_free_slots(self):
+        self.assertEqual(self.pool.place(5), {"a": 3, "b": 2})
+        self.assertEqual(self.pool.place(2), {"a": 2})
+        self.assertEqual(self.pool.place(6), {"a": 4, "b": 2})
+        with self.assertRaises(ValueError):
+            self.pool.place(7)
+
+    def test_unhealthy_nodes_are_skipped(self):
+        self.pool._nodes["a"].last_seen -= worker_pool_module.NODE_HEARTBEAT_TIMEOUT + 1
+        self.assertFalse(self.pool._nodes["a"].healthy)
+        self.assertEqual(self.pool.place(2), {"b": 2})
+        self.assertTrue(self.pool.heartbeat("a", {"cpu_percent": 12.5}))
+        self.assertEqual(self.pool.place(6), {"a": 4, "b": 2})
+
+        nodes = {node["node_id"]: node for node in self.pool.nodes()}
+        self.assertEqual(nodes["a"]["stats"], {"cpu_percent": 12.5})
+        self.assertEqual(nodes["b"]["url"], "http://b:5101")
+        self.assertFalse(self.pool.heartbeat("unknown", {}))
+
+    def test_failed_start_rolls_back(self):
+        calls = []
+
+        def call(node, method, path, payload=None):
+            calls.append((node.node_id, path))
+            if node.node_id == "b" and path == "/agent/workers":
+                raise RuntimeError("Node b is unreachable")
+            return {}
+
+        with patch.object(WorkerPool, "_call", side_effect=call):
+            with self.assertRaises(RuntimeError):
+                self.pool.start_workers("t1", 5, {"master_port": 1234})
+        self.assertEqual(calls, [("a", "/agent/workers"), ("b", "/agent/workers"), ("a", "/agent/workers/t1/stop")])
+        self.assertEqual(self.pool._nodes["a"].assigned, {})
+
+
+@patch('os.killpg')
+@patch('subprocess.Popen')
+class WorkerPoolLocalhostTestCase(unittest.TestCase):
+    """The service and two agents on localhost; only the Locust processes are mocked."""
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.pool_patch = patch.object(main_app_module, "worker_pool", WorkerPool(token=POOL_TOKEN))
+        self.pool = self.pool_patch.start()
+        main_app_module.run_scheduler = RunScheduler(cpu_budget=4, memory_budget_mb=4096)
+        main_app_module.warm_pool = WarmLocustPool(size=0)
+        main_app_module.BASE_TEST_RESULTS_DIR = os.path.join(self.test_dir, "results")
+        os.makedirs(main_app_module.BASE_TEST_RESULTS_DIR)
+        self.servers = []
+        server, self.service_url = _serve(main_app_module.app)
+        self.servers.append(server)
+
+        self.agents = []
+        for index in range(2):
+            server = make_server("127.0.0.1", 0, None, threaded=True)
+            url = f"http://127.0.0.1:{server.server_port}"
+            agent = WorkerAgent(self.service_url, url, node_id=f"node-{index}",
+                                work_dir=os.path.join(self.test_dir, f"agent-{index}"), max_workers=2, token=POOL_TOKEN)
+            server.app = create_agent_app(agent)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+            self.agents.append(agent)
+            agent.heartbeat()  # Unknown to the service yet, so this registers
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+        self.pool_patch.stop()
+        shutil.rmtree(self.test_dir)
+
+    def _request(self, url, payload=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token is not None:
+            headers[TOKEN_HEADER] = token
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(url, data=data, method="POST" if data else "GET", headers=headers)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def _post(self, path, fields):
+        data = "&".join(f"{key}={urllib.request.quote(value)}" for key, value in fields.items()).encode()
+        req = urllib.request.Request(self.service_url + path, data=data, method="POST",
+                                     headers={"Content-Type": "application/x-www-form-urlencoded"})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_agents_register_and_report(self, mock_popen, mock_killpg):
+        with urllib.request.urlopen(self.service_url + "/perf-service/api/nodes") as response:
+            nodes = json.loads(response.read())["nodes"]
+        self.assertEqual(sorted(node["node_id"] for node in nodes), ["node-0", "node-1"])
+        self.assertTrue(all(node["healthy"] and node["max_workers"] == 2 for node in nodes))
+        self.agents[0].heartbeat()
+        self.assertIn("cpu_percent", self.pool._nodes["node-0"].stats)
+
+    def test_service_and_agents_require_the_token(self, mock_popen, mock_killpg):
+        registration = {"node_id": "intruder", "url": "http://127.0.0.1:1"}
+        spec = {"test_id": RUN_ID, "count": 1, "master_port": 1234, "env": {"PYTHONPATH": "/tmp/evil"}}
+        agent_url = self.agents[0].advertise_url
+        for token in (None, "wrong"):
+            self.assertEqual(self._request(self.service_url + "/perf-service/api/nodes/register", registration, token), 401)
+            self.assertEqual(self._request(self.service_url + "/perf-service/api/nodes/node-0/heartbeat", {}, token), 401)
+            self.assertEqual(self._request(agent_url + "/agent/workers", spec, token), 401)
+            self.assertEqual(self._request(agent_url + "/agent/status", token=token), 401)
+        self.assertNotIn("intruder", self.pool._nodes)
+        mock_popen.assert_not_called()
+        self.assertEqual(self._request(agent_url + "/agent/status", token=POOL_TOKEN), 200)
+
+        # A pool without a token accepts no agent at all
+        with patch.object(main_app_module, "worker_pool", WorkerPool()):
+            self.assertEqual(self._request(self.service_url + "/perf-service/api/nodes/register", registration, ""), 401)
+
+    def test_agent_applies_only_run_settings(self, mock_popen, mock_killpg):
+        process = MagicMock()
+        process.pid = 41000
+        process.wait.side_effect = lambda timeout=None: 0
+        mock_popen.return_value = process
+        self.agents[0].start_workers({"test_id": RUN_ID, "count": 1, "master_port": 1234, "env": {
+            "TARGET_QPS": "5", "PYTHONPATH": "/tmp/evil", "LD_PRELOAD": "/tmp/evil.so"},
+            "files": {"LD_PRELOAD": "evil.so"}})
+        env = mock_popen.call_args.kwargs["env"]
+        self.assertEqual(env["TARGET_QPS"], "5")
+        self.assertNotIn("LD_PRELOAD", env)
+        self.assertNotIn("/tmp/evil", env["PYTHONPATH"])
+
+    def test_agent_rejects_test_ids_that_are_not_run_ids(self, mock_popen, mock_killpg):
+        agent_url = self.agents[0].advertise_url
+        for test_id in ("../escaped", "t1", RUN_ID.upper()):
+            spec = {"test_id": test_id, "count": 1, "master_port": 1234}
+            self.assertEqual(self._request(agent_url + "/agent/workers", spec, POOL_TOKEN), 400)
+            with self.assertRaises(ValueError):
+                self.agents[0].start_workers(spec)
+        mock_popen.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "escaped")))
+
+    def test_agent_reserves_a_run_while_starting_it(self, mock_popen, mock_killpg):
+        spec = {"test_id": RUN_ID, "count": 1, "master_port": 1234}
+        concurrent_statuses = []
+
+        def popen(cmd, **kwargs):
+            # Another request for the same run arrives while this one is still starting workers
+            concurrent_statuses.append(self._request(self.agents[0].advertise_url + "/agent/workers", spec, POOL_TOKEN))
+            process = MagicMock()
+            process.pid = 42000
+            process.poll.return_value = None
+            return process
+
+        mock_popen.side_effect = popen
+        self.assertEqual(self.agents[0].start_workers(spec), [42000])
+        self.assertEqual(concurrent_statuses, [409])
+        self.assertEqual(mock_popen.call_count, 1)
+
+    def test_agent_releases_the_run_when_starting_fails(self, mock_popen, mock_killpg):
+        spec = {"test_id": RUN_ID, "count": 1, "master_port": 1234}
+        mock_popen.side_effect = OSError("locust not found")
+        with self.assertRaises(OSError):
+            self.agents[0].start_workers(spec)
+        self.assertNotIn(RUN_ID, self.agents[0].stats()["workers"])
+
+        process = MagicMock()
+        process.pid = 42001
+        process.poll.return_value = None
+        mock_popen.side_effect = None
+        mock_popen.return_value = process
+        self.assertEqual(self.agents[0].start_workers(spec), [42001])
+
+    def test_pool_run_places_workers_on_agents(self, mock_popen, mock_killpg):
+        processes = []
+
+        def popen(cmd, **kwargs):
+            process = MagicMock()
+            process.pid = 40000 + len(processes)
+            process.poll.return_value = None
+            finished = threading.Event()
+            process.wait.side_effect = lambda timeout=None: finished.wait(timeout)
+            process.finished = finished
+            processes.append((cmd, kwargs, process))
+            return process
+
+        mock_popen.side_effect = popen
+        status, body = self._post('/perf-service/api/qps/start', {
+            "host": "http://example.com", "load_type": "QPS_TEST", "targetQps": "90", "workers": "3",
+            "workerPlacement": "pool", "payload": '{"id": 1}'})
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body["worker_placement"], {"node-0": 2, "node-1": 1})
+
+        master_cmd, master_kwargs, master = processes[0]
+        self.assertIn("--master", master_cmd)
+        self.assertEqual(master_cmd[master_cmd.index("--master-bind-host") + 1], "0.0.0.0")
+        master_port = master_cmd[master_cmd.index("--master-bind-port") + 1]
+        self.assertEqual(master_cmd[master_cmd.index("--users") + 1], "3")  # At least one user per worker
+
+        workers = processes[1:]
+        self.assertEqual(len(workers), 3)
+        for cmd, kwargs, _ in workers:
+            self.assertIn("--worker", cmd)
+            self.assertEqual(cmd[cmd.index("--master-host") + 1], "127.0.0.1")
+            self.assertEqual(cmd[cmd.index("--master-port") + 1], master_port)
+            self.assertEqual(kwargs["env"]["LOCUST_ROLE"], "worker")
+            self.assertEqual(kwargs["env"]["TARGET_QPS"], "90")
+            # The inline payload was downloaded into the agent's own run directory
+            payload_path = kwargs["env"]["PAYLOAD_TEMPLATE"]
+            self.assertTrue(payload_path.startswith(os.path.join(self.test_dir, "agent-")))
+            with open(payload_path) as f:
+                self.assertEqual(f.read(), '{"id": 1}')
+        self.assertEqual(sorted(kwargs["env"]["LOCUST_NODE_ID"] for _, kwargs, _ in workers),
+                         ["node-0", "node-0", "node-1"])
+        # Indexes are unique across nodes, so each worker feeds from its own share of the data
+        self.assertEqual(sorted(kwargs["env"]["LOCUST_WORKER_INDEX"] for _, kwargs, _ in workers), ["0", "1", "2"])
+        self.assertEqual(self.agents[0].stats()["workers"][body["test_id"]]["count"], 2)
+
+        # Both nodes are full until the run ends
+        status, _ = self._post('/perf-service/api/generic/start', {"workers": "2", "workerPlacement": "pool"})
+        self.assertEqual(status, 503)
+
+        # When the master exits, the agents are told to stop the run's workers
+        master.finished.set()
+        deadline = time.monotonic() + 2
+        while any(node.assigned for node in self.pool._nodes.values()) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual([node.assigned for node in self.pool._nodes.values()], [{}, {}])
+        killed_groups = sorted({call.args[0] for call in mock_killpg.call_args_list})
+        self.assertEqual(killed_groups, [workers[0][2].pid, workers[2][2].pid])
+        for _, _, process in workers:
+            process.finished.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
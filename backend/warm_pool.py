@@ -0,0 +1,108 @@
+import collections
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+WARM_LOCUST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locust_scripts", "warm_locust.py")
+DEFAULT_WARM_POOL_SIZE = 2
+
+
+class WarmLocustPool:
+    """
+    Idle Locust processes that have already imported Locust (gevent, requests, Flask) and the
+    locust script's helper modules, so a run skips seconds of interpreter and import time.
+
+    Each process (``locust_scripts/warm_locust.py``) waits for one run's config as a JSON line
+    on its stdin pipe, applies it and runs Locust's main. Every process serves one run; the pool
+    is refilled as processes are handed out. Processes lead their own process group, like a
+    cold-started master, and can join another run's group as a worker.
+
+    Args:
+        size (int): Idle processes kept ready; 0 disables the pool.
+        python (str): Interpreter the processes run.
+        script (str): Path of the warm process entry point.
+    """
+    def __init__(self, size: int = DEFAULT_WARM_POOL_SIZE, python: str = sys.executable,
+                 script: str = WARM_LOCUST_SCRIPT):
+        self.size = size
+        self.python = python
+        self.script = script
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return sum(1 for process in self._idle if process.poll() is None)
+
+    def fill(self):
+        """Starts processes until ``size`` are idle; called after each hand-out."""
+        with self._lock:
+            alive = [process for process in self._idle if process.poll() is None]
+            self._idle = collections.deque(alive)
+            while len(self._idle) < self.size:
+                try:
+                    self._idle.append(subprocess.Popen(
+                        [self.python, self.script], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL, preexec_fn=partial(os.setpgid, 0, 0)))
+                except OSError as e:
+                    logger.error(f"Failed to start a warm Locust process: {e}")
+                    break
+
+    def _take(self):
+        with self._lock:
+            while self._idle:
+                process = self._idle.popleft()  # Oldest first, it has had the most time to import
+                if process.poll() is None:
+                    return process
+        return None
+
+    def launch(self, cmd: list, env: dict, log_path: str, process_group: int = None):
+        """
+        Hands a ``locust ...`` command to an idle process and refills the pool.
+
+        Args:
+            cmd (list): Locust command line, starting with ``locust``.
+            env (dict): The run's complete environment.
+            log_path (str): File that receives the process' stdout and stderr.
+            process_group (int): Process group to join (a worker joins its master's); by
+                                 default the process leads its own.
+
+        Returns:
+            The process' Popen, or None when no warm process is available and the caller
+            should start Locust itself.
+        """
+        if self.size <= 0 or not cmd or cmd[0] != "locust":
+            return None
+        process = self._take()
+        self.fill()
+        if process is None:
+            return None
+        config = {"argv": cmd[1:], "env": dict(env, LOCUST_WARM_START="1"), "cwd": os.getcwd(),
+                  "log_path": log_path, "process_group": process_group}
+        try:
+            process.stdin.write(json.dumps(config).encode("utf-8") + b"\n")
+            process.stdin.close()
+        except OSError as e:
+            logger.warning(f"Warm Locust process {process.pid} did not take its config: {e}")
+            process.kill()
+            process.wait()
+            return None
+        return process
+
+    def shutdown(self, timeout: float = 5.0):
+        """Closes the idle processes' pipes, which makes them exit."""
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for process in idle:
+            try:
+                process.stdin.close()
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
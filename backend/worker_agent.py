@@ -0,0 +1,333 @@
+"""
+Load-generator node agent. Registers the node with a perf service, reports its health with
+periodic heartbeats and starts Locust workers when the service places a run's workers here.
+
+Usage:
+    WORKER_POOL_TOKEN=<secret> python backend/worker_agent.py --service http://perf-service:5001 [--port 5101]
+        [--max-workers N]
+
+The service and its agents share the WORKER_POOL_TOKEN secret (or --token) and reject requests
+without it: agents start processes and receive the runs' settings, secrets included.
+
+Several agents can run on one machine (each with its own --port) to try a pool locally.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from functools import partial
+
+import psutil
+from flask import Flask, request, jsonify
+
+from locust_scripts import run_config
+from worker_pool import TOKEN_HEADER, token_matches
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCUST_SCRIPT_PATH = os.path.join(BACKEND_DIR, "locust_scripts", "locust_generic_test.py")
+HEARTBEAT_INTERVAL = 2.0
+SERVICE_REQUEST_TIMEOUT = 10.0
+# Seconds workers get to exit on SIGTERM before their process group is killed
+WORKER_EXIT_TIMEOUT = 10
+
+
+def is_run_id(test_id) -> bool:
+    """Whether test_id is a run ID as the service creates them (a canonical UUID), and so safe in a path."""
+    try:
+        return str(uuid.UUID(test_id)) == test_id
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+class WorkerAgent:
+    """
+    Starts and stops Locust worker processes on this node on behalf of a perf service.
+
+    Args:
+        service_url (str): Base URL of the perf service to register with.
+        advertise_url (str): URL under which the service reaches this agent.
+        node_id (str): Stable node identifier; defaults to ``<hostname>:<port of advertise_url>``.
+        work_dir (str): Directory for per-run files (downloaded inputs, worker logs).
+        max_workers (int): Workers this node accepts at once; defaults to the CPU core count.
+        token (str): Secret shared with the service (WORKER_POOL_TOKEN).
+    """
+    def __init__(self, service_url: str, advertise_url: str, node_id: str = None, work_dir: str = None,
+                 max_workers: int = None, token: str = None):
+        self.service_url = service_url.rstrip("/")
+        self.token = token
+        self.advertise_url = advertise_url.rstrip("/")
+        self.node_id = node_id or f"{socket.gethostname()}:{urllib.parse.urlparse(advertise_url).port}"
+        self.work_dir = work_dir or os.path.join(os.getcwd(), "agent_runs")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._runs = {}  # test_id -> list of worker Popen handles
+        self._process_stats = {}  # pid -> psutil.Process, kept for cpu_percent deltas
+        self._lock = threading.Lock()
+        os.makedirs(self.work_dir, exist_ok=True)
+
+    def _post(self, path: str, payload: dict) -> dict:
+        req = urllib.request.Request(self.service_url + path, data=json.dumps(payload).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json", TOKEN_HEADER: self.token or ""})
+        with urllib.request.urlopen(req, timeout=SERVICE_REQUEST_TIMEOUT) as response:
+            return json.loads(response.read() or b"{}")
+
+    def register(self):
+        self._post("/perf-service/api/nodes/register", {
+            "node_id": self.node_id,
+            "url": self.advertise_url,
+            "cpu_count": os.cpu_count() or 1,
+            "max_workers": self.max_workers,
+        })
+        logger.info(f"Registered node {self.node_id} with {self.service_url}")
+
+    def heartbeat(self):
+        """Sends one heartbeat, registering (again) if the service does not know this node."""
+        try:
+            self._post(f"/perf-service/api/nodes/{urllib.parse.quote(self.node_id, safe='')}/heartbeat", self.stats())
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            self.register()
+
+    def run_heartbeats(self, stop_event: threading.Event):
+        while not stop_event.is_set():
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning(f"Heartbeat to {self.service_url} failed: {e}")
+            stop_event.wait(HEARTBEAT_INTERVAL)
+
+    def stats(self) -> dict:
+        """Node CPU and memory load plus the CPU use of each run's workers."""
+        workers = {}
+        with self._lock:
+            runs = {test_id: list(processes) for test_id, processes in self._runs.items()}
+        for test_id, processes in runs.items():
+            running = [process for process in processes if process.poll() is None]
+            cpu = 0.0
+            for process in running:
+                try:
+                    cpu += self._process_stats[process.pid].cpu_percent()
+                except (KeyError, psutil.Error):
+                    pass
+            workers[test_id] = {"count": len(processes), "running": len(running), "cpu_percent": round(cpu, 1)}
+        return {
+            "cpu_percent": psutil.cpu_percent(),
+            "memory_percent": psutil.virtual_memory().percent,
+            "workers": workers,
+        }
+
+    def start_workers(self, spec: dict) -> list:
+        """
+        Starts ``spec["count"]`` Locust workers for ``spec["test_id"]`` connecting to the run's
+        master, numbered from ``spec["first_index"]`` within the run (LOCUST_WORKER_INDEX).
+        ``spec["env"]`` holds the run's settings; ``spec["files"]`` maps environment
+        variables to input files that are downloaded from the service first. Only the run
+        settings of run_config.WORKER_ENV_KEYS are applied. Returns the PIDs.
+        """
+        test_id = spec["test_id"]
+        if not is_run_id(test_id):
+            raise ValueError(f"Invalid test_id '{test_id}': run IDs are UUIDs.")
+        count = int(spec["count"])
+        first_index = int(spec.get("first_index") or 0)
+        processes = []
+        with self._lock:
+            if test_id in self._runs:
+                raise ValueError(f"Workers for test {test_id} are already running on this node.")
+            # Reserved until the workers run, so a concurrent request for the same run is refused
+            self._runs[test_id] = processes
+        try:
+            master_host = self._spawn_workers(spec, test_id, count, first_index, processes)
+        except Exception:
+            self._signal_group(processes, signal.SIGKILL)
+            with self._lock:
+                if self._runs.get(test_id) is processes:
+                    del self._runs[test_id]
+            raise
+        with self._lock:
+            for process in processes:
+                try:
+                    self._process_stats[process.pid] = psutil.Process(process.pid)
+                except psutil.Error:
+                    pass
+        threading.Thread(target=self._reap, args=(test_id, processes), name=f"reap:{test_id}", daemon=True).start()
+        logger.info(f"[{test_id}] Started {count} Locust workers for master {master_host}:{spec['master_port']}")
+        return [process.pid for process in processes]
+
+    def _spawn_workers(self, spec: dict, test_id: str, count: int, first_index: int, processes: list) -> str:
+        """Downloads the run's input files and starts its workers, appending each to ``processes``. Returns the master host."""
+        run_dir = os.path.join(self.work_dir, test_id)
+        os.makedirs(run_dir, exist_ok=True)
+
+        ignored = sorted(set(spec.get("env") or {}) - run_config.WORKER_ENV_KEYS)
+        ignored += sorted(set(spec.get("files") or {}) - run_config.WORKER_FILE_KEYS)
+        if ignored:
+            logger.warning(f"[{test_id}] Ignoring settings that are not run settings: {', '.join(ignored)}")
+        env = os.environ.copy()
+        env.update({key: str(value) for key, value in (spec.get("env") or {}).items()
+                    if key in run_config.WORKER_ENV_KEYS})
+        service_url = (spec.get("service_url") or self.service_url).rstrip("/")
+        for key, filename in (spec.get("files") or {}).items():
+            if key in run_config.WORKER_FILE_KEYS:
+                env[key] = self._download(service_url, test_id, filename, run_dir)
+        env.update({
+            "TEST_ID": test_id,
+            "LOCUST_ROLE": "worker",
+            "LOCUST_NODE_ID": self.node_id,
+            # The locust script imports the backend package
+            "PYTHONPATH": os.pathsep.join(filter(None, [os.path.dirname(BACKEND_DIR), env.get("PYTHONPATH")])),
+        })
+        master_host = spec.get("master_host") or urllib.parse.urlparse(service_url).hostname
+        cmd = ["locust", "-f", LOCUST_SCRIPT_PATH, "--worker", "--master-host", master_host,
+               "--master-port", str(spec["master_port"])]
+        if spec.get("host"):
+            cmd.extend(["--host", spec["host"]])
+
+        for index in range(count):
+            env["LOCUST_WORKER_INDEX"] = str(first_index + index)
+            with open(os.path.join(run_dir, f"worker_{index}.out"), "wb") as output:
+                # The first worker leads a process group the others join, so a run stops as a whole
+                processes.append(subprocess.Popen(
+                    cmd + ["--logfile", os.path.join(run_dir, f"locust_worker_{index}.log")],
+                    env=dict(env), cwd=run_dir, stdout=output, stderr=subprocess.STDOUT,
+                    preexec_fn=partial(os.setpgid, 0, processes[0].pid if processes else 0)))
+        return master_host
+
+    def stop_workers(self, test_id: str) -> bool:
+        """Stops a run's workers: SIGTERM to their process group, SIGKILL if they do not exit in time."""
+        with self._lock:
+            processes = self._runs.get(test_id)
+        if processes is None:
+            return False
+        self._signal_group(processes, signal.SIGTERM)
+        threading.Thread(target=self._kill_after_timeout, args=(processes,), daemon=True).start()
+        return True
+
+    def stop_all(self):
+        with self._lock:
+            test_ids = list(self._runs)
+        for test_id in test_ids:
+            self.stop_workers(test_id)
+
+    def _kill_after_timeout(self, processes: list):
+        deadline = time.monotonic() + WORKER_EXIT_TIMEOUT
+        for process in processes:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self._signal_group(processes, signal.SIGKILL)
+                return
+
+    @staticmethod
+    def _signal_group(processes: list, sig: int):
+        if not processes:
+            return
+        try:
+            os.killpg(processes[0].pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self, test_id: str, processes: list):
+        for process in processes:
+            process.wait()
+        with self._lock:
+            if self._runs.get(test_id) is processes:
+                del self._runs[test_id]
+            for process in processes:
+                self._process_stats.pop(process.pid, None)
+        logger.info(f"[{test_id}] All Locust workers exited.")
+
+    def _download(self, service_url: str, test_id: str, filename: str, run_dir: str) -> str:
+        filename = os.path.basename(filename)
+        path = os.path.join(run_dir, filename)
+        url = (f"{service_url}/perf-service/api/test/{urllib.parse.quote(test_id, safe='')}/files/"
+               f"{urllib.parse.quote(filename, safe='')}")
+        req = urllib.request.Request(url, headers={TOKEN_HEADER: self.token or ""})
+        with urllib.request.urlopen(req, timeout=SERVICE_REQUEST_TIMEOUT) as response, open(path, "wb") as f:
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+        return path
+
+
+def create_agent_app(agent: WorkerAgent) -> Flask:
+    agent_app = Flask(__name__)
+
+    @agent_app.before_request
+    def check_token():
+        if not token_matches(agent.token, request.headers.get(TOKEN_HEADER)):
+            return jsonify({"error": "Missing or invalid worker pool token (WORKER_POOL_TOKEN)."}), 401
+
+    @agent_app.route('/agent/status', methods=['GET'])
+    def status():
+        return jsonify(dict(agent.stats(), node_id=agent.node_id, max_workers=agent.max_workers)), 200
+
+    @agent_app.route('/agent/workers', methods=['POST'])
+    def start_workers():
+        spec = request.get_json(silent=True) or {}
+        missing = [field for field in ("test_id", "count", "master_port") if not spec.get(field)]
+        if missing:
+            return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+        if not is_run_id(spec["test_id"]):
+            return jsonify({"error": "Invalid test_id", "test_id": spec["test_id"]}), 400
+        try:
+            pids = agent.start_workers(spec)
+        except ValueError as e:
+            return jsonify({"error": str(e), "test_id": spec["test_id"]}), 409
+        except (OSError, subprocess.SubprocessError, urllib.error.URLError) as e:
+            agent_app.logger.error(f"[{spec['test_id']}] Failed to start workers: {e}", exc_info=True)
+            return jsonify({"error": f"Failed to start workers: {e}", "test_id": spec["test_id"]}), 500
+        return jsonify({"node_id": agent.node_id, "test_id": spec["test_id"], "pids": pids}), 201
+
+    @agent_app.route('/agent/workers/<string:test_id>/stop', methods=['POST'])
+    def stop_workers(test_id):
+        if not agent.stop_workers(test_id):
+            return jsonify({"error": "No workers running for test_id", "test_id": test_id}), 404
+        return jsonify({"message": "Workers stopping.", "test_id": test_id}), 200
+
+    return agent_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Locust worker agent for a perf service worker pool.")
+    parser.add_argument("--service", required=True, help="Base URL of the perf service, e.g. http://localhost:5001")
+    parser.add_argument("--bind", default="127.0.0.1", help="Address the agent listens on")
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--advertise-url", help="URL the service uses to reach this agent")
+    parser.add_argument("--node-id")
+    parser.add_argument("--work-dir")
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--token", default=os.getenv("WORKER_POOL_TOKEN"),
+                        help="Secret shared with the service; defaults to WORKER_POOL_TOKEN")
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("a worker pool token is required: set WORKER_POOL_TOKEN or pass --token")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    advertise_host = args.bind if args.bind not in ("0.0.0.0", "") else socket.gethostname()
+    agent = WorkerAgent(args.service, args.advertise_url or f"http://{advertise_host}:{args.port}",
+                        node_id=args.node_id, work_dir=args.work_dir, max_workers=args.max_workers, token=args.token)
+    stop_event = threading.Event()
+    threading.Thread(target=agent.run_heartbeats, args=(stop_event,), name="heartbeat", daemon=True).start()
+    try:
+        create_agent_app(agent).run(host=args.bind, port=args.port, threaded=True)
+    finally:
+        stop_event.set()
+        agent.stop_all()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import hmac
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+# A node that has not sent a heartbeat for this many seconds is considered down
+NODE_HEARTBEAT_TIMEOUT = 10.0
+AGENT_REQUEST_TIMEOUT = 10.0
+# Header carrying the shared WORKER_POOL_TOKEN on every request between the service and its agents
+TOKEN_HEADER = "X-Worker-Pool-Token"
+
+
+def token_matches(expected: str, presented: str) -> bool:
+    """Whether a request presented the pool's token; never true while no token is configured."""
+    return bool(expected) and hmac.compare_digest((presented or "").encode("utf-8"), expected.encode("utf-8"))
+
+
+class WorkerNode:
+    """
+    A load-generator node running worker_agent.py.
+
+    Args:
+        node_id (str): Identifier chosen by the agent, stable across re-registrations.
+        url (str): Base URL of the agent's HTTP API.
+        cpu_count (int): CPU cores on the node.
+        max_workers (int): Locust workers the node accepts at once (one per core by default).
+    """
+    def __init__(self, node_id: str, url: str, cpu_count: int, max_workers: int = None):
+        self.node_id = node_id
+        self.url = url.rstrip("/")
+        self.cpu_count = cpu_count
+        self.max_workers = max_workers or cpu_count
+        self.registered_at = time.time()
+        self.last_seen = time.monotonic()
+        self.stats = {}
+        self.assigned = {}  # test_id -> workers placed on this node, released by stop_workers at run end
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() - self.last_seen <= NODE_HEARTBEAT_TIMEOUT
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.max_workers - sum(self.assigned.values()))
+
+    def to_dict(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "url": self.url,
+            "cpu_count": self.cpu_count,
+            "max_workers": self.max_workers,
+            "healthy": self.healthy,
+            "seconds_since_heartbeat": round(time.monotonic() - self.last_seen, 1),
+            "assigned_workers": dict(self.assigned),
+            "stats": self.stats,
+        }
+
+
+class WorkerPool:
+    """
+    Registry of remote load-generator nodes and placement of Locust workers on them.
+
+    Agents register on start-up and then send heartbeats with their CPU load and running
+    workers. ``start_workers`` spreads a run's workers over the healthy nodes, always
+    filling the node with the most free slots next, and asks each agent to start its share.
+
+    Args:
+        token (str): Secret shared with the agents (WORKER_POOL_TOKEN). Without it no agent
+                     is accepted, since agents receive the runs' settings, secrets included.
+    """
+    def __init__(self, token: str = None):
+        self.token = token
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def authorized(self, presented: str) -> bool:
+        """Whether an agent's request carried the pool's token."""
+        return token_matches(self.token, presented)
+
+    def register(self, node_id: str, url: str, cpu_count: int, max_workers: int = None) -> WorkerNode:
+        with self._lock:
+            node = WorkerNode(node_id, url, cpu_count, max_workers)
+            previous = self._nodes.get(node_id)
+            if previous is not None:
+                node.assigned = previous.assigned  # A restarted agent keeps its placements
+            self._nodes[node_id] = node
+        logger.info(f"Worker node {node_id} registered at {node.url} ({node.max_workers} worker slots).")
+        return node
+
+    def heartbeat(self, node_id: str, stats: dict) -> bool:
+        """Records a heartbeat. Returns False for unknown nodes, which should register again."""
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                return False
+            node.last_seen = time.monotonic()
+            node.stats = stats
+        return True
+
+    def nodes(self) -> list:
+        with self._lock:
+            return [node.to_dict() for node in self._nodes.values()]
+
+    def place(self, workers: int) -> dict:
+        """
+        Chooses nodes for ``workers`` Locust workers, returning ``{node_id: count}``.
+        Raises ValueError if the healthy nodes do not have enough free slots.
+        """
+        with self._lock:
+            free = {node.node_id: node.free_slots for node in self._nodes.values() if node.healthy}
+        if sum(free.values()) < workers:
+            raise ValueError(f"Worker pool has {sum(free.values())} free worker slots on {len(free)} healthy "
+                             f"node(s), {workers} requested.")
+        placement = {}
+        for _ in range(workers):
+            node_id = max(free, key=lambda candidate: (free[candidate], -placement.get(candidate, 0)))
+            free[node_id] -= 1
+            placement[node_id] = placement.get(node_id, 0) + 1
+        return placement
+
+    def start_workers(self, test_id: str, workers: int, spec: dict) -> dict:
+        """
+        Places and starts a run's workers. ``spec`` is sent to every agent (see
+        worker_agent.WorkerAgent.start_workers), with the run-wide index of the node's first
+        worker. Workers already started are stopped again if any agent fails. Returns the placement.
+        """
+        placement = self.place(workers)
+        started = []
+        first_index = 0
+        try:
+            for node_id, count in placement.items():
+                node = self._nodes[node_id]
+                self._call(node, "POST", "/agent/workers",
+                           dict(spec, test_id=test_id, count=count, first_index=first_index))
+                first_index += count
+                started.append(node_id)
+                with self._lock:
+                    node.assigned[test_id] = count
+        except Exception:
+            self.stop_workers(test_id, started)
+            raise
+        logger.info(f"[{test_id}] Placed {workers} workers on the pool: {placement}")
+        return placement
+
+    def stop_workers(self, test_id: str, node_ids=None):
+        """Asks the agents running a test's workers to stop them. Failures are logged, not raised."""
+        with self._lock:
+            nodes = [node for node in self._nodes.values()
+                     if (node_ids is None and test_id in node.assigned) or (node_ids and node.node_id in node_ids)]
+        for node in nodes:
+            try:
+                self._call(node, "POST", f"/agent/workers/{test_id}/stop")
+            except Exception as e:
+                logger.warning(f"[{test_id}] Failed to stop workers on node {node.node_id}: {e}")
+            with self._lock:
+                node.assigned.pop(test_id, None)
+
+    def _call(self, node: WorkerNode, method: str, path: str, payload: dict = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(node.url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json", TOKEN_HEADER: self.token or ""})
+        try:
+            with urllib.request.urlopen(req, timeout=AGENT_REQUEST_TIMEOUT) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Node {node.node_id} answered {e.code}: {e.read().decode('utf-8', 'replace')}")
+        except OSError as e:
+            raise RuntimeError(f"Node {node.node_id} is unreachable: {e}")